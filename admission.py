@@ -0,0 +1,257 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from typing import Awaitable, Callable, Hashable
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed because the wait queue is full or the wait took too long."""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity` tokens."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float = None) -> float:
+        """Seconds until a token is available (0 if one is available now), without taking it."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + max(now - self.updated, 0.0) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def try_acquire(self, now: float = None) -> float:
+        """Take a token. Returns 0 on success, otherwise the seconds until a token is available."""
+        wait = self.wait_time(now)
+        if wait == 0:
+            self.tokens -= 1
+        return wait
+
+
+class RateLimiter:
+    """
+    Token buckets per key (e.g. per user or per channel). Only the `max_keys` most recently
+    seen keys are tracked, so the limiter cannot grow without bound.
+    """
+
+    def __init__(self, per_minute: float, burst: float, max_keys: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, key: Hashable) -> float:
+        """Take a token for `key`. Returns 0 when allowed, otherwise the seconds to wait."""
+        return check_limits((self, key))
+
+    def _bucket(self, key: Hashable) -> TokenBucket:
+        # Caller holds self._lock
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+def check_limits(*limits: tuple[RateLimiter, Hashable]) -> float:
+    """
+    Take a token for every (limiter, key) pair, but only if all of them have one, so a request
+    refused by one limit (e.g. the user's) does not use up another (e.g. the channel's).
+    Returns 0 when allowed, otherwise the seconds until every bucket has a token.
+    """
+    limits = [(limiter, key) for limiter, key in limits if limiter.enabled]
+    # Lock in a fixed order so concurrent checks over the same limiters cannot deadlock
+    locks = {id(limiter): limiter._lock for limiter, _ in limits}
+    with ExitStack() as stack:
+        for _, lock in sorted(locks.items()):
+            stack.enter_context(lock)
+        buckets = [limiter._bucket(key) for limiter, key in limits]
+        now = time.monotonic()
+        wait = max((bucket.wait_time(now) for bucket in buckets), default=0.0)
+        if wait == 0:
+            for bucket in buckets:
+                bucket.try_acquire(now)
+        return wait
+
+
+class AdmissionController:
+    """
+    Caps how many requests run at once. Requests beyond the cap wait in a bounded FIFO queue
+    and are told their position; once the queue is full new requests are shed with Overloaded.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int = 20, queue_timeout: float = 60):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._active = 0
+        self._queue = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+
+    @contextmanager
+    def slot(self, on_queued: Callable[[int], None] = None):
+        """
+        Hold one of the concurrency slots for the duration of the block.
+
+        Args:
+            on_queued: Called with the 1-based queue position if the request has to wait
+        """
+        self._acquire(on_queued)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    def _acquire(self, on_queued: Callable[[int], None] = None):
+        with self._condition:
+            if self._active < self.max_concurrent and not self._queue:
+                self._active += 1
+                self.admitted += 1
+                return
+            if len(self._queue) >= self.max_queue:
+                self.shed += 1
+                raise Overloaded(f"{self.name} is at capacity ({self.max_concurrent} running, {len(self._queue)} queued)")
+            ticket = object()
+            self._queue.append(ticket)
+            self.queued += 1
+            position = len(self._queue)
+
+        if on_queued is not None:
+            try:
+                on_queued(position)
+            except Exception as e:
+                print(f"Could not report queue position: {e}")
+
+        deadline = time.monotonic() + self.queue_timeout
+        with self._condition:
+            # FIFO: only the head of the queue may take a free slot
+            while not (self._queue[0] is ticket and self._active < self.max_concurrent):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(ticket)
+                    self.shed += 1
+                    self._condition.notify_all()
+                    raise Overloaded(f"Waited {self.queue_timeout}s in the {self.name} queue")
+                self._condition.wait(remaining)
+            self._queue.popleft()
+            self._active += 1
+            self.admitted += 1
+            self._condition.notify_all()
+
+    def stats(self) -> dict[str, int]:
+        with self._condition:
+            return {
+                "active": self._active,
+                "queued_now": len(self._queue),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "shed": self.shed,
+            }
+
+
+class AsyncAdmissionController:
+    """
+    asyncio counterpart of AdmissionController for the async bot: waiting requests await a
+    future in a bounded FIFO queue instead of holding a thread. Must only be used from one event loop.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int = 20, queue_timeout: float = 60):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._queue = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+
+    @asynccontextmanager
+    async def slot(self, on_queued: Callable[[int], Awaitable[None]] = None):
+        """
+        Hold one of the concurrency slots for the duration of the block.
+
+        Args:
+            on_queued: Coroutine function called with the 1-based queue position if the request has to wait
+        """
+        await self._acquire(on_queued)
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._wake_next()
+
+    def _wake_next(self):
+        # FIFO: hand free slots to the head of the queue
+        while self._queue and self._active < self.max_concurrent:
+            waiter = self._queue.popleft()
+            if not waiter.done():
+                self._active += 1
+                self.admitted += 1
+                waiter.set_result(None)
+
+    async def _acquire(self, on_queued: Callable[[int], Awaitable[None]] = None):
+        if self._active < self.max_concurrent and not self._queue:
+            self._active += 1
+            self.admitted += 1
+            return
+        if len(self._queue) >= self.max_queue:
+            self.shed += 1
+            raise Overloaded(f"{self.name} is at capacity ({self.max_concurrent} running, {len(self._queue)} queued)")
+        waiter = asyncio.get_running_loop().create_future()
+        self._queue.append(waiter)
+        self.queued += 1
+
+        if on_queued is not None:
+            try:
+                await on_queued(len(self._queue))
+            except Exception as e:
+                print(f"Could not report queue position: {e}")
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self._active -= 1
+                self._wake_next()
+            else:
+                waiter.cancel()
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.shed += 1
+            raise Overloaded(f"Waited {self.queue_timeout}s in the {self.name} queue")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "active": self._active,
+            "queued_now": len(self._queue),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+        }
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a question so trivial differences (case, spacing, trailing punctuation) share a cache entry."""
+    prompt = re.sub(r'\s+', ' ', prompt.strip().lower())
+    return prompt.rstrip(' ?!.')
+
+
+class CacheEntry(NamedTuple):
+    response: dict
+    expires_at: float
+    size: int
+    elapsed: float  # How long the agent call took, i.e. the latency a hit saves
+
+
+class AnswerCache:
+    """
+    TTL + LRU cache of agent answers, keyed by the normalized prompt and the fingerprint of the
+    agent configuration (model, semantic models and search services).
+
+    When a different configuration fingerprint shows up, entries built from the old one are dropped.
+    With a shared StateStore, answers are also written there as JSON and local misses are looked
+    up in it, so bot processes on one host share answers.
+    """
+    NAMESPACE = 'answers'
+
+    def __init__(self, ttl_seconds: float = 900, max_entries: int = 256, max_bytes: int = 16 * 1024 * 1024,
+                 store=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, prompt: str, fingerprint: str) -> dict | None:
+        """Return the cached answer for this prompt and configuration, or None."""
+        if not self.enabled:
+            return None
+        key = normalize_prompt(prompt)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                entry = None
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry.elapsed
+                return entry.response
+
+        entry = self._get_shared(key, fingerprint)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += entry.elapsed
+            return entry.response
+
+    @staticmethod
+    def _store_key(key: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}:{key}".encode('utf-8')).hexdigest()
+
+    def _get_shared(self, key: str, fingerprint: str) -> CacheEntry | None:
+        """Look an answer up in the shared store and keep a local copy for its remaining lifetime."""
+        if self.store is None:
+            return None
+        data = self.store.get(self.NAMESPACE, self._store_key(key, fingerprint))
+        if data is None:
+            return None
+        record = json.loads(data)
+        remaining = record['expires_at'] - time.time()
+        if remaining <= 0:
+            return None
+        entry = CacheEntry(record['response'], time.monotonic() + remaining, len(data), record['elapsed'])
+        with self._lock:
+            self._insert(key, entry)
+        return entry
+
+    def put(self, prompt: str, fingerprint: str, response: dict, elapsed: float = 0.0):
+        """Store an agent answer. Answers larger than the whole memory budget are not cached."""
+        if not self.enabled:
+            return
+        key = normalize_prompt(prompt)
+        data = json.dumps({"response": response, "elapsed": elapsed, "expires_at": time.time() + self.ttl_seconds},
+                          default=str)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._insert(key, CacheEntry(response, time.monotonic() + self.ttl_seconds, len(data), elapsed))
+        if self.store is not None:
+            self.store.set(self.NAMESPACE, self._store_key(key, fingerprint), data.encode('utf-8'), self.ttl_seconds)
+
+    def _insert(self, key: str, entry: CacheEntry):
+        # Must be called with the lock held
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        # Evict least recently used entries until we are back under both limits
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.store is not None:
+            self.store.clear(self.NAMESPACE)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _check_fingerprint(self, fingerprint: str):
+        # Must be called with the lock held
+        if fingerprint != self._fingerprint:
+            if self._fingerprint is not None:
+                print("Agent configuration changed, invalidating cached answers")
+            self._entries.clear()
+            self._bytes = 0
+            self._fingerprint = fingerprint
+
+    def _remove(self, key: str):
+        # Must be called with the lock held
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
@@ -1,44 +1,83 @@
-from typing import Any
-import os
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
-import snowflake.connector
-import pandas as pd
-from snowflake.core import Root
-from dotenv import load_dotenv
-import matplotlib
-import matplotlib.pyplot as plt
-from snowflake.snowpark import Session
-import numpy as np
 import time
-import requests
-import datetime
+import contextvars
 from cortex_chat import CortexChat
-
-matplotlib.use('Agg')
-load_dotenv()
-
-ACCOUNT = os.getenv("ACCOUNT")
-HOST = os.getenv("HOST")
-USER = os.getenv("DEMO_USER")
-DATABASE = os.getenv("DEMO_DATABASE")
-SCHEMA = os.getenv("DEMO_SCHEMA")
-ROLE = os.getenv("DEMO_USER_ROLE")
-WAREHOUSE = os.getenv("WAREHOUSE")
-SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
-SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
-AGENT_ENDPOINT = os.getenv("AGENT_ENDPOINT")
-RSA_PRIVATE_KEY_PATH = os.getenv("RSA_PRIVATE_KEY_PATH")
-MODEL = os.getenv("MODEL")
+from slack_stream import LiveMessage
+from answer_cache import AnswerCache, normalize_prompt
+from result_cache import ResultCache
+from connection_pool import SnowflakeConnectionPool
+from query_runner import execute_concurrently, QueryTracker, QuerySupersededError
+from single_flight import SingleFlight
+from admission import AdmissionController, RateLimiter, Overloaded, check_limits
+from charts import ChartRenderer
+from slack_files import SlackFileUploader
+from concurrent.futures import ThreadPoolExecutor
+from event_dedupe import EventDeduplicator, event_keys
+from state_store import create_state_store, DailyNotices
+from workers import run_workers, worker_id
+from warmup import WarmupStep, default_steps, run_warmup
+from verified_queries import VerifiedQueryIndex, verified_response
+from semantic_models import load_semantic_models
+from tool_router import ToolRouter
+import slack_blocks
+import metrics
+from profiling import Profiler, is_profile_command
+from config import (
+    ACCOUNT, USER, ROLE, WAREHOUSE, SLACK_APP_TOKEN, SLACK_BOT_TOKEN, AGENT_ENDPOINT, RSA_PRIVATE_KEY_PATH, MODEL,
+    STREAM_RESPONSES, STREAM_UPDATE_INTERVAL, AGENT_POOL_SIZE, AGENT_WARMUP_CONNECTIONS,
+    ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MAX_MB, SQL_CACHE_TTL, SQL_CACHE_MAX_MB,
+    MAX_CONCURRENT_AGENT_CALLS, MAX_CONCURRENT_QUERIES, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT,
+    USER_RATE_PER_MINUTE, USER_BURST, CHANNEL_RATE_PER_MINUTE, CHANNEL_BURST, EVENT_DEDUPE_TTL, EVENT_DEDUPE_MAX_ENTRIES,
+    STATE_BACKEND, BOT_WORKERS, WARMUP_TIMEOUT, WARMUP_FAIL_FAST, METRICS_PORT, METRICS_JSON_LOGS,
+    PROFILE_ADMINS, PROFILE_SAMPLE_PERCENT, PROFILE_DIR, PROFILE_TOP_ALLOCATORS, PROFILE_ON_START,
+    VERIFIED_QUERIES, VERIFIED_QUERY_THRESHOLD, TOOL_ROUTING, TOOL_ROUTING_TOP_K, TOOL_ROUTING_MIN_COVERAGE,
+    SNOWFLAKE_POOL_SIZE, MAX_RESULT_ROWS, SQL_QUERY_TIMEOUT, CHART_WORKERS, CHART_USE_PROCESSES, CHART_READY_TIMEOUT,
+    agent_sources, connect_snowflake
+)
 
 DEBUG = False
 
 # Initializes app
 app = App(token=SLACK_BOT_TOKEN)
-messages = []
 
-# Track user interactions by day
-user_last_interaction = {}
+# Per-user records, handled events and (when shared between processes) cache entries
+state_store = create_state_store(STATE_BACKEND)
+shared_store = state_store if state_store.shared else None
+# Which users already got today's AI warning
+daily_notices = DailyNotices(state_store)
+
+answer_cache = AnswerCache(
+    ttl_seconds=ANSWER_CACHE_TTL,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    max_bytes=int(ANSWER_CACHE_MAX_MB * 1024 * 1024),
+    store=shared_store
+)
+agent_admission = AdmissionController("AI Analyst", MAX_CONCURRENT_AGENT_CALLS, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT)
+sql_admission = AdmissionController("Warehouse", MAX_CONCURRENT_QUERIES, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT)
+# Slack event IDs / message IDs already handled, so redeliveries are not answered twice
+event_dedupe = EventDeduplicator(EVENT_DEDUPE_TTL, EVENT_DEDUPE_MAX_ENTRIES, store=shared_store)
+user_limiter = RateLimiter(USER_RATE_PER_MINUTE, USER_BURST)
+channel_limiter = RateLimiter(CHANNEL_RATE_PER_MINUTE, CHANNEL_BURST)
+# Concurrent identical questions and identical SQL share one agent call / one query
+agent_flight = SingleFlight()
+sql_flight = SingleFlight()
+# Running queries per user and thread, so a newer question cancels the previous one's queries
+query_tracker = QueryTracker()
+# Samples requests for cProfile/tracemalloc while switched on (signal or admin command)
+profiler = Profiler(PROFILE_DIR, PROFILE_SAMPLE_PERCENT, PROFILE_TOP_ALLOCATORS)
+# Loaded from the semantic models during init()
+verified_queries = VerifiedQueryIndex(VERIFIED_QUERY_THRESHOLD)
+tool_router = ToolRouter(TOOL_ROUTING_TOP_K, TOOL_ROUTING_MIN_COVERAGE)
+chart_renderer = ChartRenderer(max_workers=CHART_WORKERS, use_processes=CHART_USE_PROCESSES)
+file_uploader = SlackFileUploader(app.client, ready_timeout=CHART_READY_TIMEOUT)
+# Runs the render -> upload -> post pipeline off the event handler thread
+chart_executor = ThreadPoolExecutor(max_workers=CHART_WORKERS * 2, thread_name_prefix='chart-post')
+result_cache = ResultCache(
+    ttl_seconds=SQL_CACHE_TTL,
+    max_bytes=int(SQL_CACHE_MAX_MB * 1024 * 1024),
+    store=shared_store
+)
 
 
 @app.message("hello")
@@ -54,240 +93,273 @@ def message_hello(message, say):
 
 @app.event("message")
 def handle_message_events(ack, body, say):
+    # Once the answer streams into the "generating" message, errors replace that message too
+    reply = say
     try:
         ack()
+        # Slack redelivers events it believes were missed; answer each message only once
+        if event_dedupe.seen(event_keys(body)):
+            print(f"Dropping duplicate delivery of event {body.get('event_id')}")
+            return
+
         prompt = body['event']['text']
         user_id = body['event']['user']
+        # Admin-only switch for runtime profiling
+        if is_profile_command(prompt):
+            message = profiler.command(prompt) if user_id in PROFILE_ADMINS else "Profiling commands are limited to bot admins."
+            say(message)
+            return
 
-        # Check if this is the first interaction today for this user
-        current_date = datetime.datetime.now().date()
-        show_warning = False
-
-        if user_id not in user_last_interaction:
-            show_warning = True
-        else:
-            last_interaction_date = user_last_interaction[user_id]
-            if last_interaction_date != current_date:
-                show_warning = True
+        # A new question from the same user in the same channel/thread supersedes their previous one
+        owner = (body['event'].get('channel'), body['event'].get('thread_ts'), user_id)
 
-        # Update the last interaction timestamp for this user
-        user_last_interaction[user_id] = current_date
+        # Per-user and per-channel token buckets keep one person or channel from starving the others
+        retry_after = check_limits((user_limiter, user_id), (channel_limiter, body['event'].get('channel')))
+        if retry_after > 0:
+            say(**slack_blocks.rate_limited(retry_after))
+            return
 
         # Show AI warning if this is the first interaction today
-        if show_warning:
-            say(
-                text="AI Assistant Warning",
-                blocks=[
-                    {
-                        "type": "header",
-                        "text": {
-                            "type": "plain_text",
-                            "text": ":warning: AI Assistant Important Notice :warning:",
-                            "emoji": True
-                        }
-                    },
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": "This AI assistant uses automated systems to provide information. While we strive for accuracy, please note:\n\n• Information may not always be accurate or complete\n• Always verify important information\n• The AI will have limitations\n\nPlease use your judgment when acting on the information provided."
-                        }
-                    },
-                    {
-                        "type": "divider"
-                    }
-                ]
-            )
-
-        say(
-            text="AI is generating a response",
-            blocks=[
-                {
-                    "type": "divider"
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "plain_text",
-                        "text": ":brain: AI Analyst is generating a response. Please wait...",
-                    }
-                },
-                {
-                    "type": "divider"
-                },
-            ]
-        )
-        response = ask_agent(prompt)
-        display_agent_response(response, say)
+        if daily_notices.first_today(user_id):
+            say(**slack_blocks.ai_warning())
+
+        thinking = say(**slack_blocks.generating())
+
+        def on_queued(position):
+            say(**slack_blocks.queued(position))
+
+        ticket = query_tracker.start(owner)
+        try:
+            # The whole answer, from the first agent byte to the last table posted (charts follow on their own)
+            with metrics.span('request', streamed=STREAM_RESPONSES), profiler.request(user_id):
+                live = None
+                if STREAM_RESPONSES:
+                    # Edit the "generating" message in place as the agent streams its answer
+                    live = LiveMessage(app.client, thinking['channel'], thinking['ts'], STREAM_UPDATE_INTERVAL)
+                reply = live.say if live else say
+                # Questions with vetted SQL in a semantic model skip the agent
+                if not answer_verified(prompt, reply, ticket):
+                    response = ask_agent(prompt, live, on_queued)
+                    display_agent_response(response, reply, ticket)
+        finally:
+            query_tracker.finish(ticket)
+            if DEBUG:
+                print(metrics.registry.summary())
+    except Overloaded as e:
+        # Shed load with a friendly message instead of a stack trace
+        print(f"Request shed: {e}")
+        reply(**slack_blocks.overloaded())
     except Exception as e:
         error_info = f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}"
         print(error_info)
-        say(
-            text="Request failed...",
-            blocks=[
-                {
-                    "type": "divider"
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "plain_text",
-                        "text": f"{error_info}",
-                    }
-                },
-                {
-                    "type": "divider"
-                },
-            ]
-        )
+        reply(**slack_blocks.request_failed(error_info))
 
 
-def ask_agent(prompt):
-    resp = CORTEX_APP.chat(prompt)
+def answer_verified(prompt, say, ticket=None):
+    """Answer with the SQL of the verified query the prompt asks for; returns False to leave it to the agent."""
+    match = verified_queries.match(prompt)
+    if match is None:
+        return False
+    query = match.query
+    print(f"Answering from verified query {query.name!r} (score {match.score:.2f})")
+    try:
+        with metrics.span('verified_query', semantic_model=CORTEX_APP.tool_label(query.tool)):
+            display_agent_response(verified_response(query), say, ticket)
+        return True
+    except Exception as e:
+        print(f"Verified query {query.name!r} failed, asking the agent instead: {type(e).__name__}: {e}")
+        return False
+
+
+@profiler.profiled('ask_agent')
+def ask_agent(prompt, live=None, on_queued=None):
+    # cache=hit: answer cache, miss: this call asked the agent, shared: waited on an identical question
+    with metrics.span('ask_agent', cache='hit') as tags:
+        fingerprint = CORTEX_APP.request_template.fingerprint
+        resp = answer_cache.get(prompt, fingerprint)
+        if resp is not None:
+            if DEBUG:
+                print(f"Answer cache hit: {answer_cache.stats()}")
+            return resp
+
+        tags['cache'] = 'shared'
+
+        def fetch():
+            tags['cache'] = 'miss'
+            start = time.perf_counter()
+            # Only send the tools the question is about. The route follows from the prompt and the
+            # configuration, so answers stay keyed by the full configuration's fingerprint
+            route = tool_router.route(prompt, CORTEX_APP.request_template)
+            tags['tools'] = len(route.tools)
+            # Only the caller that actually hits the agent takes one of the global agent slots
+            with agent_admission.slot(on_queued):
+                resp = call_agent(prompt, route.template, live)
+            # Never cache error responses
+            if resp is not None and not resp.get('error'):
+                answer_cache.put(prompt, fingerprint, resp, time.perf_counter() - start)
+            return resp
+
+        # Identical questions asked while this one is in flight wait for and share its answer
+        return agent_flight.do((normalize_prompt(prompt), fingerprint), fetch)
+
+
+def call_agent(prompt, request_template=None, live=None):
+    if live is None:
+        resp = CORTEX_APP.chat(prompt, request_template)
+        return resp
+
+    resp = None
+    for event in CORTEX_APP.stream_chat(prompt, request_template):
+        if event['type'] == 'text':
+            live.append(event['text'])
+        elif event['type'] == 'tool_use':
+            live.set_status(f":hammer_and_wrench: Running {event['tool_use'].get('name', 'tool')}...")
+        elif event['type'] == 'tool_results':
+            live.set_status(":inbox_tray: Tool results received, finishing up...")
+        elif event['type'] == 'done':
+            # Show the last buffered text now rather than when the queries finish
+            live.flush(force=True)
+            resp = event['response']
     return resp
 
 
-def display_agent_response(content, say):
+@profiler.profiled('display_agent_response')
+def display_agent_response(content, say, ticket=None):
     if content.get('sql'):
-        sql = content['sql']
-        # Execute SQL query and get result with snowflake cursor
-        cursor = CONN.cursor()
-        cursor.execute(sql)
-
-        # Convert the result to a pandas DataFrame
-        result = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(result, columns=columns)
-        cursor.close()
-
-        # Display the table result
-        say(
-            text="Answer:",
-            blocks=[
-                {
-                    "type": "rich_text",
-                    "elements": [
-                        {
-                            "type": "rich_text_quote",
-                            "elements": [
-                                {
-                                    "type": "text",
-                                    "text": "Answer:",
-                                    "style": {
-                                        "bold": True
-                                    }
-                                }
-                            ]
-                        },
-                        {
-                            "type": "rich_text_preformatted",
-                            "elements": [
-                                {
-                                    "type": "text",
-                                    "text": f"{df.to_string()}"
-                                }
-                            ]
-                        }
-                    ]
-                }
-            ]
-        )
-
-        # Determine if a chart should be created based on the text content
-        text = content.get('text', '').lower()
-        chart_type = None
-
-        # Check for specific visualization requests in the query response
-        if 'pie chart' in text or 'pie graph' in text:
-            chart_type = 'pie'
-        elif 'bar chart' in text or 'bar graph' in text:
-            chart_type = 'bar'
-        elif 'line chart' in text or 'line graph' in text or 'trend' in text:
-            chart_type = 'line'
-        elif 'scatter' in text or 'correlation' in text or 'relationship between' in text:
-            chart_type = 'scatter'
-
-        # Only create chart if there's enough data
-        if len(df.columns) > 1 and len(df) > 0:
-            # If a specific chart type was requested or if it seems appropriate for visualization
-            if chart_type or 'visual' in text or 'chart' in text or 'graph' in text or 'plot' in text:
-                chart_img_url = None
-                try:
-                    # Use detected chart type or default to pie chart
-                    chart_img_url = plot_chart(df, chart_type or 'pie')
-                except Exception as e:
-                    error_info = f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}"
-                    print(f"Warning: Data likely not suitable for displaying as a chart. {error_info}")
-
-                if chart_img_url is not None:
-                    # Determine chart type name for display
-                    display_type = chart_type.capitalize() if chart_type else "Data"
-
-                    say(
-                        text=f"{display_type} Chart",
-                        blocks=[
-                            {
-                                "type": "image",
-                                "title": {
-                                    "type": "plain_text",
-                                    "text": f"{display_type} Chart Visualization"
-                                },
-                                "block_id": "image",
-                                "slack_file": {
-                                    "url": f"{chart_img_url}"
-                                },
-                                "alt_text": f"{display_type} Chart"
-                            }
-                        ]
-                    )
+        # Run the SQL generated for every semantic model the agent used, concurrently
+        sql_results = content.get('sql_results') or {'': content['sql']}
+        results = run_queries(sql_results, ticket)
+
+        if any(isinstance(result, QuerySupersededError) for result in results.values()):
+            say(**slack_blocks.query_cancelled())
+            return
+
+        for tool_name, result in results.items():
+            # Label answers by semantic model when the question spanned several of them
+            label = CORTEX_APP.tool_label(tool_name) if len(results) > 1 else None
+            if isinstance(result, Exception):
+                if len(results) == 1:
+                    raise result
+                display_query_error(result, label, say)
+            else:
+                display_dataframe(result, content, label, say)
     else:
         # Check if the response is just a generic assistant message without useful content
         text = content.get('text', '').strip()
         citations = content.get('citations', '').strip()
+        say(**slack_blocks.text_answer(text, citations))
 
-        # Only show the citation section if there are actual citations
-        citation_block = []
-        if citations:
-            citation_block = [
-                {
-                    "type": "rich_text_quote",
-                    "elements": [
-                        {
-                            "type": "text",
-                            "text": f"* Citation: {citations}",
-                            "style": {
-                                "italic": True
-                            }
-                        }
-                    ]
-                }
-            ]
-
-        say(
-            text="Answer:",
-            blocks=[
-                {
-                    "type": "rich_text",
-                    "elements": [
-                        {
-                            "type": "rich_text_quote",
-                            "elements": [
-                                {
-                                    "type": "text",
-                                    "text": f"Answer: {text}",
-                                    "style": {
-                                        "bold": True
-                                    }
-                                }
-                            ]
-                        },
-                        *citation_block
-                    ]
-                }
-            ]
-        )
+
+def display_dataframe(df, content, label, say):
+    """Post a query result table, and a chart when the answer asks for one."""
+    # Display the table result
+    say(**slack_blocks.table_answer(df, label))
+
+    # Determine if a chart should be created based on the text content
+    wanted, chart_type = slack_blocks.requested_chart(content.get('text', ''), df)
+    if wanted:
+        # Render, upload and post the chart in the background so the handler is not held up.
+        # The copied context carries the profiler's sampling decision over to the chart thread.
+        chart_executor.submit(contextvars.copy_context().run, post_chart, df, chart_type, say)
 
 
+def display_query_error(error, label, say):
+    """Report a failed query for one semantic model without hiding the others' answers."""
+    print(f"Query for {label} failed: {type(error).__name__}: {error}")
+    say(**slack_blocks.query_failed(error, label))
+
+
+def store_result(sql, df):
+    """Cache a query result. Best effort: a failed write (e.g. a locked state store) only means a later re-run."""
+    try:
+        result_cache.put(sql, ROLE, WAREHOUSE, df)
+    except Exception as e:
+        print(f"Could not cache a query result: {type(e).__name__}: {e}")
+
+
+def run_queries(queries, ticket=None):
+    """
+    Execute several SQL statements (keyed by tool name) concurrently as Snowflake async queries.
+    Cached results are served without touching the warehouse.
+
+    Args:
+        queries: Mapping of tool name to SQL
+        ticket: QueryTicket whose queries are cancelled if a newer question supersedes it
+
+    Returns:
+        Mapping of the same keys to a DataFrame, or to the exception that query failed with
+    """
+    results = {}
+    misses = {}
+    for key, sql in queries.items():
+        df = result_cache.get(sql, ROLE, WAREHOUSE)
+        if df is not None:
+            if DEBUG:
+                print(f"SQL result cache hit: {result_cache.stats()}")
+            results[key] = df
+        else:
+            misses[key] = sql
+
+    # Identical SQL already running for someone else is waited on instead of submitted again
+    leading, following = {}, {}
+    for key, sql in misses.items():
+        flight_key = ResultCache.key(sql, ROLE, WAREHOUSE)
+        call, leader = sql_flight.join(flight_key)
+        if leader:
+            leading[key] = flight_key
+        else:
+            following[key] = call
+
+    if leading:
+        try:
+            # One pooled session runs all queries at once; expired sessions are reconnected transparently
+            with sql_admission.slot():
+                fetched = CONN_POOL.run(lambda conn: execute_concurrently(
+                    conn, {key: misses[key] for key in leading}, SQL_QUERY_TIMEOUT or None, MAX_RESULT_ROWS or None, ticket,
+                    {key: CORTEX_APP.tool_label(key) or None for key in leading}
+                ))
+        except Exception as e:
+            for flight_key in leading.values():
+                sql_flight.complete(flight_key, error=e)
+            raise
+        try:
+            for key in leading:
+                results[key] = fetched[key]
+        finally:
+            # Release every waiter before anything else can go wrong, including the cache writes below
+            for key, flight_key in leading.items():
+                if key in fetched:
+                    sql_flight.complete(flight_key, fetched[key])
+                else:
+                    sql_flight.complete(flight_key, error=KeyError(key))
+        for key, result in fetched.items():
+            if not isinstance(result, Exception):
+                store_result(queries[key], result)
+
+    for key, call in following.items():
+        try:
+            result = call.result()
+        except Exception as e:
+            result = e
+        if isinstance(result, QuerySupersededError) and not (ticket and ticket.superseded.is_set()):
+            # The leader's user moved on and cancelled the shared query, but we still want the answer
+            result = run_queries({key: misses[key]}, ticket)[key]
+        elif not isinstance(result, Exception):
+            result = result.copy()  # Every waiter gets its own frame
+        results[key] = result
+
+    return {key: results[key] for key in queries}
+
+
+def run_query(sql):
+    """Execute a single SQL statement and return the result as a DataFrame."""
+    result = run_queries({'': sql})['']
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+@profiler.profiled('plot_chart')
 def plot_chart(df, chart_type='pie'):
     """
     Create charts based on dataframe and requested chart type.
@@ -300,180 +372,114 @@ def plot_chart(df, chart_type='pie'):
     Returns:
         URL to the uploaded chart image in Slack
     """
-    plt.figure(figsize=(10, 6), facecolor='#333333')
-
-    # Set text color for all elements
-    plt.rcParams['text.color'] = 'white'
-    plt.rcParams['axes.labelcolor'] = 'white'
-    plt.rcParams['xtick.color'] = 'white'
-    plt.rcParams['ytick.color'] = 'white'
-
-    # Determine what kind of chart to create based on prompt
-    if chart_type.lower() == 'pie':
-        # Pie chart (default)
-        plt.pie(df[df.columns[1]],
-                labels=df[df.columns[0]],
-                autopct='%1.1f%%',
-                startangle=90,
-                colors=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b'],
-                textprops={'color': "white", 'fontsize': 12})
-        plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
-        plt.title(f'{df.columns[1]} by {df.columns[0]}', color='white', fontsize=14)
-
-    elif chart_type.lower() == 'bar':
-        # Bar chart
-        ax = plt.subplot(111)
-        ax.bar(df[df.columns[0]], df[df.columns[1]], color='#1f77b4')
-        plt.xlabel(df.columns[0], fontsize=12)
-        plt.ylabel(df.columns[1], fontsize=12)
-        plt.title(f'{df.columns[1]} by {df.columns[0]}', color='white', fontsize=14)
-        plt.xticks(rotation=45, ha='right')
-        ax.set_facecolor('#333333')
-
-    elif chart_type.lower() == 'line':
-        # Line chart
-        ax = plt.subplot(111)
-        ax.plot(df[df.columns[0]], df[df.columns[1]], marker='o', color='#1f77b4')
-        plt.xlabel(df.columns[0], fontsize=12)
-        plt.ylabel(df.columns[1], fontsize=12)
-        plt.title(f'{df.columns[1]} over {df.columns[0]}', color='white', fontsize=14)
-        plt.xticks(rotation=45, ha='right')
-        ax.set_facecolor('#333333')
-        plt.grid(True, alpha=0.3)
-
-    elif chart_type.lower() == 'scatter':
-        # Scatter plot (requires at least 3 columns)
-        if len(df.columns) >= 3:
-            ax = plt.subplot(111)
-            scatter = ax.scatter(df[df.columns[0]], df[df.columns[1]],
-                                 c=df[df.columns[2]] if len(df.columns) > 2 else None,
-                                 s=100,
-                                 alpha=0.7,
-                                 cmap='viridis')
-            plt.xlabel(df.columns[0], fontsize=12)
-            plt.ylabel(df.columns[1], fontsize=12)
-            plt.title(f'Relationship between {df.columns[0]} and {df.columns[1]}', color='white', fontsize=14)
-            if len(df.columns) > 2:
-                plt.colorbar(scatter, label=df.columns[2])
-            ax.set_facecolor('#333333')
-            plt.grid(True, alpha=0.3)
-        else:
-            # Fallback to scatter plot with just 2 columns
-            ax = plt.subplot(111)
-            ax.scatter(df[df.columns[0]], df[df.columns[1]], color='#1f77b4', s=100, alpha=0.7)
-            plt.xlabel(df.columns[0], fontsize=12)
-            plt.ylabel(df.columns[1], fontsize=12)
-            plt.title(f'Relationship between {df.columns[0]} and {df.columns[1]}', color='white', fontsize=14)
-            ax.set_facecolor('#333333')
-            plt.grid(True, alpha=0.3)
+    # Render in memory on the chart worker pool
+    with metrics.span('plot', chart_type=chart_type, rows=len(df)):
+        image = chart_renderer.render(df, chart_type)
+
+    # upload image bytes to slack; returns as soon as Slack can display the file
+    with metrics.span('upload', chart_type=chart_type, bytes=len(image)):
+        return file_uploader.upload(image, f'{chart_type}_chart.jpg', f"{chart_type} chart")
+
+
+def post_chart(df, chart_type, say):
+    """Render and upload the chart, then post it as soon as the file is usable."""
+    chart_img_url = None
+    try:
+        # Use detected chart type or default to pie chart
+        chart_img_url = plot_chart(df, chart_type or 'pie')
+    except Exception as e:
+        error_info = f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}"
+        print(f"Warning: Data likely not suitable for displaying as a chart. {error_info}")
+
+    if chart_img_url is not None:
+        say(**slack_blocks.chart(chart_img_url, chart_type))
 
-    else:
-        # Default to bar chart if unknown type
-        ax = plt.subplot(111)
-        ax.bar(df[df.columns[0]], df[df.columns[1]], color='#1f77b4')
-        plt.xlabel(df.columns[0], fontsize=12)
-        plt.ylabel(df.columns[1], fontsize=12)
-        plt.title(f'{df.columns[1]} by {df.columns[0]}', color='white', fontsize=14)
-        plt.xticks(rotation=45, ha='right')
-        ax.set_facecolor('#333333')
-
-    # Set the background color for the plot area to dark
-    plt.gca().set_facecolor('#333333')
-    plt.tight_layout()
-
-    # save the chart as a .jpg file
-    file_path_jpg = f'{chart_type}_chart.jpg'
-    plt.savefig(file_path_jpg, format='jpg', facecolor='#333333')
-    file_size = os.path.getsize(file_path_jpg)
-
-    # upload image file to slack
-    file_upload_url_response = app.client.files_getUploadURLExternal(filename=file_path_jpg, length=file_size)
-    if DEBUG:
-        print(file_upload_url_response)
-    file_upload_url = file_upload_url_response['upload_url']
-    file_id = file_upload_url_response['file_id']
-    with open(file_path_jpg, 'rb') as f:
-        response = requests.post(file_upload_url, files={'file': f})
-
-    # check the response
-    img_url = None
-    if response.status_code != 200:
-        print("File upload failed", response.text)
-    else:
-        # complete upload and get permalink to display
-        response = app.client.files_completeUploadExternal(files=[{"id": file_id, "title": f"{chart_type} chart"}])
-        if DEBUG:
-            print(response)
-        img_url = response['files'][0]['permalink']
-        time.sleep(2)
 
-    return img_url
+def index_semantic_models(conn_pool, request_template):
+    """Read every semantic model once, for the verified queries and the tool router; returns a warmup detail."""
+    models = load_semantic_models(conn_pool, request_template)
+    details = []
+    if VERIFIED_QUERIES:
+        details.append(verified_queries.load(models))
+    if TOOL_ROUTING:
+        details.append(tool_router.load(conn_pool, request_template, models))
+    return ", ".join(details)
 
 
 def init():
-    conn, jwt, cortex_app = None, None, None
-
-    conn = snowflake.connector.connect(
-        user=USER,
-        authenticator="SNOWFLAKE_JWT",
-        private_key_file=RSA_PRIVATE_KEY_PATH,
-        account=ACCOUNT,
-        warehouse=WAREHOUSE,
-        role=ROLE,
-        host=HOST
-    )
-    if not conn.rest.token:
-        print(">>>>>>>>>> Snowflake connection unsuccessful!")
-
-    # Collect semantic models using a generic approach
-    semantic_models = []
-
-    # Look for any environment variables ending with _SEMANTIC_MODEL
-    for key, value in os.environ.items():
-        if key.endswith("_SEMANTIC_MODEL") and value:
-            model = value.strip()
-            if model and model not in semantic_models:
-                semantic_models.append(model)
-                print(f"Found semantic model ({key}): {model}")
-
-    # Collect search services using the same approach
-    search_services = []
-
-    # Look for any environment variables ending with _SEARCH_SERVICE
-    for key, value in os.environ.items():
-        if key.endswith("_SEARCH_SERVICE") and value:
-            service = value.strip()
-            if service and service not in search_services:
-                search_services.append(service)
-                print(f"Found search service ({key}): {service}")
-
-    # Create the CortexChat instance with all parameters
-    if len(semantic_models) == 0:
-        print("WARNING: No semantic models found in environment variables!")
-    else:
-        print(f"Using semantic models: {semantic_models}")
+    conn_pool, jwt, cortex_app = None, None, None
+    start = time.perf_counter()
+
+    # Any environment variable ending with _SEMANTIC_MODEL or _SEARCH_SERVICE
+    semantic_models, search_services = agent_sources()
+
+    def create_agent():
+        # Loads the private key and signs the first JWT
+        return CortexChat(
+            agent_url=AGENT_ENDPOINT,
+            search_services=search_services,
+            semantic_models=semantic_models,
+            model=MODEL,
+            account=ACCOUNT,
+            user=USER,
+            private_key_path=RSA_PRIVATE_KEY_PATH,
+            pool_size=AGENT_POOL_SIZE
+        )
 
-    if len(search_services) == 0:
-        print("WARNING: No search services found in environment variables!")
-    else:
-        print(f"Using search services: {search_services}")
-
-    cortex_app = CortexChat(
-        agent_url=AGENT_ENDPOINT,
-        search_services=search_services,
-        semantic_models=semantic_models,
-        model=MODEL,
-        account=ACCOUNT,
-        user=USER,
-        private_key_path=RSA_PRIVATE_KEY_PATH
+    # Connecting to Snowflake (which also imports the connector) and setting up the agent are independent
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='init') as executor:
+        # Opens the first connection right away so bad credentials fail at startup
+        pool_future = executor.submit(SnowflakeConnectionPool, connect_snowflake, max_size=SNOWFLAKE_POOL_SIZE)
+        agent_future = executor.submit(create_agent)
+        conn_pool = pool_future.result()
+        cortex_app = agent_future.result()
+
+    # Warm up connections and check every configured model and service before taking questions
+    steps = default_steps(conn_pool, cortex_app.warmup, AGENT_WARMUP_CONNECTIONS, WAREHOUSE, cortex_app.request_template)
+    if VERIFIED_QUERIES or TOOL_ROUTING:
+        # Without the index every question simply goes to the agent with all tools, so this never stops startup
+        steps.append(WarmupStep("semantic model index",
+                                lambda: index_semantic_models(conn_pool, cortex_app.request_template), required=False))
+    run_warmup(
+        steps,
+        timeout=WARMUP_TIMEOUT,
+        fail_fast=WARMUP_FAIL_FAST
     )
+    if DEBUG:
+        print(cortex_app.pool_stats())
+        print(conn_pool.metrics())
+
+    print(f">>>>>>>>>> Init complete in {time.perf_counter() - start:.2f}s (worker {worker_id()})")
+    return conn_pool, jwt, cortex_app
 
-    print(">>>>>>>>>> Init complete")
-    return conn, jwt, cortex_app
+
+def start_metrics():
+    """Apply the metrics settings; every worker serves its own histograms on METRICS_PORT + its index."""
+    metrics.registry.json_logs = METRICS_JSON_LOGS
+    if METRICS_PORT:
+        metrics.registry.serve(METRICS_PORT + worker_id())
+
+
+def start_profiler():
+    """`kill -USR1 <pid>` switches profiling on and off; PROFILE_ON_START switches it on right away."""
+    profiler.install_signal_handler()
+    if PROFILE_ON_START:
+        profiler.enable()
+
+
+def run():
+    global CONN_POOL, JWT, CORTEX_APP
+    start_metrics()
+    start_profiler()
+    CONN_POOL, JWT, CORTEX_APP = init()
+    SocketModeHandler(app, SLACK_APP_TOKEN).start()
 
 
 # Start app
 if __name__ == "__main__":
-    CONN, JWT, CORTEX_APP = init()
-    Root = Root(CONN)
-    SocketModeHandler(app, SLACK_APP_TOKEN).start()
\ No newline at end of file
+    if BOT_WORKERS > 1:
+        if not state_store.shared:
+            print("WARNING: BOT_WORKERS > 1 without a shared STATE_BACKEND, workers will not share warnings, events or caches")
+        run_workers(BOT_WORKERS, run)
+    else:
+        run()
\ No newline at end of file
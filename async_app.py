@@ -0,0 +1,474 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_sdk import WebClient
+from async_cortex_chat import AsyncCortexChat
+from slack_stream import AsyncLiveMessage
+from answer_cache import AnswerCache, normalize_prompt
+from result_cache import ResultCache
+from connection_pool import SnowflakeConnectionPool
+from query_runner import execute_concurrently_async, QueryTracker, QuerySupersededError
+from single_flight import AsyncSingleFlight
+from admission import AsyncAdmissionController, RateLimiter, Overloaded, check_limits
+from charts import ChartRenderer
+from slack_files import SlackFileUploader
+from event_dedupe import EventDeduplicator, event_keys
+from state_store import create_state_store, DailyNotices
+from workers import run_workers, worker_id
+from warmup import WarmupStep, default_steps, run_warmup
+from verified_queries import VerifiedQueryIndex, verified_response
+from semantic_models import load_semantic_models
+from tool_router import ToolRouter
+import slack_blocks
+import metrics
+from profiling import Profiler, is_profile_command
+from config import (
+    ACCOUNT, USER, ROLE, WAREHOUSE, SLACK_APP_TOKEN, SLACK_BOT_TOKEN, AGENT_ENDPOINT, RSA_PRIVATE_KEY_PATH, MODEL,
+    STREAM_RESPONSES, STREAM_UPDATE_INTERVAL, AGENT_POOL_SIZE, AGENT_WARMUP_CONNECTIONS,
+    ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MAX_MB, SQL_CACHE_TTL, SQL_CACHE_MAX_MB,
+    MAX_CONCURRENT_AGENT_CALLS, MAX_CONCURRENT_QUERIES, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT,
+    USER_RATE_PER_MINUTE, USER_BURST, CHANNEL_RATE_PER_MINUTE, CHANNEL_BURST, EVENT_DEDUPE_TTL, EVENT_DEDUPE_MAX_ENTRIES,
+    STATE_BACKEND, BOT_WORKERS, WARMUP_TIMEOUT, WARMUP_FAIL_FAST, METRICS_PORT, METRICS_JSON_LOGS,
+    PROFILE_ADMINS, PROFILE_SAMPLE_PERCENT, PROFILE_DIR, PROFILE_TOP_ALLOCATORS, PROFILE_ON_START,
+    VERIFIED_QUERIES, VERIFIED_QUERY_THRESHOLD, TOOL_ROUTING, TOOL_ROUTING_TOP_K, TOOL_ROUTING_MIN_COVERAGE,
+    SNOWFLAKE_POOL_SIZE, MAX_RESULT_ROWS, SQL_QUERY_TIMEOUT, CHART_WORKERS, CHART_USE_PROCESSES, CHART_READY_TIMEOUT,
+    ASYNC_WORKER_THREADS, agent_sources, connect_snowflake
+)
+
+# asyncio variant of app.py: every conversation is a coroutine on one event loop, so waiting on
+# the agent stream, the warehouse and Slack costs no thread. Blocking connector calls, DataFrame
+# formatting and uploads go to a bounded thread pool; charts render on the ChartRenderer pool.
+
+DEBUG = False
+
+# Initializes app
+app = AsyncApp(token=SLACK_BOT_TOKEN)
+
+# Per-user records, handled events and (when shared between processes) cache entries
+# Every call into the store, the caches and the deduplicator below goes through asyncio.to_thread:
+# a SQLite backend blocks on file locks that other bot processes may hold
+state_store = create_state_store(STATE_BACKEND)
+shared_store = state_store if state_store.shared else None
+# Which users already got today's AI warning
+daily_notices = DailyNotices(state_store)
+
+answer_cache = AnswerCache(
+    ttl_seconds=ANSWER_CACHE_TTL,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    max_bytes=int(ANSWER_CACHE_MAX_MB * 1024 * 1024),
+    store=shared_store
+)
+result_cache = ResultCache(
+    ttl_seconds=SQL_CACHE_TTL,
+    max_bytes=int(SQL_CACHE_MAX_MB * 1024 * 1024),
+    store=shared_store
+)
+agent_admission = AsyncAdmissionController("AI Analyst", MAX_CONCURRENT_AGENT_CALLS, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT)
+sql_admission = AsyncAdmissionController("Warehouse", MAX_CONCURRENT_QUERIES, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT)
+# Slack event IDs / message IDs already handled, so redeliveries are not answered twice
+event_dedupe = EventDeduplicator(EVENT_DEDUPE_TTL, EVENT_DEDUPE_MAX_ENTRIES, store=shared_store)
+user_limiter = RateLimiter(USER_RATE_PER_MINUTE, USER_BURST)
+channel_limiter = RateLimiter(CHANNEL_RATE_PER_MINUTE, CHANNEL_BURST)
+# Concurrent identical questions and identical SQL share one agent call / one query
+agent_flight = AsyncSingleFlight()
+sql_flight = AsyncSingleFlight()
+# Running queries per user and thread, so a newer question cancels the previous one's queries
+query_tracker = QueryTracker()
+# Samples requests for cProfile/tracemalloc while switched on (signal or admin command)
+profiler = Profiler(PROFILE_DIR, PROFILE_SAMPLE_PERCENT, PROFILE_TOP_ALLOCATORS)
+# Loaded from the semantic models during init()
+verified_queries = VerifiedQueryIndex(VERIFIED_QUERY_THRESHOLD)
+tool_router = ToolRouter(TOOL_ROUTING_TOP_K, TOOL_ROUTING_MIN_COVERAGE)
+chart_renderer = ChartRenderer(max_workers=CHART_WORKERS, use_processes=CHART_USE_PROCESSES)
+# The upload flow is a few blocking calls made from a worker thread, so it keeps a sync client
+file_uploader = SlackFileUploader(WebClient(token=SLACK_BOT_TOKEN), ready_timeout=CHART_READY_TIMEOUT)
+# Chart tasks run after the handler returns; hold references so they are not garbage collected
+chart_tasks = set()
+
+
+@app.message("hello")
+async def message_hello(message, say):
+    await say(f"Hey there <@{message['user']}>!")
+
+    hello_message = """
+    I'm your AI Analyst. I've already crunched the numbers on your greeting and can confirm it's 99.9% awesome. Still room to improve :sweat_smile: Ready to crunch some numbers together?"
+    """
+
+    await say(hello_message)
+
+
+@app.event("message")
+async def handle_message_events(ack, body, say):
+    # Once the answer streams into the "generating" message, errors replace that message too
+    reply = say
+    try:
+        await ack()
+        # Slack redelivers events it believes were missed; answer each message only once
+        if await asyncio.to_thread(event_dedupe.seen, event_keys(body)):
+            print(f"Dropping duplicate delivery of event {body.get('event_id')}")
+            return
+
+        prompt = body['event']['text']
+        user_id = body['event']['user']
+        # Admin-only switch for runtime profiling
+        if is_profile_command(prompt):
+            message = profiler.command(prompt) if user_id in PROFILE_ADMINS else "Profiling commands are limited to bot admins."
+            await say(message)
+            return
+
+        # A new question from the same user in the same channel/thread supersedes their previous one
+        owner = (body['event'].get('channel'), body['event'].get('thread_ts'), user_id)
+
+        # Per-user and per-channel token buckets keep one person or channel from starving the others
+        retry_after = check_limits((user_limiter, user_id), (channel_limiter, body['event'].get('channel')))
+        if retry_after > 0:
+            await say(**slack_blocks.rate_limited(retry_after))
+            return
+
+        # Show AI warning if this is the first interaction today
+        if await asyncio.to_thread(daily_notices.first_today, user_id):
+            await say(**slack_blocks.ai_warning())
+
+        thinking = await say(**slack_blocks.generating())
+
+        async def on_queued(position):
+            await say(**slack_blocks.queued(position))
+
+        ticket = query_tracker.start(owner)
+        try:
+            # The whole answer, from the first agent byte to the last table posted (charts follow on their own)
+            with metrics.span('request', streamed=STREAM_RESPONSES), profiler.request(user_id):
+                live = None
+                if STREAM_RESPONSES:
+                    # Edit the "generating" message in place as the agent streams its answer
+                    live = AsyncLiveMessage(app.client, thinking['channel'], thinking['ts'], STREAM_UPDATE_INTERVAL)
+                reply = live.say if live else say
+                # Questions with vetted SQL in a semantic model skip the agent
+                if not await answer_verified(prompt, reply, ticket):
+                    response = await ask_agent(prompt, live, on_queued)
+                    await display_agent_response(response, reply, ticket)
+        finally:
+            query_tracker.finish(ticket)
+            if DEBUG:
+                print(metrics.registry.summary())
+    except Overloaded as e:
+        # Shed load with a friendly message instead of a stack trace
+        print(f"Request shed: {e}")
+        await reply(**slack_blocks.overloaded())
+    except Exception as e:
+        error_info = f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}"
+        print(error_info)
+        await reply(**slack_blocks.request_failed(error_info))
+
+
+async def answer_verified(prompt, say, ticket=None):
+    """Answer with the SQL of the verified query the prompt asks for; returns False to leave it to the agent."""
+    match = verified_queries.match(prompt)
+    if match is None:
+        return False
+    query = match.query
+    print(f"Answering from verified query {query.name!r} (score {match.score:.2f})")
+    try:
+        with metrics.span('verified_query', semantic_model=CORTEX_APP.tool_label(query.tool)):
+            await display_agent_response(verified_response(query), say, ticket)
+        return True
+    except Exception as e:
+        print(f"Verified query {query.name!r} failed, asking the agent instead: {type(e).__name__}: {e}")
+        return False
+
+
+@profiler.profiled('ask_agent')
+async def ask_agent(prompt, live=None, on_queued=None):
+    # cache=hit: answer cache, miss: this call asked the agent, shared: waited on an identical question
+    with metrics.span('ask_agent', cache='hit') as tags:
+        fingerprint = CORTEX_APP.request_template.fingerprint
+        resp = await asyncio.to_thread(answer_cache.get, prompt, fingerprint)
+        if resp is not None:
+            if DEBUG:
+                print(f"Answer cache hit: {answer_cache.stats()}")
+            return resp
+
+        tags['cache'] = 'shared'
+
+        async def fetch():
+            tags['cache'] = 'miss'
+            start = time.perf_counter()
+            # Only send the tools the question is about. The route follows from the prompt and the
+            # configuration, so answers stay keyed by the full configuration's fingerprint
+            route = tool_router.route(prompt, CORTEX_APP.request_template)
+            tags['tools'] = len(route.tools)
+            # Only the caller that actually hits the agent takes one of the global agent slots
+            async with agent_admission.slot(on_queued):
+                resp = await call_agent(prompt, route.template, live)
+            # Never cache error responses
+            if resp is not None and not resp.get('error'):
+                await asyncio.to_thread(answer_cache.put, prompt, fingerprint, resp, time.perf_counter() - start)
+            return resp
+
+        # Identical questions asked while this one is in flight wait for and share its answer
+        return await agent_flight.do((normalize_prompt(prompt), fingerprint), fetch)
+
+
+async def call_agent(prompt, request_template=None, live=None):
+    if live is None:
+        return await CORTEX_APP.chat(prompt, request_template)
+
+    resp = None
+    async for event in CORTEX_APP.stream_chat(prompt, request_template):
+        if event['type'] == 'text':
+            await live.append(event['text'])
+        elif event['type'] == 'tool_use':
+            await live.set_status(f":hammer_and_wrench: Running {event['tool_use'].get('name', 'tool')}...")
+        elif event['type'] == 'tool_results':
+            await live.set_status(":inbox_tray: Tool results received, finishing up...")
+        elif event['type'] == 'done':
+            # Show the last buffered text now rather than when the queries finish
+            await live.flush(force=True)
+            resp = event['response']
+    return resp
+
+
+@profiler.profiled('display_agent_response')
+async def display_agent_response(content, say, ticket=None):
+    if content.get('sql'):
+        # Run the SQL generated for every semantic model the agent used, concurrently
+        sql_results = content.get('sql_results') or {'': content['sql']}
+        results = await run_queries(sql_results, ticket)
+
+        if any(isinstance(result, QuerySupersededError) for result in results.values()):
+            await say(**slack_blocks.query_cancelled())
+            return
+
+        for tool_name, result in results.items():
+            # Label answers by semantic model when the question spanned several of them
+            label = CORTEX_APP.tool_label(tool_name) if len(results) > 1 else None
+            if isinstance(result, Exception):
+                if len(results) == 1:
+                    raise result
+                print(f"Query for {label} failed: {type(result).__name__}: {result}")
+                await say(**slack_blocks.query_failed(result, label))
+            else:
+                await display_dataframe(result, content, label, say)
+    else:
+        text = content.get('text', '').strip()
+        citations = content.get('citations', '').strip()
+        await say(**slack_blocks.text_answer(text, citations))
+
+
+async def display_dataframe(df, content, label, say):
+    """Post a query result table, and a chart when the answer asks for one."""
+    # Formatting a large frame is CPU work; keep it off the event loop
+    await say(**await asyncio.to_thread(slack_blocks.table_answer, df, label))
+
+    wanted, chart_type = slack_blocks.requested_chart(content.get('text', ''), df)
+    if wanted:
+        # Render, upload and post the chart in the background so the handler is not held up
+        task = asyncio.create_task(post_chart(df, chart_type, say))
+        chart_tasks.add(task)
+        task.add_done_callback(chart_tasks.discard)
+
+
+async def store_result(sql, df):
+    """Cache a query result. Best effort: a failed write (e.g. a locked state store) only means a later re-run."""
+    try:
+        # Compacting, pickling and the shared store's file I/O stay off the event loop
+        await asyncio.to_thread(result_cache.put, sql, ROLE, WAREHOUSE, df)
+    except Exception as e:
+        print(f"Could not cache a query result: {type(e).__name__}: {e}")
+
+
+async def run_queries(queries, ticket=None):
+    """
+    Async run_queries() from app.py: cached results first, identical in-flight SQL is awaited,
+    and the remaining statements run concurrently on one pooled session.
+
+    Returns:
+        Mapping of the same keys to a DataFrame, or to the exception that query failed with
+    """
+    results = {}
+    misses = {}
+    for key, sql in queries.items():
+        df = await asyncio.to_thread(result_cache.get, sql, ROLE, WAREHOUSE)
+        if df is not None:
+            results[key] = df
+        else:
+            misses[key] = sql
+
+    leading, following = {}, {}
+    for key, sql in misses.items():
+        flight_key = ResultCache.key(sql, ROLE, WAREHOUSE)
+        future, leader = sql_flight.join(flight_key)
+        if leader:
+            leading[key] = flight_key
+        else:
+            following[key] = future
+
+    if leading:
+        try:
+            async with sql_admission.slot():
+                fetched = await CONN_POOL.run_async(lambda conn: execute_concurrently_async(
+                    conn, {key: misses[key] for key in leading}, SQL_QUERY_TIMEOUT or None, MAX_RESULT_ROWS or None, ticket,
+                    {key: CORTEX_APP.tool_label(key) or None for key in leading}
+                ))
+        except BaseException as e:
+            for flight_key in leading.values():
+                sql_flight.complete(flight_key, error=e)
+            raise
+        try:
+            for key in leading:
+                results[key] = fetched[key]
+        finally:
+            # Release every waiter before anything else can go wrong, including the cache writes below
+            for key, flight_key in leading.items():
+                if key in fetched:
+                    sql_flight.complete(flight_key, fetched[key])
+                else:
+                    sql_flight.complete(flight_key, error=KeyError(key))
+        for key, result in fetched.items():
+            if not isinstance(result, Exception):
+                await store_result(queries[key], result)
+
+    for key, future in following.items():
+        try:
+            result = await sql_flight.result(future)
+        except Exception as e:
+            result = e
+        if isinstance(result, QuerySupersededError) and not (ticket and ticket.superseded.is_set()):
+            # The leader's user moved on and cancelled the shared query, but we still want the answer
+            result = (await run_queries({key: misses[key]}, ticket))[key]
+        elif not isinstance(result, Exception):
+            result = result.copy()  # Every waiter gets its own frame
+        results[key] = result
+
+    return {key: results[key] for key in queries}
+
+
+@profiler.profiled('plot_chart')
+async def plot_chart(df, chart_type='pie'):
+    """Render the chart on the chart pool, upload it and return its Slack URL."""
+    with metrics.span('plot', chart_type=chart_type, rows=len(df)):
+        image = await asyncio.wrap_future(chart_renderer.submit(df, chart_type))
+    with metrics.span('upload', chart_type=chart_type, bytes=len(image)):
+        return await asyncio.to_thread(file_uploader.upload, image, f'{chart_type}_chart.jpg', f"{chart_type} chart")
+
+
+async def post_chart(df, chart_type, say):
+    """Render and upload the chart, then post it as soon as the file is usable."""
+    chart_img_url = None
+    try:
+        # Use detected chart type or default to pie chart
+        chart_img_url = await plot_chart(df, chart_type or 'pie')
+    except Exception as e:
+        error_info = f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}"
+        print(f"Warning: Data likely not suitable for displaying as a chart. {error_info}")
+
+    if chart_img_url is not None:
+        await say(**slack_blocks.chart(chart_img_url, chart_type))
+
+
+def index_semantic_models(conn_pool, request_template):
+    """Read every semantic model once, for the verified queries and the tool router; returns a warmup detail."""
+    models = load_semantic_models(conn_pool, request_template)
+    details = []
+    if VERIFIED_QUERIES:
+        details.append(verified_queries.load(models))
+    if TOOL_ROUTING:
+        details.append(tool_router.load(conn_pool, request_template, models))
+    return ", ".join(details)
+
+
+async def init():
+    # A bounded default executor: asyncio.to_thread() calls share these threads
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=ASYNC_WORKER_THREADS, thread_name_prefix='async-worker')
+    )
+
+    start = time.perf_counter()
+
+    # Any environment variable ending with _SEMANTIC_MODEL or _SEARCH_SERVICE
+    semantic_models, search_services = agent_sources()
+
+    # The constructor loads the private key and signs the first JWT, so it runs in a thread
+    # alongside the first Snowflake connection; that one is opened right away so bad credentials fail at startup
+    conn_pool, cortex_app = await asyncio.gather(
+        asyncio.to_thread(SnowflakeConnectionPool, connect_snowflake, max_size=SNOWFLAKE_POOL_SIZE),
+        asyncio.to_thread(
+            AsyncCortexChat,
+            agent_url=AGENT_ENDPOINT,
+            search_services=search_services,
+            semantic_models=semantic_models,
+            model=MODEL,
+            account=ACCOUNT,
+            user=USER,
+            private_key_path=RSA_PRIVATE_KEY_PATH,
+            pool_size=AGENT_POOL_SIZE
+        )
+    )
+
+    # Warm up connections and check every configured model and service before taking questions.
+    # The steps run on threads; the agent step hands its coroutine back to this loop.
+    loop = asyncio.get_running_loop()
+
+    def agent_warmup(connections):
+        return asyncio.run_coroutine_threadsafe(cortex_app.warmup(connections), loop).result()
+
+    steps = default_steps(conn_pool, agent_warmup, AGENT_WARMUP_CONNECTIONS, WAREHOUSE, cortex_app.request_template)
+    if VERIFIED_QUERIES or TOOL_ROUTING:
+        # Without the index every question simply goes to the agent with all tools, so this never stops startup
+        steps.append(WarmupStep("semantic model index",
+                                lambda: index_semantic_models(conn_pool, cortex_app.request_template), required=False))
+    await asyncio.to_thread(
+        run_warmup,
+        steps,
+        timeout=WARMUP_TIMEOUT,
+        fail_fast=WARMUP_FAIL_FAST
+    )
+    if DEBUG:
+        print(cortex_app.pool_stats())
+        print(conn_pool.metrics())
+
+    print(f">>>>>>>>>> Init complete in {time.perf_counter() - start:.2f}s (worker {worker_id()})")
+    return conn_pool, cortex_app
+
+
+async def main():
+    global CONN_POOL, CORTEX_APP
+    CONN_POOL, CORTEX_APP = await init()
+    try:
+        await AsyncSocketModeHandler(app, SLACK_APP_TOKEN).start_async()
+    finally:
+        await CORTEX_APP.close()
+        chart_renderer.shutdown()
+        CONN_POOL.close()
+
+
+def start_metrics():
+    """Apply the metrics settings; every worker serves its own histograms on METRICS_PORT + its index."""
+    metrics.registry.json_logs = METRICS_JSON_LOGS
+    if METRICS_PORT:
+        metrics.registry.serve(METRICS_PORT + worker_id())
+
+
+def start_profiler():
+    """`kill -USR1 <pid>` switches profiling on and off; PROFILE_ON_START switches it on right away."""
+    profiler.install_signal_handler()
+    if PROFILE_ON_START:
+        profiler.enable()
+
+
+def run():
+    start_metrics()
+    start_profiler()
+    asyncio.run(main())
+
+
+# Start app
+if __name__ == "__main__":
+    if BOT_WORKERS > 1:
+        if not state_store.shared:
+            print("WARNING: BOT_WORKERS > 1 without a shared STATE_BACKEND, workers will not share warnings, events or caches")
+        run_workers(BOT_WORKERS, run)
+    else:
+        run()
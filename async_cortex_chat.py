@@ -0,0 +1,148 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+import aiohttp
+from cortex_chat import CortexChat, RequestTemplate
+from sse_parser import SSEParser, AgentResponseAccumulator
+import metrics
+
+DEBUG = False
+
+# Backoff before retrying a failed connection attempt (doubled per attempt)
+CONNECT_BACKOFF = 0.2
+
+
+class AsyncCortexChat(CortexChat):
+    """
+    CortexChat for the asyncio bot. Talks to the Cortex Agents endpoint through aiohttp, so a
+    streaming answer occupies a coroutine rather than a thread; request compilation, SSE parsing
+    and response building are shared with CortexChat.
+
+    The aiohttp session is created on first use because it must belong to the running event loop.
+    """
+
+    def _create_session(self, pool_size: int, max_retries: int):
+        self.max_retries = max_retries
+        return None  # Created lazily by _get_session()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            # keepalive_timeout keeps idle TLS connections around between questions
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.pool_size, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1]),
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.token_manager.stop()
+
+    async def warmup(self, connections: int = None) -> int:
+        """Open idle keep-alive connections to the agent host concurrently; returns how many succeeded."""
+        connections = min(self.pool_size if connections is None else connections, self.pool_size)
+        if connections <= 0:
+            return 0
+        parts = urlsplit(self.agent_url)
+        base_url = f"{parts.scheme}://{parts.netloc}/"
+        session = self._get_session()
+
+        async def open_connection():
+            try:
+                async with session.head(base_url) as response:
+                    await response.read()
+                return True
+            except aiohttp.ClientError as e:
+                print(f"Agent connection warmup failed: {e}")
+                return False
+
+        opened = sum(await asyncio.gather(*(open_connection() for _ in range(connections))))
+        print(f"Warmed up {opened}/{connections} agent connections")
+        return opened
+
+    def pool_stats(self) -> dict[str, any]:
+        # aiohttp has no public count of idle keep-alive connections, so only the totals are reported
+        with self._stats_lock:
+            request_count = self._request_count
+        return {
+            "pool_size": self.pool_size,
+            "agent_requests": request_count,
+        }
+
+    async def _send_request(self, query: str, request_template: RequestTemplate = None) -> aiohttp.ClientResponse:
+        """Send the query to the agent endpoint and return the (streaming) HTTP response."""
+        # Only sign in a thread if the background renewal has fallen behind
+        token = self.token_manager.fresh_token() or await asyncio.to_thread(self.token_manager.get_token)
+        headers = {
+            'X-Snowflake-Authorization-Token-Type': 'KEYPAIR_JWT',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Authorization': f"Bearer {token}"
+        }
+        data = (request_template or self.request_template).render(query)
+        if DEBUG:
+            print("Request data:")
+            print(json.dumps(json.loads(data), indent=2))
+
+        response = await self._post(headers, data)
+        if response.status == 401:  # Unauthorized - likely expired JWT
+            response.release()
+            print("JWT has expired. Generating new JWT...")
+            # Signing is CPU work on the key; keep it off the event loop
+            token = await asyncio.to_thread(self.token_manager.refresh)
+            headers["Authorization"] = f"Bearer {token}"
+            response = await self._post(headers, data)
+        return response
+
+    async def _post(self, headers: dict, data: bytes) -> aiohttp.ClientResponse:
+        with self._stats_lock:
+            self._request_count += 1
+        session = self._get_session()
+        # Only retry failures to establish a connection: the agent POST itself is not idempotent
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await session.post(self.agent_url, headers=headers, data=data)
+            except aiohttp.ClientConnectorError as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"Could not connect to the agent ({e}), retrying...")
+                await asyncio.sleep(CONNECT_BACKOFF * 2 ** attempt)
+
+    async def _stream_events(self, response: aiohttp.ClientResponse, accumulated: AgentResponseAccumulator):
+        """Yield text deltas and tool events as SSE frames arrive, accumulating them as we go."""
+        parser = SSEParser()
+        parse_seconds = 0.0
+        received = 0
+        # iter_any() hands over bytes as soon as they arrive on the socket
+        async for chunk in response.content.iter_any():
+            start = time.perf_counter()
+            events = self._parse_chunk(parser, accumulated, chunk)
+            parse_seconds += time.perf_counter() - start
+            received += len(chunk)
+            for event in events:
+                yield event
+        for event in self._parse_chunk(parser, accumulated):
+            yield event
+        metrics.observe('sse_parse', parse_seconds, bytes=received, deltas=len(accumulated.text_parts))
+
+    async def chat(self, query: str, request_template: RequestTemplate = None) -> any:
+        response = None
+        async for event in self.stream_chat(query, request_template):
+            if event['type'] == 'done':
+                response = event['response']
+        return response
+
+    async def stream_chat(self, query: str, request_template: RequestTemplate = None):
+        """Async generator with the same events as CortexChat.stream_chat()."""
+        response = await self._send_request(query, request_template)
+        async with response:
+            if response.status != 200:
+                yield {'type': 'done', 'response': self._error_response(response.status, await response.text())}
+                return
+
+            accumulated = AgentResponseAccumulator()
+            async for event in self._stream_events(response, accumulated):
+                yield event
+        yield {'type': 'done', 'response': self._build_response(accumulated)}
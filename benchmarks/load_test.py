@@ -0,0 +1,702 @@
+"""
+Offline load test: drives handle_message_events at a fixed arrival rate with local stand-ins for
+everything remote, so changes to CortexChat or display_agent_response can be measured on a laptop.
+
+- Agent: a local HTTP server streaming Cortex Agents SSE responses (text deltas, tool_use, and
+  tool_results with `sql` or `searchResults`), either synthetic or replayed from recorded streams
+- Warehouse: a fake connector connection whose asynchronous queries finish after --query-seconds
+  and return --rows rows as Arrow batches
+- Slack: a fake client answering chat.postMessage/chat.update and the file upload calls after
+  --slack-latency seconds; chart bytes are still POSTed over HTTP to the stub server
+
+The bot's own code runs unchanged: admission control, caches, single-flight, the connection pool,
+the query runner, table formatting and chart rendering. The stand-ins share the process, so they
+take a little CPU away from the bot.
+
+Reported per stage (from metrics.py spans): count and p50/p95/p99 latency under load, then the
+allocation peak and retained memory per stage from a sequential tracemalloc pass.
+
+Usage:
+    python benchmarks/load_test.py [--rate 5] [--duration 20] [--mix text=1,sql=2,search=1,chart=1,multi=1]
+                                   [--rows 200] [--query-seconds 0.5] [--first-token 0.3] [--token-delay 0.005]
+                                   [--stream-dir recorded/] [--async] [--memory-samples 20]
+
+Recorded streams: a directory of <scenario>.sse files holding raw agent response bodies; the file
+name becomes the scenario name to use in --mix.
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import os
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+SEMANTIC_MODELS = ['@LOADTEST.PUBLIC.MODELS/support_tickets_semantic_model.yaml', 'LOADTEST.PUBLIC.SALES_VIEW']
+SEARCH_SERVICES = ['LOADTEST.PUBLIC.DOCS_SEARCH']
+SCENARIOS = ('text', 'sql', 'search', 'chart', 'multi')
+
+
+# ---------------------------------------------------------------------------------------------
+# Agent stand-in
+# ---------------------------------------------------------------------------------------------
+
+def _frame(content: list) -> bytes:
+    event = {"object": "message.delta", "delta": {"content": content}}
+    return b"event: message.delta\ndata: " + json.dumps(event).encode('utf-8') + b"\n\n"
+
+
+def _tool_frames(tool_name: str, result_json: dict) -> list:
+    return [
+        _frame([{"type": "tool_use", "tool_use": {"tool_use_id": f"toolu_{tool_name}", "name": tool_name}}]),
+        _frame([{"type": "tool_results", "tool_results": {
+            "tool_call_id": f"toolu_{tool_name}:{tool_name}", "content": [{"json": result_json}]}}]),
+    ]
+
+
+def build_stream(scenario: str, prompt: str, deltas: int) -> list:
+    """
+    SSE frames for one synthetic answer. The SQL carries a hash of the prompt, so repeated prompts
+    produce repeated SQL (and can hit the result cache) while distinct prompts never do.
+    """
+    tag = zlib.crc32(prompt.encode('utf-8'))
+    sql = f"SELECT service_type, COUNT(*) AS tickets FROM support_tickets GROUP BY 1 /* {tag} */"
+    frames = []
+    if scenario in ('sql', 'chart'):
+        frames += _tool_frames('semantic_model_0', {"sql": sql})
+    elif scenario == 'multi':
+        frames += _tool_frames('semantic_model_0', {"sql": sql})
+        frames += _tool_frames('semantic_model_1', {"sql": sql.replace('support_tickets', 'sales')})
+    elif scenario == 'search':
+        frames += _tool_frames('search_service_0', {"searchResults": [
+            {"text": "lorem ipsum dolor sit amet " * 20, "doc_title": f"Policy {i}", "doc_id": f"policy_{i}.pdf"}
+            for i in range(3)
+        ]})
+
+    words = "The ticket counts by service type are shown below".split()
+    if scenario == 'chart':
+        words += "as a bar chart".split()
+    text_frames = [_frame([{"type": "text", "text": words[i % len(words)] + " "}]) for i in range(deltas)]
+    # The agent streams its answer after the tools ran
+    return frames + text_frames + [b"data: [DONE]\n\n"]
+
+
+def load_recorded_streams(directory: str) -> dict:
+    """<scenario>.sse files split into SSE frames, replayed one frame per network chunk."""
+    streams = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.sse'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                body = f.read().replace(b"\r\n", b"\n")
+            streams[name[:-4]] = [frame + b"\n\n" for frame in body.split(b"\n\n") if frame.strip()]
+    return streams
+
+
+class StubServer:
+    """
+    Local Cortex Agents endpoint (POST /agent) plus the Slack file upload target (POST /upload).
+    The scenario is read from the "[scenario]" tag at the start of the user's prompt.
+    """
+
+    def __init__(self, deltas: int, first_token: float, token_delay: float, recorded: dict = None):
+        self.deltas = deltas
+        self.first_token = first_token
+        self.token_delay = token_delay
+        self.recorded = recorded or {}
+        self.requests = Counter()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real endpoint
+
+            def do_HEAD(self):
+                # Connection warmup
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path == '/upload':
+                    stub.requests['upload'] += 1
+                    self.send_response(200)
+                    self.send_header('Content-Length', '2')
+                    self.end_headers()
+                    self.wfile.write(b'OK')
+                    return
+                prompt = json.loads(body)['messages'][0]['content'][0]['text']
+                match = re.match(r'\[(\w+)\]', prompt)
+                scenario = match.group(1) if match else 'text'
+                stub.requests[scenario] += 1
+                frames = stub.recorded.get(scenario) or build_stream(scenario, prompt, stub.deltas)
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                time.sleep(stub.first_token)  # Planning and tool calls before the first byte
+                for frame in frames:
+                    self.wfile.write(f"{len(frame):x}\r\n".encode('ascii') + frame + b"\r\n")
+                    self.wfile.flush()
+                    if stub.token_delay:
+                        time.sleep(stub.token_delay)
+                self.wfile.write(b"0\r\n\r\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, name='stub-server', daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+# ---------------------------------------------------------------------------------------------
+# Warehouse stand-in
+# ---------------------------------------------------------------------------------------------
+
+class FakeWarehouse:
+    """Shared state of the fake connections: when each submitted query finishes, and its result."""
+
+    def __init__(self, rows: int, query_seconds: float):
+        import pyarrow as pa
+        self.query_seconds = query_seconds
+        self.table = pa.table({
+            'SERVICE_TYPE': [f"service type {i % 12}" for i in range(rows)],
+            'TICKETS': list(range(rows)),
+        })
+        self.description = [('SERVICE_TYPE',), ('TICKETS',)]
+        self._finish_at = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.cancelled = 0
+
+    def submit(self) -> str:
+        with self._lock:
+            query_id = f"01-load-{next(self._ids)}"
+            self._finish_at[query_id] = time.monotonic() + self.query_seconds
+            self.submitted += 1
+        return query_id
+
+    def running(self, query_id: str) -> bool:
+        return time.monotonic() < self._finish_at[query_id]
+
+
+class FakeCursor:
+    def __init__(self, warehouse: FakeWarehouse):
+        self.warehouse = warehouse
+        self.sfqid = None
+        self.description = warehouse.description
+
+    def execute(self, sql, params=None):
+        if 'SYSTEM$CANCEL_QUERY' in sql:
+            self.warehouse.cancelled += 1
+
+    def execute_async(self, sql):
+        self.sfqid = self.warehouse.submit()
+
+    def get_results_from_sfqid(self, query_id):
+        self.sfqid = query_id
+
+    def fetch_arrow_batches(self):
+        import pyarrow as pa
+        for batch in self.warehouse.table.to_batches(max_chunksize=10000):
+            yield pa.Table.from_batches([batch])
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """The subset of snowflake.connector's connection the pool and query runner use."""
+
+    def __init__(self, warehouse: FakeWarehouse):
+        self.warehouse = warehouse
+
+    def cursor(self):
+        return FakeCursor(self.warehouse)
+
+    def get_query_status_throw_if_error(self, query_id):
+        return 'RUNNING' if self.warehouse.running(query_id) else 'SUCCESS'
+
+    @staticmethod
+    def is_still_running(status):
+        return status == 'RUNNING'
+
+    @staticmethod
+    def is_closed():
+        return False
+
+    def close(self):
+        pass
+
+
+# ---------------------------------------------------------------------------------------------
+# Slack stand-in
+# ---------------------------------------------------------------------------------------------
+
+class FakeSlackClient:
+    """WebClient stand-in: every call takes `latency` seconds and is counted."""
+
+    def __init__(self, latency: float, upload_url: str, blocking: bool = True, stats: dict = None):
+        self.latency = latency
+        self.upload_url = upload_url
+        self.blocking = blocking
+        self.stats = stats if stats is not None else {'calls': Counter(), 'texts': Counter(), 'lock': threading.Lock()}
+        self._ids = itertools.count(1)
+
+    def twin(self, blocking: bool) -> 'FakeSlackClient':
+        """A client sharing this one's counters, e.g. a blocking one for the async bot's uploads."""
+        return FakeSlackClient(self.latency, self.upload_url, blocking, self.stats)
+
+    def _call(self, method: str, response: dict, text: str = None) -> dict:
+        if self.blocking and self.latency:
+            time.sleep(self.latency)
+        with self.stats['lock']:
+            self.stats['calls'][method] += 1
+            if text is not None:
+                self.stats['texts'][text] += 1
+        return response
+
+    def chat_postMessage(self, channel, text=None, **kwargs):
+        return self._call('chat.postMessage', {'ok': True, 'channel': channel, 'ts': f"{next(self._ids)}.000"}, text)
+
+    def chat_update(self, channel, ts, text=None, **kwargs):
+        return self._call('chat.update', {'ok': True, 'channel': channel, 'ts': ts})
+
+    def files_getUploadURLExternal(self, filename, length):
+        file_id = f"F{next(self._ids)}"
+        return self._call('files.getUploadURLExternal', {'upload_url': self.upload_url, 'file_id': file_id})
+
+    def files_completeUploadExternal(self, files):
+        file_id = files[0]['id']
+        return self._call('files.completeUploadExternal',
+                          {'files': [{'id': file_id, 'permalink': f"https://slack.invalid/files/{file_id}"}]})
+
+    def files_info(self, file):
+        return self._call('files.info', {'file': {'id': file, 'mimetype': 'image/jpeg', 'thumb_360': 'x'}})
+
+
+class AsyncFakeSlackClient:
+    """AsyncWebClient stand-in: the same calls as FakeSlackClient, awaiting the latency instead."""
+
+    def __init__(self, client: FakeSlackClient):
+        self.client = client.twin(blocking=False)
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(self.client.latency)
+            return method(*args, **kwargs)
+        return call
+
+
+# ---------------------------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------------------------
+
+def parse_mix(mix: str) -> list:
+    """'sql=2,text=1' -> ['sql', 'sql', 'text'], cycled through by the request sequence."""
+    weighted = []
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weighted += [name.strip()] * int(weight or 1)
+    return weighted
+
+
+def message_body(index: int, scenario: str, distinct_prompts: int) -> dict:
+    question = index if not distinct_prompts else index % distinct_prompts
+    return {
+        'event_id': f"EvLoad{index}",
+        'event': {
+            'type': 'message',
+            'text': f"[{scenario}] How many tickets per service type? (question {question})",
+            'user': f"U{index:06d}",
+            'channel': f"C{index % 20:03d}",
+            'client_msg_id': f"load-{index}",
+            'ts': f"{time.time():.6f}",
+        },
+    }
+
+
+def write_private_key(directory: str) -> str:
+    """A throwaway RSA key so the bot can sign its (ignored) JWTs."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path = os.path.join(directory, 'rsa_key.p8')
+    with open(path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return path
+
+
+def configure_environment():
+    """Settings the stand-ins need; anything else is read from the environment / .env as usual."""
+    os.environ['SLACK_BOT_TOKEN'] = 'xoxb-load-test'
+    os.environ['SLACK_APP_TOKEN'] = 'xapp-load-test'
+    os.environ['STATE_BACKEND'] = 'memory'
+    # Every request comes from a new user; the limiters would otherwise shed most of the load
+    os.environ['USER_RATE_PER_MINUTE'] = '0'
+    os.environ['CHANNEL_RATE_PER_MINUTE'] = '0'
+
+
+def import_sync_bot(slack: FakeSlackClient):
+    from slack_bolt import App
+    # The stand-in token cannot pass auth.test, which App() calls on construction
+    App.__init__ = functools.partialmethod(App.__init__, token_verification_enabled=False)
+    import app as bot
+    from slack_files import SlackFileUploader
+    bot.app._client = slack
+    bot.file_uploader = SlackFileUploader(slack, ready_timeout=bot.CHART_READY_TIMEOUT)
+    return bot
+
+
+def import_async_bot(slack: FakeSlackClient):
+    import async_app as bot
+    from slack_files import SlackFileUploader
+    bot.app._async_client = AsyncFakeSlackClient(slack)
+    # Uploads run in worker threads through a sync client, as in async_app.py
+    bot.file_uploader = SlackFileUploader(slack.twin(blocking=True), ready_timeout=bot.CHART_READY_TIMEOUT)
+    return bot
+
+
+def percentiles(values: list) -> tuple:
+    if not values:
+        return 0.0, 0.0, 0.0
+    if len(values) == 1:
+        return values[0], values[0], values[0]
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+class Run:
+    """Outcome of one load phase."""
+
+    def __init__(self):
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.started = None
+        self.finished = None
+
+    def record(self, scheduled: float):
+        with self.lock:
+            self.latencies.append(time.perf_counter() - scheduled)
+
+
+def drive_sync(bot, slack, args, scenarios: list) -> Run:
+    run = Run()
+    total = int(args.rate * args.duration)
+    # Bolt runs listeners on a thread pool (10 threads by default)
+    handlers = ThreadPoolExecutor(max_workers=args.handler_threads, thread_name_prefix='handler')
+
+    def one(index, scheduled):
+        body = message_body(index, scenarios[index % len(scenarios)], args.distinct_prompts)
+        channel = body['event']['channel']
+
+        def say(text=None, **kwargs):
+            return slack.chat_postMessage(channel=channel, text=text, **kwargs)
+        try:
+            bot.handle_message_events(lambda: None, body, say)
+        finally:
+            run.record(scheduled)
+
+    run.started = time.perf_counter()
+    futures = []
+    for index in range(total):
+        # Open loop: requests arrive on schedule whether or not earlier ones finished
+        scheduled = run.started + index / args.rate
+        time.sleep(max(scheduled - time.perf_counter(), 0))
+        futures.append(handlers.submit(one, index, scheduled))
+    for future in futures:
+        future.result()
+    run.finished = time.perf_counter()
+    handlers.shutdown()
+    bot.chart_executor.shutdown(wait=True)  # Charts still rendering count towards plot/upload
+    return run
+
+
+async def drive_async(bot, args, scenarios: list) -> Run:
+    run = Run()
+    total = int(args.rate * args.duration)
+
+    async def one(index, scheduled):
+        body = message_body(index, scenarios[index % len(scenarios)], args.distinct_prompts)
+        channel = body['event']['channel']
+
+        async def ack():
+            pass
+
+        async def say(text=None, **kwargs):
+            return await bot.app.client.chat_postMessage(channel=channel, text=text, **kwargs)
+        try:
+            await bot.handle_message_events(ack, body, say)
+        finally:
+            run.record(scheduled)
+
+    run.started = time.perf_counter()
+    tasks = []
+    for index in range(total):
+        scheduled = run.started + index / args.rate
+        await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+        tasks.append(asyncio.create_task(one(index, scheduled)))
+    await asyncio.gather(*tasks)
+    run.finished = time.perf_counter()
+    await asyncio.gather(*bot.chart_tasks)
+    return run
+
+
+class InlineExecutor:
+    """Runs chart jobs on the handler's thread, so the memory pass measures one request at a time."""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def trace_stage(stage: str, fn, samples: dict):
+    """Wrap fn to record the tracemalloc peak above the starting point, and what it left allocated."""
+    def finish(before):
+        current, peak = tracemalloc.get_traced_memory()
+        samples[stage].append((peak - before, current - before))
+
+    if asyncio.iscoroutinefunction(fn):
+        async def wrapper(*args, **kwargs):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                finish(before)
+    else:
+        def wrapper(*args, **kwargs):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                finish(before)
+    return wrapper
+
+
+def answer_sequentially(bot, slack, bodies: list, loop=None):
+    """Answer the messages one at a time, waiting for each one's charts."""
+    for body in bodies:
+        channel = body['event']['channel']
+        if loop is None:
+            bot.handle_message_events(lambda: None, body,
+                                      lambda text=None, **kwargs: slack.chat_postMessage(channel=channel, text=text, **kwargs))
+            continue
+
+        async def one():
+            async def ack():
+                pass
+
+            async def say(text=None, **kwargs):
+                return await bot.app.client.chat_postMessage(channel=channel, text=text, **kwargs)
+            await bot.handle_message_events(ack, body, say)
+            await asyncio.gather(*bot.chart_tasks)
+        loop.run_until_complete(one())
+
+
+def warm_up(bot, slack, stub, warehouse, scenarios: list, loop=None):
+    """
+    Answer one question per scenario before measuring (the first one pays for importing pandas and
+    opening connections), then clear every counter.
+    """
+    if loop is None:
+        chart_executor, bot.chart_executor = bot.chart_executor, InlineExecutor()
+    answer_sequentially(bot, slack, [
+        message_body(1_000_000 + index, scenario, 0) for index, scenario in enumerate(dict.fromkeys(scenarios))
+    ], loop)
+    if loop is None:
+        bot.chart_executor = chart_executor
+    import metrics
+    metrics.registry.reset()
+    stub.requests.clear()
+    slack.stats['calls'].clear()
+    slack.stats['texts'].clear()
+    warehouse.submitted = 0
+
+
+def memory_pass(bot, slack, args, scenarios: list, loop=None) -> dict:
+    """Answer `memory_samples` questions one after another under tracemalloc, per stage."""
+    import slack_blocks
+    samples = defaultdict(list)
+    originals = {name: getattr(bot, name) for name in ('ask_agent', 'run_queries', 'plot_chart')}
+    for name, fn in originals.items():
+        setattr(bot, name, trace_stage(name, fn, samples))
+    table_answer = slack_blocks.table_answer
+    slack_blocks.table_answer = trace_stage('table_answer', table_answer, samples)
+    if loop is None:
+        bot.chart_executor = InlineExecutor()
+
+    offset = int(args.rate * args.duration)  # New event IDs and prompts, so nothing is deduplicated or cached
+    tracemalloc.start()
+    try:
+        answer_sequentially(bot, slack, [
+            message_body(index, scenarios[index % len(scenarios)], args.distinct_prompts)
+            for index in range(offset, offset + args.memory_samples)
+        ], loop)
+    finally:
+        tracemalloc.stop()
+        for name, fn in originals.items():
+            setattr(bot, name, fn)
+        slack_blocks.table_answer = table_answer
+    return samples
+
+
+def report(run: Run, counts: dict, summary: dict, samples: dict, args, chart_processes: bool):
+    import slack_blocks
+    wall = run.finished - run.started
+    texts = counts['slack_texts']
+    failed = texts[slack_blocks.request_failed('')['text']]
+    shed = texts[slack_blocks.overloaded()['text']]
+    p50, p95, p99 = percentiles(run.latencies)
+
+    print(f"\nRequests: {len(run.latencies)} at {args.rate}/s offered, {failed} failed, {shed} shed (overloaded)")
+    print(f"Throughput: {len(run.latencies) / wall:.2f} requests/s over {wall:.1f}s")
+    print(f"End-to-end (incl. handler queueing): p50 {p50:.3f}s  p95 {p95:.3f}s  p99 {p99:.3f}s")
+    print(f"Agent streams: {counts['agent_streams']}; queries submitted: {counts['queries']}")
+    print(f"Slack calls: {counts['slack_calls']}")
+
+    print(f"\n{'stage':14} {'count':>6} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}   (seconds, histogram estimates)")
+    for stage, row in summary.items():
+        print(f"{stage:14} {row['count']:6} {row['mean']:8.3f} {row['p50']:8.3f} {row['p95']:8.3f} {row['p99']:8.3f}")
+
+    if samples:
+        print(f"\n{'stage':14} {'samples':>7} {'peak KiB p50':>13} {'peak KiB max':>13} {'retained KiB p50':>17}")
+        for stage, values in sorted(samples.items()):
+            peaks = [peak / 1024 for peak, _ in values]
+            retained = [kept / 1024 for _, kept in values]
+            print(f"{stage:14} {len(values):7} {statistics.median(peaks):13.1f} {max(peaks):13.1f} "
+                  f"{statistics.median(retained):17.1f}")
+        if chart_processes:
+            print("plot_chart renders in chart worker processes; set CHART_USE_PROCESSES=false to trace its memory")
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"\nMax RSS: {max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024):.0f} MiB")
+
+    if args.json:
+        print(json.dumps({
+            "requests": len(run.latencies), "failed": failed, "shed": shed,
+            "throughput": len(run.latencies) / wall,
+            "end_to_end": {"p50": p50, "p95": p95, "p99": p99},
+            "stages": summary,
+            "memory_kib": {stage: {"peak_p50": statistics.median(peak / 1024 for peak, _ in values),
+                                   "retained_p50": statistics.median(kept / 1024 for _, kept in values)}
+                           for stage, values in samples.items()},
+        }))
+
+
+def main():
+    cli_parser = argparse.ArgumentParser()
+    cli_parser.add_argument('--rate', type=float, default=5, help='Questions per second (open loop).')
+    cli_parser.add_argument('--duration', type=float, default=20, help='Seconds to keep sending questions.')
+    cli_parser.add_argument('--mix', default='text=1,sql=2,search=1,chart=1,multi=1',
+                            help=f"Weighted scenarios, from {', '.join(SCENARIOS)} or recorded stream names.")
+    cli_parser.add_argument('--distinct-prompts', type=int, default=0,
+                            help='Cycle through this many prompts so the caches get hits (0 = every prompt is new).')
+    cli_parser.add_argument('--deltas', type=int, default=200, help='Text deltas per synthetic answer.')
+    cli_parser.add_argument('--first-token', type=float, default=0.3, help='Seconds before the agent sends anything.')
+    cli_parser.add_argument('--token-delay', type=float, default=0.005, help='Seconds between SSE frames.')
+    cli_parser.add_argument('--stream-dir', help='Directory of recorded <scenario>.sse agent responses to replay.')
+    cli_parser.add_argument('--rows', type=int, default=200, help='Rows returned by every query.')
+    cli_parser.add_argument('--query-seconds', type=float, default=0.5, help='Seconds each query runs.')
+    cli_parser.add_argument('--slack-latency', type=float, default=0.05, help='Seconds per Slack API call.')
+    cli_parser.add_argument('--handler-threads', type=int, default=10, help="Bolt's listener threads (sync bot).")
+    cli_parser.add_argument('--memory-samples', type=int, default=20, help='Questions in the tracemalloc pass (0 skips it).')
+    cli_parser.add_argument('--profile-percent', type=float, default=0,
+                            help="Profile this share of requests with the bot's profiler (written to PROFILE_DIR).")
+    cli_parser.add_argument('--async', dest='use_async', action='store_true', help='Drive async_app.py instead of app.py.')
+    cli_parser.add_argument('--json', action='store_true', help='Also print the results as one JSON line.')
+    args = cli_parser.parse_args()
+
+    recorded = load_recorded_streams(args.stream_dir) if args.stream_dir else {}
+    scenarios = parse_mix(args.mix)
+    unknown = set(scenarios) - set(SCENARIOS) - set(recorded)
+    if unknown:
+        cli_parser.error(f"unknown scenarios: {sorted(unknown)}")
+
+    configure_environment()
+    stub = StubServer(args.deltas, args.first_token, args.token_delay, recorded)
+    slack = FakeSlackClient(args.slack_latency, f"{stub.url}/upload")
+    warehouse = FakeWarehouse(args.rows, args.query_seconds)
+    key_dir = tempfile.TemporaryDirectory()
+    agent_settings = dict(
+        agent_url=f"{stub.url}/agent",
+        search_services=SEARCH_SERVICES,
+        semantic_models=SEMANTIC_MODELS,
+        model='claude-3-5-sonnet',
+        account='LOADTEST',
+        user='LOADTEST',
+        private_key_path=write_private_key(key_dir.name),
+    )
+
+    import metrics
+    from connection_pool import SnowflakeConnectionPool
+
+    if args.use_async:
+        bot = import_async_bot(slack)
+        from async_cortex_chat import AsyncCortexChat
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=bot.ASYNC_WORKER_THREADS, thread_name_prefix='async-worker'))
+        bot.CONN_POOL = SnowflakeConnectionPool(lambda: FakeConnection(warehouse), max_size=bot.SNOWFLAKE_POOL_SIZE)
+        bot.CORTEX_APP = AsyncCortexChat(pool_size=bot.AGENT_POOL_SIZE, **agent_settings)
+        warm_up(bot, slack, stub, warehouse, scenarios, loop)
+        if args.profile_percent:
+            bot.profiler.enable(args.profile_percent)
+        print(f"Driving async_app.py at {args.rate}/s for {args.duration}s against {stub.url}")
+        run = loop.run_until_complete(drive_async(bot, args, scenarios))
+    else:
+        bot = import_sync_bot(slack)
+        from cortex_chat import CortexChat
+        loop = None
+        bot.CONN_POOL = SnowflakeConnectionPool(lambda: FakeConnection(warehouse), max_size=bot.SNOWFLAKE_POOL_SIZE)
+        bot.CORTEX_APP = CortexChat(pool_size=bot.AGENT_POOL_SIZE, **agent_settings)
+        warm_up(bot, slack, stub, warehouse, scenarios)
+        if args.profile_percent:
+            bot.profiler.enable(args.profile_percent)
+        print(f"Driving app.py at {args.rate}/s for {args.duration}s against {stub.url}")
+        run = drive_sync(bot, slack, args, scenarios)
+
+    summary = metrics.registry.summary()
+    # Counted before the memory pass adds its own questions
+    counts = {
+        'agent_streams': dict(stub.requests),
+        'queries': warehouse.submitted,
+        'slack_calls': dict(slack.stats['calls']),
+        'slack_texts': Counter(slack.stats['texts']),
+    }
+    samples = memory_pass(bot, slack, args, scenarios, loop) if args.memory_samples else {}
+    report(run, counts, summary, samples, args, bot.CHART_USE_PROCESSES)
+
+    if loop is not None:
+        loop.run_until_complete(bot.CORTEX_APP.close())
+        loop.close()
+    else:
+        bot.CORTEX_APP.token_manager.stop()
+    bot.chart_renderer.shutdown()
+    bot.CONN_POOL.close()
+    stub.close()
+    key_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
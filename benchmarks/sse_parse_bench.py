@@ -0,0 +1,121 @@
+"""
+Micro-benchmark for parsing a Cortex Agents SSE stream.
+
+Compares the original line-based parser (decode every line, json.loads into a dict per event,
+an intermediate content dict, text accumulated with +=) with sse_parser.SSEParser and
+AgentResponseAccumulator, on a synthetic stream of text deltas and tool results.
+
+Usage:
+    python benchmarks/sse_parse_bench.py [--deltas 5000] [--search-results 50] [--chunk-size 8192] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sse_parser import SSEParser, AgentResponseAccumulator, JSON_BACKEND  # noqa: E402
+
+
+def build_stream(deltas: int, search_results: int) -> bytes:
+    events = []
+    for i in range(deltas):
+        events.append({"object": "message.delta",
+                       "delta": {"content": [{"type": "text", "text": f"token {i} "}]}})
+    events.append({"object": "message.delta", "delta": {"content": [{"type": "tool_results", "tool_results": {
+        "tool_call_id": "toolu_1:search_service_0",
+        "content": [{"json": {"searchResults": [
+            {"text": "lorem ipsum " * 40, "doc_title": f"doc {j}", "doc_id": f"doc_{j}.pdf"}
+            for j in range(search_results)
+        ]}}]}}]}})
+    events.append({"object": "message.delta", "delta": {"content": [{"type": "tool_results", "tool_results": {
+        "tool_call_id": "toolu_2:semantic_model_0",
+        "content": [{"json": {"sql": "SELECT service_type, COUNT(*) FROM support_tickets GROUP BY 1"}}]}}]}})
+    frames = [b"event: message.delta\ndata: " + json.dumps(event).encode('utf-8') + b"\n\n" for event in events]
+    frames.append(b"data: [DONE]\n\n")
+    return b"".join(frames)
+
+
+def chunked(stream: bytes, chunk_size: int) -> list:
+    return [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def legacy_parse(chunks: list) -> str:
+    """The original CortexChat parsing loop, kept here as the baseline."""
+    accumulated = {'text': '', 'tool_use': [], 'tool_results': [], 'other': []}
+    # requests' iter_lines(): re-split the chunk stream into lines
+    pending = b''
+    lines = []
+    for chunk in chunks:
+        pending += chunk
+        parts = pending.split(b'\n')
+        pending = parts.pop()
+        lines.extend(parts)
+    if pending:
+        lines.append(pending)
+
+    for line in lines:
+        if not line:
+            continue
+        line = line.decode('utf-8')
+        if not line.startswith('data: '):
+            continue
+        json_str = line[6:].strip()
+        if json_str == '[DONE]':
+            continue
+        data = json.loads(json_str)
+        if data.get('object') == 'message.delta' and 'content' in data.get('delta', {}):
+            result = {'text': '', 'tool_use': [], 'tool_results': []}
+            for entry in data['delta']['content']:
+                if entry.get('type') == 'text':
+                    result['text'] += entry.get('text', '')
+                elif entry.get('type') == 'tool_use':
+                    result['tool_use'].append(entry.get('tool_use', {}))
+                elif entry.get('type') == 'tool_results':
+                    result['tool_results'].append(entry.get('tool_results', {}))
+            accumulated['text'] += result['text']
+            accumulated['tool_use'].extend(result['tool_use'])
+            accumulated['tool_results'].extend(result['tool_results'])
+        else:
+            accumulated['other'].append(data)
+    return accumulated['text']
+
+
+def incremental_parse(chunks: list) -> str:
+    parser = SSEParser()
+    accumulated = AgentResponseAccumulator()
+    for chunk in chunks:
+        for _, data in parser.feed(chunk):
+            for _ in accumulated.add(data):
+                pass
+    for _, data in parser.close():
+        for _ in accumulated.add(data):
+            pass
+    return accumulated.text
+
+
+def main():
+    cli_parser = argparse.ArgumentParser()
+    cli_parser.add_argument('--deltas', type=int, default=5000, help='Number of text delta events.')
+    cli_parser.add_argument('--search-results', type=int, default=50, help='Search results in the tool result event.')
+    cli_parser.add_argument('--chunk-size', type=int, default=8192, help='Bytes per network chunk.')
+    cli_parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is reported).')
+    args = cli_parser.parse_args()
+
+    stream = build_stream(args.deltas, args.search_results)
+    chunks = chunked(stream, args.chunk_size)
+    assert legacy_parse(chunks) == incremental_parse(chunks)
+
+    print(f"Stream: {len(stream) / 1024:.0f} KiB, {args.deltas} deltas, {len(chunks)} chunks, JSON backend: {JSON_BACKEND}")
+    results = {}
+    for name, fn in (('legacy', legacy_parse), ('incremental', incremental_parse)):
+        best = min(timeit.repeat(lambda: fn(chunks), number=1, repeat=args.repeat))
+        results[name] = best
+        print(f"{name:>12}: {best * 1000:8.2f} ms  ({len(stream) / best / 1024 / 1024:6.1f} MiB/s)")
+    print(f"{'speedup':>12}: {results['legacy'] / results['incremental']:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
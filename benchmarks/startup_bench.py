@@ -0,0 +1,90 @@
+"""
+Startup benchmark: how long a fresh interpreter spends importing the bot before init() can start.
+
+Compares the module-level imports of the original app.py (pandas, numpy, pyplot, the Snowflake
+connector, Snowpark and snowflake.core) with the imports app.py and async_app.py do today, where the
+heavy stack is loaded on first use instead. Also reports what the deferred imports cost, i.e. what
+init() overlaps with the Snowflake connection or the first chart pays once.
+Every measurement runs in a new process so nothing is cached between runs.
+
+Usage:
+    python benchmarks/startup_bench.py [--repeat 5]
+"""
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+ORIGINAL_IMPORTS = [
+    "from slack_bolt import App",
+    "from slack_bolt.adapter.socket_mode import SocketModeHandler",
+    "import snowflake.connector",
+    "import pandas as pd",
+    "from snowflake.core import Root",
+    "from dotenv import load_dotenv",
+    "from snowflake.snowpark import Session",
+    "import numpy as np",
+    "import matplotlib",
+    "import matplotlib.pyplot as plt",
+    "from cortex_chat import CortexChat",
+]
+
+DEFERRED_IMPORTS = [
+    "import snowflake.connector",
+    "import pandas",
+    "import matplotlib.figure",
+]
+
+
+def module_imports(path: str) -> list[str]:
+    """The top-level import statements of a module, as source lines."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def available(statement: str) -> bool:
+    """Whether the import works in this environment (e.g. Snowpark may not be installed)."""
+    result = subprocess.run([sys.executable, '-c', statement], cwd=REPO, capture_output=True)
+    return result.returncode == 0
+
+
+def time_imports(statements: list[str], repeat: int) -> float:
+    code = "import time\nstart = time.perf_counter()\n" + "\n".join(statements) + \
+           "\nprint(time.perf_counter() - start)"
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', code], cwd=REPO, capture_output=True, text=True, check=True)
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def main():
+    cli_parser = argparse.ArgumentParser()
+    cli_parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per measurement (median is reported).')
+    args = cli_parser.parse_args()
+
+    original = [statement for statement in ORIGINAL_IMPORTS if available(statement)]
+    skipped = sorted(set(ORIGINAL_IMPORTS) - set(original))
+    if skipped:
+        print(f"Not installed, left out of the original import set (so it is an underestimate): {skipped}")
+
+    rows = [
+        ("original app.py imports", time_imports(original, args.repeat)),
+        ("app.py imports", time_imports(module_imports(os.path.join(REPO, 'app.py')), args.repeat)),
+        ("async_app.py imports", time_imports(module_imports(os.path.join(REPO, 'async_app.py')), args.repeat)),
+    ]
+    baseline = rows[0][1]
+    print(f"{'':42} {'seconds':>8} {'vs original':>12}")
+    for name, seconds in rows:
+        print(f"{name:42} {seconds:8.3f} {baseline / seconds:11.1f}x")
+    deferred = time_imports(DEFERRED_IMPORTS, args.repeat)
+    print(f"{'deferred (connector, pandas, matplotlib)':42} {deferred:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
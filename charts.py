@@ -0,0 +1,201 @@
+import io
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+BACKGROUND = '#333333'
+PRIMARY = '#1f77b4'
+PIE_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
+
+_theme_lock = threading.Lock()
+_theme_applied = False
+
+
+def _apply_theme():
+    """Import matplotlib and apply the dark theme, once per process on the first chart (keeps startup fast)."""
+    global _theme_applied
+    with _theme_lock:
+        if _theme_applied:
+            return
+        import matplotlib
+        matplotlib.rcParams.update({
+            'text.color': 'white',
+            'axes.labelcolor': 'white',
+            'xtick.color': 'white',
+            'ytick.color': 'white',
+            'axes.facecolor': BACKGROUND,
+            'figure.facecolor': BACKGROUND,
+            'savefig.facecolor': BACKGROUND,
+        })
+        _theme_applied = True
+
+
+def _rotate_xticks(ax):
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_ha('right')
+
+
+def render_chart(df, chart_type: str = 'pie') -> bytes:
+    """
+    Render a chart of the dataframe to JPEG bytes.
+    Supported chart types: pie, bar, line, scatter
+
+    Uses a standalone Figure rather than pyplot, so nothing is registered globally,
+    nothing is written to disk and the figure is freed as soon as it goes out of scope.
+
+    Args:
+        df: Pandas DataFrame with the data to plot
+        chart_type: Type of chart to create (default: pie)
+
+    Returns:
+        The chart as JPEG bytes
+    """
+    _apply_theme()
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6), facecolor=BACKGROUND)
+    ax = fig.add_subplot(111)
+    x, y = df.columns[0], df.columns[1]
+
+    # Determine what kind of chart to create based on prompt
+    if chart_type.lower() == 'pie':
+        # Pie chart (default)
+        ax.pie(df[y],
+               labels=df[x],
+               autopct='%1.1f%%',
+               startangle=90,
+               colors=PIE_COLORS,
+               textprops={'color': "white", 'fontsize': 12})
+        ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
+        ax.set_title(f'{y} by {x}', color='white', fontsize=14)
+
+    elif chart_type.lower() == 'line':
+        # Line chart
+        ax.plot(df[x], df[y], marker='o', color=PRIMARY)
+        ax.set_xlabel(x, fontsize=12)
+        ax.set_ylabel(y, fontsize=12)
+        ax.set_title(f'{y} over {x}', color='white', fontsize=14)
+        _rotate_xticks(ax)
+        ax.grid(True, alpha=0.3)
+
+    elif chart_type.lower() == 'scatter':
+        # Scatter plot, colored by a third column when there is one
+        if len(df.columns) >= 3:
+            scatter = ax.scatter(df[x], df[y],
+                                 c=df[df.columns[2]],
+                                 s=100,
+                                 alpha=0.7,
+                                 cmap='viridis')
+            fig.colorbar(scatter, ax=ax, label=df.columns[2])
+        else:
+            ax.scatter(df[x], df[y], color=PRIMARY, s=100, alpha=0.7)
+        ax.set_xlabel(x, fontsize=12)
+        ax.set_ylabel(y, fontsize=12)
+        ax.set_title(f'Relationship between {x} and {y}', color='white', fontsize=14)
+        ax.grid(True, alpha=0.3)
+
+    else:
+        # Bar chart, also the default if the type is unknown
+        ax.bar(df[x], df[y], color=PRIMARY)
+        ax.set_xlabel(x, fontsize=12)
+        ax.set_ylabel(y, fontsize=12)
+        ax.set_title(f'{y} by {x}', color='white', fontsize=14)
+        _rotate_xticks(ax)
+
+    # Set the background color for the plot area to dark
+    ax.set_facecolor(BACKGROUND)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='jpg', facecolor=BACKGROUND)
+    return buffer.getvalue()
+
+
+class ChartRenderer:
+    """
+    Renders charts on a bounded worker pool so concurrent requests draw in parallel.
+
+    The thread pool (default) runs in the bot process. The process pool sidesteps the GIL and keeps
+    matplotlib memory out of the bot process; it uses the 'spawn' start method because the bot is
+    multi-threaded, and spawned processes re-import the __main__ script, so it is only for entry
+    scripts without import-time side effects (app.py connects to Slack when imported).
+    """
+
+    def __init__(self, max_workers: int = 2, use_processes: bool = False):
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        # Created on first use so startup does not pay for spawning workers
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='chart')
+            return self._executor
+
+    def _replace_broken(self, executor: Executor):
+        """Drop a pool whose worker process died (OOM, native crash); the next chart starts a new one."""
+        with self._lock:
+            if self._executor is executor:
+                print("A chart worker process died, restarting the chart pool")
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, df, chart_type: str = 'pie', retry: bool = True) -> Future:
+        """
+        Start rendering in the background and return a Future with the JPEG bytes.
+        A render lost to a broken process pool is retried once on a fresh pool.
+        """
+        executor = self._get_executor()
+        try:
+            future = executor.submit(render_chart, df, chart_type)
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            if not retry:
+                raise
+            return self.submit(df, chart_type, retry=False)
+        if not retry:
+            return future
+
+        result = Future()
+
+        def done(attempt: Future):
+            error = attempt.exception() if not attempt.cancelled() else None
+            if isinstance(error, BrokenProcessPool):
+                self._replace_broken(executor)
+                try:
+                    attempt = self.submit(df, chart_type, retry=False)
+                except Exception as e:
+                    result.set_exception(e)
+                    return
+                attempt.add_done_callback(lambda retried: _copy_future(retried, result))
+            else:
+                _copy_future(attempt, result)
+
+        future.add_done_callback(done)
+        return result
+
+    def render(self, df, chart_type: str = 'pie', timeout: float = 60) -> bytes:
+        """Render on the pool and wait for the JPEG bytes."""
+        return self.submit(df, chart_type).result(timeout=timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def _copy_future(source: Future, target: Future):
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
@@ -0,0 +1,145 @@
+# Settings shared by the threaded (app.py) and asyncio (async_app.py) bots
+import math
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ACCOUNT = os.getenv("ACCOUNT")
+HOST = os.getenv("HOST")
+USER = os.getenv("DEMO_USER")
+DATABASE = os.getenv("DEMO_DATABASE")
+SCHEMA = os.getenv("DEMO_SCHEMA")
+ROLE = os.getenv("DEMO_USER_ROLE")
+WAREHOUSE = os.getenv("WAREHOUSE")
+SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
+SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
+AGENT_ENDPOINT = os.getenv("AGENT_ENDPOINT")
+RSA_PRIVATE_KEY_PATH = os.getenv("RSA_PRIVATE_KEY_PATH")
+MODEL = os.getenv("MODEL")
+# Stream agent output into a single live-updating Slack message
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+# Minimum seconds between chat.update calls while streaming
+STREAM_UPDATE_INTERVAL = float(os.getenv("STREAM_UPDATE_INTERVAL", "1.0"))
+# Keep-alive connections held open to the Cortex Agents endpoint
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "10"))
+# Connections to open at startup so the first questions skip the TLS handshake
+AGENT_WARMUP_CONNECTIONS = int(os.getenv("AGENT_WARMUP_CONNECTIONS", "2"))
+# Startup warmup (agent connections, warehouse, semantic models, search services): overall time limit,
+# and whether a failed check (e.g. a missing semantic model file) stops the bot from starting
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "60"))
+WARMUP_FAIL_FAST = os.getenv("WARMUP_FAIL_FAST", "true").lower() == "true"
+# Cache agent answers to repeated questions (TTL of 0 disables the cache)
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "900"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", "16"))
+# Cache query results by generated SQL (TTL of 0 disables the cache)
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "300"))
+SQL_CACHE_MAX_MB = float(os.getenv("SQL_CACHE_MAX_MB", "64"))
+# Admission control: concurrent agent calls and warehouse queries, and how many requests may wait for a slot
+MAX_CONCURRENT_AGENT_CALLS = int(os.getenv("MAX_CONCURRENT_AGENT_CALLS", "8"))
+MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", "8"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "20"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "60"))
+# Token bucket limits per user and per channel (a rate of 0 disables the limit)
+USER_RATE_PER_MINUTE = float(os.getenv("USER_RATE_PER_MINUTE", "6"))
+USER_BURST = float(os.getenv("USER_BURST", "3"))
+CHANNEL_RATE_PER_MINUTE = float(os.getenv("CHANNEL_RATE_PER_MINUTE", "30"))
+CHANNEL_BURST = float(os.getenv("CHANNEL_BURST", "10"))
+# Drop Slack redeliveries of events already handled within this many seconds (0 disables)
+EVENT_DEDUPE_TTL = float(os.getenv("EVENT_DEDUPE_TTL", "600"))
+EVENT_DEDUPE_MAX_ENTRIES = int(os.getenv("EVENT_DEDUPE_MAX_ENTRIES", "10000"))
+# Where per-user state, handled event IDs and shared cache entries live: "memory" (this process only)
+# or "sqlite:///path/to/state.db" (shared by every bot process on the host and kept across restarts).
+# SQLite calls block, for up to the busy timeout while another process holds the write lock, so
+# async code must reach the store (and the caches and dedupe built on it) through asyncio.to_thread
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+# Bot processes to run; they share the Slack load and, with a SQLite STATE_BACKEND, their state and caches
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# Snowflake connections shared by concurrent Slack handlers
+SNOWFLAKE_POOL_SIZE = int(os.getenv("SNOWFLAKE_POOL_SIZE", "4"))
+# Stop fetching query results after this many rows (0 means no limit)
+MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", "10000"))
+# Cancel agent-generated queries still running after this many seconds (0 means no limit).
+# Also set as the session's STATEMENT_TIMEOUT_IN_SECONDS so the warehouse enforces it too.
+SQL_QUERY_TIMEOUT = float(os.getenv("SQL_QUERY_TIMEOUT", "120"))
+# Charts render in memory on a bounded pool of threads (or worker processes).
+# Chart processes are spawned, so each one re-imports the script that started the bot; app.py and
+# async_app.py connect to Slack at import, so keep this off unless the entry script is import-safe.
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_USE_PROCESSES = os.getenv("CHART_USE_PROCESSES", "false").lower() == "true"
+# Give up waiting for Slack to process an uploaded chart after this many seconds
+CHART_READY_TIMEOUT = float(os.getenv("CHART_READY_TIMEOUT", "10"))
+# async_app.py only: threads for blocking connector calls, DataFrame formatting and uploads
+ASYNC_WORKER_THREADS = int(os.getenv("ASYNC_WORKER_THREADS", "16"))
+# Serve per-stage latency histograms on http://host:METRICS_PORT/metrics (0 disables; worker N uses port + N)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Also print every timed stage as one JSON line (stage, seconds and tags such as row counts)
+METRICS_JSON_LOGS = os.getenv("METRICS_JSON_LOGS", "false").lower() == "true"
+# Runtime profiling: Slack user IDs allowed to send "!profile on|off|status", the share of requests
+# profiled while it is on, where profiles go, allocators listed per profile, and whether it starts on
+PROFILE_ADMINS = {user.strip() for user in os.getenv("PROFILE_ADMINS", "").split(",") if user.strip()}
+PROFILE_SAMPLE_PERCENT = float(os.getenv("PROFILE_SAMPLE_PERCENT", "10"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP_ALLOCATORS = int(os.getenv("PROFILE_TOP_ALLOCATORS", "25"))
+PROFILE_ON_START = os.getenv("PROFILE_ON_START", "false").lower() == "true"
+# Answer questions matching a semantic model's verified_queries with their SQL, skipping the agent;
+# the threshold is the share of the verified question's words the prompt must contain (0-1)
+VERIFIED_QUERIES = os.getenv("VERIFIED_QUERIES", "true").lower() == "true"
+VERIFIED_QUERY_THRESHOLD = float(os.getenv("VERIFIED_QUERY_THRESHOLD", "0.9"))
+# Send the agent only the semantic models and search services a question is about: at most
+# TOOL_ROUTING_TOP_K of them, and only if they cover TOOL_ROUTING_MIN_COVERAGE of its words (0-1)
+TOOL_ROUTING = os.getenv("TOOL_ROUTING", "true").lower() == "true"
+TOOL_ROUTING_TOP_K = int(os.getenv("TOOL_ROUTING_TOP_K", "2"))
+TOOL_ROUTING_MIN_COVERAGE = float(os.getenv("TOOL_ROUTING_MIN_COVERAGE", "0.5"))
+
+DEBUG = False
+
+
+def env_values(suffix: str) -> list[str]:
+    """Distinct non-empty values of every environment variable whose name ends with `suffix`."""
+    values = []
+    for key, value in os.environ.items():
+        if key.endswith(suffix) and value:
+            value = value.strip()
+            if value and value not in values:
+                values.append(value)
+                print(f"Found {suffix.strip('_').lower().replace('_', ' ')} ({key}): {value}")
+    return values
+
+
+def agent_sources() -> tuple[list[str], list[str]]:
+    """Semantic models and search services to hand to the agent, from any *_SEMANTIC_MODEL / *_SEARCH_SERVICE variable."""
+    semantic_models = env_values("_SEMANTIC_MODEL")
+    search_services = env_values("_SEARCH_SERVICE")
+
+    if len(semantic_models) == 0:
+        print("WARNING: No semantic models found in environment variables!")
+    else:
+        print(f"Using semantic models: {semantic_models}")
+
+    if len(search_services) == 0:
+        print("WARNING: No search services found in environment variables!")
+    else:
+        print(f"Using search services: {search_services}")
+    return semantic_models, search_services
+
+
+def connect_snowflake():
+    # Imported here: the connector (with pandas and pyarrow) is the slowest import of the bot
+    import snowflake.connector
+    conn = snowflake.connector.connect(
+        user=USER,
+        authenticator="SNOWFLAKE_JWT",
+        private_key_file=RSA_PRIVATE_KEY_PATH,
+        account=ACCOUNT,
+        warehouse=WAREHOUSE,
+        role=ROLE,
+        host=HOST,
+        # Server-side backstop for runaway queries, on top of the client-side timeout and cancellation.
+        # Rounded up: Snowflake takes whole seconds and reads 0 as no limit
+        session_parameters={'STATEMENT_TIMEOUT_IN_SECONDS': max(1, math.ceil(SQL_QUERY_TIMEOUT))} if SQL_QUERY_TIMEOUT else None
+    )
+    if not conn.rest.token:
+        print(">>>>>>>>>> Snowflake connection unsuccessful!")
+    return conn
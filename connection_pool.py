@@ -0,0 +1,274 @@
+import asyncio
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable
+
+# Snowflake error numbers meaning the session or its token is gone and a fresh connection is needed
+SESSION_EXPIRED_ERRNOS = {
+    390111,  # Session no longer exists
+    390112,  # Session expired
+    390114,  # Authentication token expired
+}
+
+
+def database_error() -> type:
+    """
+    snowflake.connector's DatabaseError, imported on first use: the connector pulls in pandas and
+    pyarrow, so importing it at module load would slow down startup. `except database_error():`
+    only evaluates (and imports) when an exception is actually being handled.
+    """
+    from snowflake.connector.errors import DatabaseError
+    return DatabaseError
+
+
+class PooledConnection:
+    """A Snowflake connection plus the bookkeeping the pool needs for health checks and metrics."""
+    _ids = itertools.count(1)
+
+    def __init__(self, conn):
+        self.id = next(self._ids)
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.checkouts = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.checked_out_at = None
+
+    def metrics(self) -> dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "id": self.id,
+            "age_seconds": round(now - self.created_at, 1),
+            "idle_seconds": round(now - self.last_used, 1),
+            "checkouts": self.checkouts,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+class SnowflakeConnectionPool:
+    """
+    Bounded pool of Snowflake connections shared by the Slack event handlers.
+
+    Connections are created lazily up to `max_size`. A connection that has been idle
+    longer than `probe_after` seconds is probed with SELECT 1 before it is handed out,
+    and dead or expired connections are replaced transparently.
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_size: int = 4, min_size: int = 1,
+                 checkout_timeout: float = 30, probe_after: float = 300):
+        """
+        Args:
+            connect: Zero-argument function returning a new snowflake.connector connection
+            max_size: Maximum number of open connections
+            min_size: Connections opened up front (fails fast on bad credentials)
+            checkout_timeout: Seconds to wait for a free connection before raising
+            probe_after: Idle seconds after which a connection is probed before reuse
+        """
+        self._connect = connect
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.probe_after = probe_after
+        self._idle = []  # Used as a stack: LIFO keeps the warmest connections in use
+        self._lock = threading.Lock()
+        # Notified whenever a connection is checked in or a slot is freed
+        self._available = threading.Condition(self._lock)
+        self._all = {}
+        self._created = 0
+        self._reconnects = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._closed = False
+        for _ in range(min(min_size, max_size)):
+            with self._lock:
+                placeholder = self._reserve()
+            self._idle.append(self._open(placeholder))
+
+    def _reserve(self):
+        """
+        Claim a slot for a new connection, or return None if the pool is full. Must be called with the
+        lock held, in the same critical section that found no idle connection, so concurrent callers
+        cannot overshoot max_size.
+        """
+        if len(self._all) >= self.max_size:
+            return None
+        self._created += 1
+        placeholder = object()
+        self._all[placeholder] = None
+        return placeholder
+
+    def _open(self, placeholder) -> PooledConnection:
+        """Connect into a slot claimed with _reserve(); the slot is given back if connecting fails."""
+        try:
+            pooled = PooledConnection(self._connect())
+        except BaseException:
+            with self._available:
+                del self._all[placeholder]
+                self._available.notify()
+            raise
+        with self._lock:
+            del self._all[placeholder]
+            self._all[pooled.id] = pooled
+        return pooled
+
+    def _discard(self, pooled: PooledConnection):
+        with self._available:
+            self._all.pop(pooled.id, None)
+            # The freed slot lets a waiting checkout open a new connection
+            self._available.notify()
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, pooled: PooledConnection) -> bool:
+        # Any failure counts as dead: a half-closed connection can raise OSError, AttributeError
+        # or errors outside DatabaseError, and it must be replaced rather than leak its pool slot
+        try:
+            if pooled.conn.is_closed():
+                return False
+            if time.monotonic() - pooled.last_used < self.probe_after:
+                return True
+            cursor = pooled.conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"Snowflake connection {pooled.id} failed its health check: {type(e).__name__}: {e}")
+            return False
+
+    def checkout(self, timeout: float = None) -> PooledConnection:
+        """Take a healthy connection out of the pool, opening or replacing one if needed."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        start = time.monotonic()
+        while True:
+            pooled = placeholder = None
+            with self._available:
+                while True:
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    placeholder = self._reserve()
+                    if placeholder is not None:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No Snowflake connection available after waiting {timeout}s")
+                    self._available.wait(remaining)
+            if pooled is None:
+                pooled = self._open(placeholder)
+
+            # The connection is out of the idle list now: whatever fails, it must not keep its slot
+            try:
+                if not self._is_alive(pooled):
+                    print(f"Snowflake connection {pooled.id} is no longer alive, reconnecting...")
+                    self._discard(pooled)
+                    with self._lock:
+                        self._reconnects += 1
+                    continue
+
+                waited = time.monotonic() - start
+                with self._lock:
+                    if waited > 0.001:
+                        self._waits += 1
+                        self._wait_seconds += waited
+                pooled.checkouts += 1
+                pooled.checked_out_at = time.monotonic()
+                return pooled
+            except BaseException:
+                self._discard(pooled)
+                raise
+
+    def checkin(self, pooled: PooledConnection, broken: bool = False):
+        """Return a connection to the pool; broken connections are closed instead."""
+        now = time.monotonic()
+        if pooled.checked_out_at is not None:
+            pooled.busy_seconds += now - pooled.checked_out_at
+            pooled.checked_out_at = None
+        pooled.last_used = now
+        if broken or self._closed or pooled.conn.is_closed():
+            self._discard(pooled)
+        else:
+            with self._available:
+                self._idle.append(pooled)
+                self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a raw connection that is checked back in afterwards."""
+        pooled = self.checkout()
+        broken = False
+        try:
+            yield pooled.conn
+        except database_error() as e:
+            pooled.errors += 1
+            broken = getattr(e, 'errno', None) in SESSION_EXPIRED_ERRNOS
+            raise
+        finally:
+            self.checkin(pooled, broken)
+
+    def run(self, fn: Callable[[Any], Any]):
+        """
+        Call fn(connection) with a pooled connection. If the session turns out to have
+        expired, the connection is replaced and fn is retried once.
+        """
+        try:
+            with self.connection() as conn:
+                return fn(conn)
+        except database_error() as e:
+            if getattr(e, 'errno', None) not in SESSION_EXPIRED_ERRNOS:
+                raise
+            print(f"Snowflake session expired ({e.errno}), retrying on a new connection...")
+            with self._lock:
+                self._reconnects += 1
+            with self.connection() as conn:
+                return fn(conn)
+
+    async def run_async(self, fn: Callable[[Any], Awaitable[Any]]):
+        """
+        Await fn(connection) with a pooled connection, for the asyncio bot. Checking out (which may
+        connect or health-check) runs in a worker thread; session expiry is retried once as in run().
+        """
+        for attempt in range(2):
+            pooled = await asyncio.to_thread(self.checkout)
+            broken = False
+            try:
+                return await fn(pooled.conn)
+            except database_error() as e:
+                pooled.errors += 1
+                broken = getattr(e, 'errno', None) in SESSION_EXPIRED_ERRNOS
+                if not broken or attempt:
+                    raise
+                print(f"Snowflake session expired ({e.errno}), retrying on a new connection...")
+                with self._lock:
+                    self._reconnects += 1
+            finally:
+                self.checkin(pooled, broken)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            connections = [pooled.metrics() for pooled in self._all.values() if pooled is not None]
+            return {
+                "max_size": self.max_size,
+                "open": len(connections),
+                "idle": len(self._idle),
+                "created": self._created,
+                "reconnects": self._reconnects,
+                "waits": self._waits,
+                "wait_seconds": round(self._wait_seconds, 3),
+                "connections": connections,
+            }
+
+    def close(self):
+        """Close every idle connection; checked out ones are closed when returned."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._discard(pooled)
@@ -1,11 +1,130 @@
 import requests
 import json
 import os
-from generate_jwt import JWTGenerator
+import hashlib
+import threading
+import time
+from types import MappingProxyType
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from generate_jwt import JWTGenerator, JWTTokenManager
+from sse_parser import SSEParser, AgentResponseAccumulator
+import metrics
 
 DEBUG = False
 
 
+def semantic_model_resource(semantic_model: str) -> dict[str, str]:
+    """Build the text-to-SQL tool resource for a configured semantic model string."""
+    # Handle different formats of semantic model paths
+    # Snowflake stage path format (@DB.SCHEMA.STAGE/file.yaml)
+    if semantic_model.startswith('@') and '/' in semantic_model:
+        # This is already in the correct format for stage files
+        return {
+            "semantic_model_file": semantic_model
+        }
+    # Local YAML file, even if its path contains dots (./models/sales.yaml)
+    elif not semantic_model.startswith('@') and semantic_model.endswith(('.yaml', '.yml')):
+        return {
+            "semantic_model_file": semantic_model
+        }
+    # Regular Snowflake identifier (@DB.SCHEMA.MODEL or DB.SCHEMA.MODEL)
+    elif semantic_model.startswith('@') or '.' in semantic_model:
+        # Remove @ if present
+        model_path = semantic_model.lstrip('@')
+        return {
+            "semantic_model": model_path
+        }
+    # Local file path
+    else:
+        return {
+            "semantic_model_file": semantic_model
+        }
+
+
+class CompiledTool(NamedTuple):
+    """One agent tool with its spec and resource serialized ahead of time."""
+    name: str
+    type: str
+    source: str  # The configured search service or semantic model string
+    spec_json: str
+    resource_json: str
+
+
+class RequestTemplate(NamedTuple):
+    """
+    Immutable, pre-serialized agent request body.
+    render() only has to JSON-encode the user message and splice it between prefix and suffix.
+    """
+    model: str
+    tools: tuple
+    payload: MappingProxyType  # Read-only view of everything except the messages, for inspection
+    prefix: bytes
+    suffix: bytes
+    fingerprint: str  # Changes whenever the model, semantic models or search services change
+
+    def render(self, query: str) -> bytes:
+        message = json.dumps([{"role": "user", "content": [{"type": "text", "text": query}]}])
+        return self.prefix + message.encode('utf-8') + self.suffix
+
+    def with_tools(self, names) -> 'RequestTemplate':
+        """The same request restricted to the named tools, in their configured order."""
+        return assemble_request_template(self.model, [tool for tool in self.tools if tool.name in names])
+
+
+def compile_request_template(model: str, search_services: list, semantic_models: list,
+                             search_limit: int = 1) -> RequestTemplate:
+    """Build the tools and tool_resources for every configured service once and serialize them."""
+    tools = []
+
+    # Add multiple search services
+    for i, search_service in enumerate(search_services):
+        search_tool_name = f"search_service_{i}"
+        spec = {"tool_spec": {"type": "cortex_search", "name": search_tool_name}}
+        resource = {
+            "name": search_service,
+            "max_results": search_limit,
+            "title_column": "title",
+            "id_column": "relative_path",
+        }
+        tools.append(CompiledTool(search_tool_name, "cortex_search", search_service,
+                                  json.dumps(spec), json.dumps(resource)))
+
+    # Add multiple text-to-SQL tools and their resources
+    for i, semantic_model in enumerate(semantic_models):
+        tool_name = f"semantic_model_{i}"
+        spec = {"tool_spec": {"type": "cortex_analyst_text_to_sql", "name": tool_name}}
+        tools.append(CompiledTool(tool_name, "cortex_analyst_text_to_sql", semantic_model,
+                                  json.dumps(spec), json.dumps(semantic_model_resource(semantic_model))))
+
+    return assemble_request_template(model, tools)
+
+
+def assemble_request_template(model: str, tools: list) -> RequestTemplate:
+    """Serialize the compiled tools into the request prefix and suffix."""
+    tools_json = "[" + ", ".join(tool.spec_json for tool in tools) + "]"
+    resources_json = "{" + ", ".join(f"{json.dumps(tool.name)}: {tool.resource_json}" for tool in tools) + "}"
+
+    payload = {
+        "model": model,
+        "tools": tuple(json.loads(tool.spec_json) for tool in tools),
+        "tool_resources": {tool.name: json.loads(tool.resource_json) for tool in tools},
+    }
+    prefix = f'{{"model": {json.dumps(model)}, "messages": '.encode('utf-8')
+    suffix = f', "tools": {tools_json}, "tool_resources": {resources_json}}}'.encode('utf-8')
+    return RequestTemplate(
+        model=model,
+        tools=tuple(tools),
+        payload=MappingProxyType(payload),
+        prefix=prefix,
+        suffix=suffix,
+        fingerprint=hashlib.sha256(prefix + suffix).hexdigest(),
+    )
+
+
 class CortexChat:
     def __init__(self,
                  agent_url: str,
@@ -14,7 +133,11 @@ class CortexChat:
                  model: str,
                  account: str,
                  user: str,
-                 private_key_path: str
+                 private_key_path: str,
+                 search_limit: int = 1,
+                 pool_size: int = 10,
+                 max_retries: int = 2,
+                 timeout: tuple = (5, 300)
                  ):
         self.agent_url = agent_url
         self.model = model
@@ -23,214 +146,209 @@ class CortexChat:
         self.account = account
         self.user = user
         self.private_key_path = private_key_path
-        self.jwt = self._generate_jwt()
+        self.request_template = compile_request_template(model, search_services, semantic_models, search_limit)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = self._create_session(pool_size, max_retries)
+        self._stats_lock = threading.Lock()
+        self._request_count = 0
+        # Renews the JWT in the background ahead of expiry, so requests never hit the 401 retry
+        self.token_manager = JWTTokenManager(JWTGenerator(account, user, private_key_path)).start()
+
+    @property
+    def jwt(self) -> str:
+        return self.token_manager.get_token()
+
+    @staticmethod
+    def _create_session(pool_size: int, max_retries: int) -> requests.Session:
+        """Create a keep-alive session whose pool can hold `pool_size` connections to the agent host."""
+        # Only retry failures to establish a connection: the agent POST itself is not idempotent
+        retry = Retry(total=max_retries, connect=max_retries, read=0, status=0, other=0, backoff_factor=0.2)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def warmup(self, connections: int = None) -> int:
+        """
+        Open idle keep-alive connections to the agent host so the first questions skip the TCP+TLS handshake.
+        Returns the number of connections that were opened successfully.
+        """
+        connections = min(self.pool_size if connections is None else connections, self.pool_size)
+        if connections <= 0:
+            return 0
+        parts = urlsplit(self.agent_url)
+        base_url = f"{parts.scheme}://{parts.netloc}/"
+
+        def open_connection(_):
+            try:
+                # Any response means the TLS session is up; reading the body hands the connection back to the pool
+                self.session.head(base_url, timeout=self.timeout[0]).close()
+                return True
+            except requests.RequestException as e:
+                print(f"Agent connection warmup failed: {e}")
+                return False
+
+        # Open the connections concurrently, otherwise every HEAD would reuse the same socket
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            opened = sum(executor.map(open_connection, range(connections)))
+        print(f"Warmed up {opened}/{connections} agent connections")
+        return opened
+
+    def pool_stats(self) -> dict[str, any]:
+        """Return connection pool statistics for the agent endpoint."""
+        adapter = self.session.get_adapter(self.agent_url)
+        hosts = {}
+        for key in adapter.poolmanager.pools.keys():
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle_connections": idle,
+                "max_size": pool.pool.maxsize if pool.pool else 0,
+            }
+        with self._stats_lock:
+            request_count = self._request_count
+        return {
+            "pool_size": self.pool_size,
+            "agent_requests": request_count,
+            "hosts": hosts,
+        }
+
+    def _retrieve_response(self, query: str, request_template: RequestTemplate = None) -> dict[str, any]:
+        response = self._send_request(query, request_template)
+        if DEBUG:
+            print(response.text)
 
-    def _generate_jwt(self):
-        return JWTGenerator(self.account, self.user, self.private_key_path).get_token()
+        if response.status_code == 200:
+            return self._parse_response(response)
+        else:
+            return self._error_response(response.status_code, response.text)
 
-    def _retrieve_response(self, query: str, limit=1) -> dict[str, any]:
+    def _send_request(self, query: str, request_template: RequestTemplate = None) -> requests.Response:
+        """
+        Send the query to the agent endpoint and return the (streaming) HTTP response.
+        `request_template` replaces the full tool set, e.g. with the tools a router picked.
+        """
         url = self.agent_url
         headers = {
             'X-Snowflake-Authorization-Token-Type': 'KEYPAIR_JWT',
             'Content-Type': 'application/json',
             'Accept': 'application/json',
-            'Authorization': f"Bearer {self.jwt}"
+            'Authorization': f"Bearer {self.token_manager.get_token()}"
         }
 
-        # Set up tools and tool resources
-        tools = []
-        tool_resources = {}
-
-        # Add multiple search services
-        for i, search_service in enumerate(self.search_services):
-            search_tool_name = f"search_service_{i}"
-            tools.append({
-                "tool_spec": {
-                    "type": "cortex_search",
-                    "name": search_tool_name
-                }
-            })
-
-            tool_resources[search_tool_name] = {
-                "name": search_service,
-                "max_results": limit,
-                "title_column": "title",
-                "id_column": "relative_path",
-            }
-
-        # Add multiple text-to-SQL tools and their resources
-        for i, semantic_model in enumerate(self.semantic_models):
-            tool_name = f"semantic_model_{i}"
-            tools.append({
-                "tool_spec": {
-                    "type": "cortex_analyst_text_to_sql",
-                    "name": tool_name
-                }
-            })
-
-            # Handle different formats of semantic model paths
-            # Snowflake stage path format (@DB.SCHEMA.STAGE/file.yaml)
-            if semantic_model.startswith('@') and '/' in semantic_model:
-                # This is already in the correct format for stage files
-                tool_resources[tool_name] = {
-                    "semantic_model_file": semantic_model
-                }
-            # Regular Snowflake identifier (@DB.SCHEMA.MODEL or DB.SCHEMA.MODEL)
-            elif semantic_model.startswith('@') or '.' in semantic_model:
-                # Remove @ if present
-                model_path = semantic_model.lstrip('@')
-                tool_resources[tool_name] = {
-                    "semantic_model": model_path
-                }
-            # Local file path
-            else:
-                tool_resources[tool_name] = {
-                    "semantic_model_file": semantic_model
-                }
-
-        data = {
-            "model": self.model,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": query
-                        }
-                    ]
-                }
-            ],
-            "tools": tools,
-            "tool_resources": tool_resources,
-        }
+        # Only the user message is serialized per query, the rest comes from the compiled template
+        data = (request_template or self.request_template).render(query)
 
         # Debug log the entire request data
         if DEBUG:
             print("Request data:")
-            print(json.dumps(data, indent=2))
+            print(json.dumps(json.loads(data), indent=2))
             print("\nRequest headers:")
             for key, value in headers.items():
                 print(f"{key}: {'*****' if key == 'Authorization' else value}")
 
-        response = requests.post(url, headers=headers, json=data)
+        response = self._post(url, headers, data)
 
         if response.status_code == 401:  # Unauthorized - likely expired JWT
+            response.close()
             print("JWT has expired. Generating new JWT...")
             # Generate new token
-            self.jwt = self._generate_jwt()
+            token = self.token_manager.refresh()
             # Retry the request with the new token
-            headers["Authorization"] = f"Bearer {self.jwt}"
+            headers["Authorization"] = f"Bearer {token}"
             print("New JWT generated. Sending new request to Cortex Agents API. Please wait...")
-            response = requests.post(url, headers=headers, json=data)
+            response = self._post(url, headers, data)
 
-        if DEBUG:
-            print(response.text)
+        return response
 
-        if response.status_code == 200:
-            return self._parse_response(response)
-        else:
-            print(f"Error: Received status code {response.status_code}")
-            print(f"Response content: {response.text}")
-            # Return a structured error response
-            return {
-                "text": f"Error {response.status_code}: {response.text}",
-                "sql": "",
-                "sql_results": {},
-                "search_results": {},
-                "citations": ""
-            }
+    def _post(self, url: str, headers: dict, data: bytes) -> requests.Response:
+        with self._stats_lock:
+            self._request_count += 1
+        return self.session.post(url, headers=headers, data=data, stream=True, timeout=self.timeout)
 
-    def _parse_delta_content(self, content: list) -> dict[str, any]:
-        """Parse different types of content from the delta."""
-        result = {
-            'text': '',
-            'tool_use': [],
-            'tool_results': []
+    def _error_response(self, status_code: int, body: str) -> dict[str, any]:
+        """Build the structured error response for a non-200 agent reply."""
+        print(f"Error: Received status code {status_code}")
+        print(f"Response content: {body}")
+        return {
+            "text": f"Error {status_code}: {body}",
+            "sql": "",
+            "sql_results": {},
+            "search_results": {},
+            "citations": "",
+            "error": True
         }
 
-        for entry in content:
-            entry_type = entry.get('type')
-            if entry_type == 'text':
-                result['text'] += entry.get('text', '')
-            elif entry_type == 'tool_use':
-                result['tool_use'].append(entry.get('tool_use', {}))
-            elif entry_type == 'tool_results':
-                result['tool_results'].append(entry.get('tool_results', {}))
-
-        return result
-
-    def _process_sse_line(self, line: str) -> dict[str, any]:
-        """Process a single SSE line and return parsed content."""
-        if not line.startswith('data: '):
-            return {}
-        try:
-            json_str = line[6:].strip()  # Remove 'data: ' prefix
-            if json_str == '[DONE]':
-                return {'type': 'done'}
-
-            data = json.loads(json_str)
-            if data.get('object') == 'message.delta':
-                delta = data.get('delta', {})
-                if 'content' in delta:
-                    return {
-                        'type': 'message',
-                        'content': self._parse_delta_content(delta['content'])
-                    }
-            return {'type': 'other', 'data': data}
-        except json.JSONDecodeError:
-            return {'type': 'error', 'message': f'Failed to parse: {line}'}
+    def _stream_events(self, response: requests.Response, accumulated: AgentResponseAccumulator):
+        """Yield text deltas and tool events as SSE frames arrive, accumulating them as we go."""
+        parser = SSEParser()
+        parse_seconds = 0.0
+        received = 0
+        # chunk_size=None hands over bytes as soon as they arrive on the socket
+        for chunk in response.iter_content(chunk_size=None):
+            start = time.perf_counter()
+            events = self._parse_chunk(parser, accumulated, chunk)
+            parse_seconds += time.perf_counter() - start
+            received += len(chunk)
+            yield from events
+        yield from self._parse_chunk(parser, accumulated)
+        metrics.observe('sse_parse', parse_seconds, bytes=received, deltas=len(accumulated.text_parts))
+
+    @staticmethod
+    def _parse_chunk(parser: SSEParser, accumulated: AgentResponseAccumulator, chunk: bytes = None) -> list[dict]:
+        """
+        Parse one network chunk (or, without one, flush the parser at the end of the stream) into events.
+        Events are collected before they are yielded, so the parse time excludes the consumer's.
+        """
+        frames = parser.feed(chunk) if chunk is not None else parser.close()
+        return [{'type': kind, kind: value} for _, data in frames for kind, value in accumulated.add(data)]
 
     def _parse_response(self, response: requests.Response) -> dict[str, any]:
         """Parse and print the SSE chat response with improved organization."""
-        accumulated = {
-            'text': '',
-            'tool_use': [],
-            'tool_results': [],
-            'other': []
-        }
-
-        for line in response.iter_lines():
-            if line:
-                result = self._process_sse_line(line.decode('utf-8'))
-
-                if result.get('type') == 'message':
-                    content = result['content']
-                    accumulated['text'] += content['text']
-                    accumulated['tool_use'].extend(content['tool_use'])
-                    accumulated['tool_results'].extend(content['tool_results'])
-                elif result.get('type') == 'other':
-                    accumulated['other'].append(result['data'])
-
-        text = ''
+        accumulated = AgentResponseAccumulator()
+        for _ in self._stream_events(response, accumulated):
+            pass
+        return self._build_response(accumulated)
+
+    def _build_response(self, accumulated: AgentResponseAccumulator) -> dict[str, any]:
+        """Turn the accumulated SSE content into the structured response returned by chat()."""
+        text = accumulated.text  # Joined once from the streamed parts
         sql = ''  # For backward compatibility
         sql_results = {}  # Dict to store results from multiple semantic models
         search_results = {}  # Dict to store results from multiple search services
         citations = ''
 
-        if accumulated['text']:
-            text = accumulated['text']
-
         if DEBUG:
             print("\n=== Complete Response ===")
 
             print("\n--- Generated Text ---")
             print(text)
 
-            if accumulated['tool_use']:
+            if accumulated.tool_use:
                 print("\n--- Tool Usage ---")
-                print(json.dumps(accumulated['tool_use'], indent=2))
+                print(json.dumps(accumulated.tool_use, indent=2))
 
-            if accumulated['other']:
+            if accumulated.other:
                 print("\n--- Other Messages ---")
-                print(json.dumps(accumulated['other'], indent=2))
+                print(json.dumps(accumulated.other, indent=2))
 
-            if accumulated['tool_results']:
+            if accumulated.tool_results:
                 print("\n--- Tool Results ---")
-                print(json.dumps(accumulated['tool_results'], indent=2))
+                print(json.dumps(accumulated.tool_results, indent=2))
+
+            if accumulated.errors:
+                print("\n--- Parse Errors ---")
+                print("\n".join(accumulated.errors))
 
-        if accumulated['tool_results']:
-            for result in accumulated['tool_results']:
+        if accumulated.tool_results:
+            for result in accumulated.tool_results:
                 for k, v in result.items():
                     if k == 'content':
                         for content in v:
@@ -250,11 +368,12 @@ class CortexChat:
                                 search_results[tool_name] = result_items
 
                                 # Process citations
-                                for search_result in result_items:
-                                    citations += f"{search_result['text']}"
+                                citations += ''.join(search_result['text'] for search_result in result_items)
                                 text = text.replace("【†1†】", "").replace("【†2†】", "").replace("【†3†】", "").replace(" .",
                                                                                                                    ".") + "*"
-                                citations = f"{search_result['doc_title']} \n {citations} \n\n[Source: {search_result['doc_id']}]"
+                                if result_items:
+                                    search_result = result_items[-1]
+                                    citations = f"{search_result['doc_title']} \n {citations} \n\n[Source: {search_result['doc_id']}]"
 
         # Ensure all expected keys are present (with defaults)
         return {
@@ -265,6 +384,38 @@ class CortexChat:
             "citations": citations if citations else ""
         }
 
-    def chat(self, query: str) -> any:
-        response = self._retrieve_response(query)
-        return response
\ No newline at end of file
+    def tool_label(self, tool_name: str) -> str:
+        """Human readable name of the search service or semantic model behind a tool, e.g. for headings."""
+        for tool in self.request_template.tools:
+            if tool.name == tool_name:
+                source = tool.source.lstrip('@')
+                # Semantic model files: the file name without its extension
+                for extension in ('.yaml', '.yml'):
+                    if source.endswith(extension):
+                        return source[:-len(extension)].split('/')[-1]
+                # DB.SCHEMA.NAME identifiers: the object name
+                return source.split('.')[-1]
+        return tool_name
+
+    def chat(self, query: str, request_template: RequestTemplate = None) -> any:
+        response = self._retrieve_response(query, request_template)
+        return response
+
+    def stream_chat(self, query: str, request_template: RequestTemplate = None):
+        """
+        Streaming variant of chat().
+
+        Yields events as the agent produces them:
+            {'type': 'text', 'text': <delta>}
+            {'type': 'tool_use', 'tool_use': {...}}
+            {'type': 'tool_results', 'tool_results': {...}}
+        and finally {'type': 'done', 'response': <same dict chat() returns>}.
+        """
+        response = self._send_request(query, request_template)
+        if response.status_code != 200:
+            yield {'type': 'done', 'response': self._error_response(response.status_code, response.text)}
+            return
+
+        accumulated = AgentResponseAccumulator()
+        yield from self._stream_events(response, accumulated)
+        yield {'type': 'done', 'response': self._build_response(accumulated)}
\ No newline at end of file
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+def event_keys(body: dict) -> list[str]:
+    """
+    Identity keys of a Slack event delivery. A redelivery carries the same event_id; the same
+    user message delivered as a different event (e.g. after a reconnect) shares its client_msg_id.
+    """
+    keys = []
+    if body.get('event_id'):
+        keys.append(f"event:{body['event_id']}")
+    client_msg_id = body.get('event', {}).get('client_msg_id')
+    if client_msg_id:
+        keys.append(f"msg:{client_msg_id}")
+    return keys
+
+
+class EventDeduplicator:
+    """
+    Remembers recently handled Slack events so redeliveries are dropped before any work is done.
+
+    Keys expire after `ttl_seconds` (Slack gives up redelivering well within the default) and at
+    most `max_entries` keys are kept, oldest evicted first, so memory stays bounded.
+    With a shared StateStore the keys are recorded there instead, so a redelivery is dropped
+    even when it reaches another bot process, or the same process after a restart.
+    """
+    NAMESPACE = 'events'
+
+    def __init__(self, ttl_seconds: float = 600, max_entries: int = 10000, store=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.store = store
+        self._seen = OrderedDict()  # key -> expiry, in insertion (and so expiry) order
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def seen(self, keys: list[Hashable]) -> bool:
+        """
+        Check-and-record in one step: returns True if any of the keys was already recorded
+        (the event is a duplicate), otherwise records all of them and returns False.
+        """
+        if not self.enabled or not keys:
+            return False
+        if self.store is not None:
+            # add() is atomic across processes; a key another delivery already added makes this a duplicate
+            added = [self.store.add(self.NAMESPACE, str(key), b'', self.ttl_seconds) for key in keys]
+            if all(added):
+                return False
+            with self._lock:
+                self.duplicates += 1
+            return True
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if any(key in self._seen for key in keys):
+                self.duplicates += 1
+                return True
+            for key in keys:
+                self._seen[key] = now + self.ttl_seconds
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return False
+
+    def _expire(self, now: float):
+        while self._seen:
+            key, expires = next(iter(self._seen.items()))
+            if expires > now:
+                break
+            del self._seen[key]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._seen),
+                "duplicates": self.duplicates,
+            }
@@ -13,6 +13,7 @@ from getpass import getpass
 import hashlib
 import logging
 import sys
+import threading
 
 # This class relies on the PyJWT module (https://pypi.org/project/PyJWT/).
 import jwt
@@ -71,6 +72,8 @@ class JWTGenerator(object):
         self.private_key_file_path = private_key_file_path
         self.renew_time = datetime.now(timezone.utc)
         self.token = None
+        # The public key never changes, so its fingerprint is calculated on the first renewal only
+        self.public_key_fp = None
 
         # Load the private key from the specified file.
         with open(self.private_key_file_path, 'rb') as pem_in:
@@ -103,16 +106,17 @@ class JWTGenerator(object):
         # Use uppercase for the account identifier.
         return account.upper()
 
-    def get_token(self) -> Text:
+    def get_token(self, force: bool = False) -> Text:
         """
         Generates a new JWT. If a JWT has been already been generated earlier, return the previously generated token unless the
         specified renewal time has passed.
+        :param force: Generate a new token even if the renewal time has not passed yet.
         :return: the new token
         """
         now = datetime.now(timezone.utc)  # Fetch the current time
 
         # If the token has expired or doesn't exist, regenerate the token.
-        if self.token is None or self.renew_time <= now:
+        if force or self.token is None or self.renew_time <= now:
             logger.info("Generating a new token because the present time (%s) is later than the renewal time (%s)",
                         now, self.renew_time)
             # Calculate the next time we need to renew the token.
@@ -120,7 +124,9 @@ class JWTGenerator(object):
 
             # Prepare the fields for the payload.
             # Generate the public key fingerprint for the issuer in the payload.
-            public_key_fp = self.calculate_public_key_fingerprint(self.private_key)
+            if self.public_key_fp is None:
+                self.public_key_fp = self.calculate_public_key_fingerprint(self.private_key)
+            public_key_fp = self.public_key_fp
 
             # Create our payload
             payload = {
@@ -167,6 +173,101 @@ class JWTGenerator(object):
 
         return public_key_fp
 
+class JWTTokenManager(object):
+    """
+    Keeps a JWT from a JWTGenerator fresh from a background thread, renewing it `refresh_margin` before it
+    expires so callers never have to send an expired token. get_token() is safe to call from concurrent handlers.
+    """
+    REFRESH_MARGIN = timedelta(minutes=10)  # Renew the token this long before it expires
+    RETRY_DELAY = timedelta(seconds=30)  # Wait this long before retrying a failed renewal
+
+    def __init__(self, generator: JWTGenerator, refresh_margin: timedelta = REFRESH_MARGIN):
+        """
+        :param generator: The JWTGenerator used to sign new tokens.
+        :param refresh_margin: How long before expiry (as a timedelta) the token is renewed.
+        """
+        if refresh_margin >= generator.lifetime:
+            raise ValueError(f"refresh_margin ({refresh_margin}) must be shorter than the token lifetime ({generator.lifetime})")
+        self.generator = generator
+        self.refresh_margin = refresh_margin
+        self.expires_at = None
+        self._token = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refresh()
+
+    def get_token(self) -> Text:
+        """
+        Return the current token. Only renews inline if the background thread has fallen behind.
+        :return: the current token
+        """
+        token = self.fresh_token()
+        if token is not None:
+            return token
+        with self._lock:
+            # Another thread may have renewed the token while we were waiting for the lock
+            if self._token is None or datetime.now(timezone.utc) >= self.expires_at - self.refresh_margin:
+                self._renew()
+            return self._token
+
+    def fresh_token(self) -> Text | None:
+        """
+        Return the current token if it is not due for renewal, otherwise None. Never signs, so it is safe on an event loop.
+        :return: the current token or None
+        """
+        token, expires_at = self._token, self.expires_at
+        if token is not None and datetime.now(timezone.utc) < expires_at - self.refresh_margin:
+            return token
+        return None
+
+    def refresh(self) -> Text:
+        """
+        Force a new token, e.g. after the server rejected the current one.
+        :return: the new token
+        """
+        with self._lock:
+            self._renew()
+            return self._token
+
+    def _renew(self):
+        # Must be called with the lock held
+        token = self.generator.get_token(force=True)
+        claims = jwt.decode(token, options={"verify_signature": False})
+        self.expires_at = datetime.fromtimestamp(claims[EXPIRE_TIME], tz=timezone.utc)
+        self._token = token
+
+    def start(self):
+        """
+        Start the background renewal thread.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="jwt-renewal", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the background renewal thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            wait = (self.expires_at - self.refresh_margin - datetime.now(timezone.utc)).total_seconds()
+            if self._stop.wait(max(wait, 0)):
+                return
+            try:
+                self.refresh()
+                logger.info("Renewed JWT in the background, new expiry is %s", self.expires_at)
+            except Exception:
+                logger.exception("Background JWT renewal failed, retrying in %s", self.RETRY_DELAY)
+                if self._stop.wait(self.RETRY_DELAY.total_seconds()):
+                    return
+
 def main():
     logging.basicConfig(stream=sys.stdout, level=logging.INFO)
     cli_parser = argparse.ArgumentParser()
@@ -0,0 +1,170 @@
+import bisect
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds, from a cache hit to a slow warehouse query
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Tags that become Prometheus labels. Anything else (row counts, sizes) only goes to the JSON log,
+# so the number of time series stays small.
+LABELS = ('semantic_model', 'tool', 'chart_type', 'cache', 'status')
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, as exposed by Prometheus."""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket (what histogram_quantile() does)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Per-stage latency histograms, keyed by stage name and label values.
+
+    Spans can also be written as one JSON line each (stage, seconds and every tag), which is the
+    place for high-cardinality tags such as row counts.
+    """
+
+    def __init__(self, json_logs: bool = False):
+        self.json_logs = json_logs
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, **tags):
+        labels = tuple((name, str(tags[name])) for name in LABELS if tags.get(name) is not None)
+        with self._lock:
+            histogram = self._histograms.get((stage, labels))
+            if histogram is None:
+                histogram = self._histograms[(stage, labels)] = Histogram()
+            histogram.observe(seconds)
+        if self.json_logs:
+            # One write per line, so lines from concurrent requests do not interleave
+            sys.stdout.write(json.dumps({"span": stage, "seconds": round(seconds, 6), **tags}, default=str) + "\n")
+
+    @contextmanager
+    def span(self, stage: str, **tags):
+        """
+        Time the block as one `stage` span. Yields the tag dict, so tags only known at the end
+        (e.g. the row count) can be added inside the block. Blocks are tagged status=ok, or status=error
+        if they raised.
+        """
+        start = time.perf_counter()
+        try:
+            yield tags
+            tags.setdefault('status', 'ok')
+        except BaseException:
+            tags['status'] = 'error'
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, **tags)
+
+    def summary(self) -> dict[str, dict]:
+        """count, mean, p50, p95 and p99 per stage, all labels merged."""
+        merged = {}
+        with self._lock:
+            for (stage, _), histogram in self._histograms.items():
+                total = merged.setdefault(stage, Histogram())
+                total.counts = [a + b for a, b in zip(total.counts, histogram.counts)]
+                total.sum += histogram.sum
+                total.count += histogram.count
+        return {
+            stage: {
+                "count": histogram.count,
+                "mean": round(histogram.sum / histogram.count, 4) if histogram.count else 0.0,
+                "p50": round(histogram.quantile(0.50), 4),
+                "p95": round(histogram.quantile(0.95), 4),
+                "p99": round(histogram.quantile(0.99), 4),
+            }
+            for stage, histogram in sorted(merged.items())
+        }
+
+    def render_prometheus(self) -> str:
+        """All histograms in the Prometheus text exposition format."""
+        lines = [
+            "# HELP bot_stage_seconds Time spent in each stage of answering a Slack question",
+            "# TYPE bot_stage_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for (stage, labels), histogram in items:
+                base = [f'stage="{stage}"'] + [f'{name}="{_escape(value)}"' for name, value in labels]
+                cumulative = 0
+                labels_text = ",".join(base)
+                for bound, count in zip(self.bucket_bounds(), histogram.counts):
+                    cumulative += count
+                    lines.append(f'bot_stage_seconds_bucket{{{labels_text},le="{bound}"}} {cumulative}')
+                lines.append(f'bot_stage_seconds_sum{{{labels_text}}} {histogram.sum}')
+                lines.append(f'bot_stage_seconds_count{{{labels_text}}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def bucket_bounds() -> list[str]:
+        return [str(bound) for bound in BUCKETS] + ["+Inf"]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def serve(self, port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+        """Serve GET /metrics (Prometheus text) and GET /metrics.json (summary) from a daemon thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = registry.render_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(registry.summary()), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass  # Scrapes every few seconds would drown out the bot's own output
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Process-wide registry used by every module, like logging's root logger
+registry = Metrics()
+span = registry.span
+observe = registry.observe
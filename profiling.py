@@ -0,0 +1,231 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import itertools
+import os
+import pstats
+import random
+import re
+import signal
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# "!profile on 25", "!profile off", "!profile status"
+COMMAND = re.compile(r'^\s*!profile(?:\s+(on|off|status))?(?:\s+(\d+(?:\.\d+)?)%?)?\s*$', re.IGNORECASE)
+
+# Functions shown per profile in the text report
+TOP_FUNCTIONS = 40
+
+
+class Profiler:
+    """
+    Samples a share of requests and profiles selected stages of them (cProfile for CPU time,
+    tracemalloc for allocations), writing a .prof file and a text report per stage to `output_dir`.
+
+    Switched on and off at runtime through enable()/disable(), a signal or the admin command, so a
+    live process can be diagnosed without a restart. Unsampled requests only pay for one random()
+    call. A thread profiles one stage at a time; a stage starting while its thread (or, on Python
+    3.12+, any thread) is already profiling is skipped. Profiles and allocation figures can include
+    work of other requests that ran at the same time, such as other coroutines on the event loop.
+    """
+
+    def __init__(self, output_dir: str = 'profiles', sample_percent: float = 10, top_allocators: int = 25):
+        self.output_dir = output_dir
+        self.sample_percent = sample_percent
+        self.top_allocators = top_allocators
+        self.enabled = False
+        self.sampled = 0
+        self.written = 0
+        self.skipped = 0
+        self._local = threading.local()  # Whether this thread is profiling a stage already
+        self._tracing_lock = threading.Lock()
+        self._tracing_stages = 0
+        self._started_tracing = False
+        self._ids = itertools.count(1)
+        # Name of the sampled request being handled in this context, or None
+        self._request = contextvars.ContextVar('profiled_request', default=None)
+
+    def enable(self, sample_percent: float = None):
+        if sample_percent is not None:
+            self.sample_percent = min(max(sample_percent, 0.0), 100.0)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.enabled = True
+        print(f"Profiling enabled for {self.sample_percent:g}% of requests, writing to {os.path.abspath(self.output_dir)}")
+
+    def disable(self):
+        self.enabled = False
+        print(f"Profiling disabled ({self.written} profiles written)")
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def install_signal_handler(self, signum: int = None):
+        """Toggle profiling on `signum` (SIGUSR1 by default). Must be called from the main thread."""
+        signum = signum or getattr(signal, 'SIGUSR1', None)
+        if signum is None:  # Windows
+            return
+        signal.signal(signum, lambda *_: self.toggle())
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_percent": self.sample_percent,
+            "sampled_requests": self.sampled,
+            "profiles_written": self.written,
+            "skipped_busy": self.skipped,
+            "output_dir": os.path.abspath(self.output_dir),
+        }
+
+    @contextmanager
+    def request(self, label: str = ''):
+        """Decide whether this request is sampled; stages run inside the block are profiled if so."""
+        if not self.enabled or random.random() * 100 >= self.sample_percent:
+            yield None
+            return
+        self.sampled += 1
+        name = f"{datetime.now():%Y%m%d-%H%M%S}-{next(self._ids)}" + (f"-{label}" if label else "")
+        token = self._request.set(name)
+        try:
+            yield name
+        finally:
+            self._request.reset(token)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Profile the block if the current request is sampled and no other stage is being profiled."""
+        request = self._request.get()
+        if request is None:
+            yield
+            return
+        if getattr(self._local, 'active', False):
+            self.skipped += 1
+            yield
+            return
+        self._local.active = True
+        try:
+            with self._profile(request, stage):
+                yield
+        finally:
+            self._local.active = False
+
+    def profiled(self, stage: str):
+        """Decorator form of stage() for plain and async functions."""
+        def decorator(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.stage(stage):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _start_tracing(self) -> bool:
+        """Start tracemalloc for a stage; returns True if nothing was traced before."""
+        with self._tracing_lock:
+            fresh = self._tracing_stages == 0 and not tracemalloc.is_tracing()
+            if fresh:
+                tracemalloc.start()
+                self._started_tracing = True
+            self._tracing_stages += 1
+            return fresh
+
+    def _stop_tracing(self):
+        # Only stop tracing once the last stage is done, and never if someone else started it
+        with self._tracing_lock:
+            self._tracing_stages -= 1
+            if self._tracing_stages == 0 and self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    @contextmanager
+    def _profile(self, request: str, stage: str):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:  # Another profiler owns the hook (a debugger, or another stage on Python 3.12+)
+            self.skipped += 1
+            if self.skipped == 1:
+                print(f"Could not profile {stage}: {e}")
+            yield
+            return
+
+        # tracemalloc only runs while stages are profiled; if it was already tracing, compare snapshots
+        before = None if self._start_tracing() else tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            profile.disable()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            snapshot = tracemalloc.take_snapshot()
+            self._stop_tracing()
+            try:
+                self._write(request, stage, seconds, peak, profile, snapshot, before)
+            except OSError as e:
+                print(f"Could not write the {stage} profile: {e}")
+
+    def _write(self, request: str, stage: str, seconds: float, peak: int, profile: cProfile.Profile,
+               snapshot: tracemalloc.Snapshot, before: tracemalloc.Snapshot = None):
+        """<request>-<stage>.prof for pstats/snakeviz, and <request>-<stage>.txt with the top functions and allocators."""
+        base = os.path.join(self.output_dir, f"{request}-{stage}")
+        profile.dump_stats(base + '.prof')
+
+        # Leave out the profiler's own bookkeeping
+        ignore = [tracemalloc.Filter(False, module.__file__) for module in (tracemalloc, cProfile, pstats)]
+        ignore.append(tracemalloc.Filter(False, __file__))
+        snapshot = snapshot.filter_traces(ignore)
+        if before is not None:
+            allocators = snapshot.compare_to(before.filter_traces(ignore), 'lineno')
+        else:
+            allocators = snapshot.statistics('lineno')
+
+        report = io.StringIO()
+        report.write(f"{stage} of request {request}: {seconds:.3f}s, allocation peak {peak / 1024:.1f} KiB\n\n")
+        report.write(f"Top {self.top_allocators} allocators still holding memory at the end of the stage:\n")
+        for stat in allocators[:self.top_allocators]:
+            report.write(f"  {stat}\n")
+        report.write("\n")
+        pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        with open(base + '.txt', 'w') as f:
+            f.write(report.getvalue())
+        self.written += 1
+        print(f"Profiled {stage} ({seconds:.2f}s) -> {base}.prof")
+
+    def command(self, text: str) -> str | None:
+        """
+        Apply an admin "!profile [on [percent]|off|status]" message.
+        Returns the reply to post, or None if the text is not a profiling command.
+        """
+        match = COMMAND.match(text or '')
+        if not match:
+            return None
+        action = (match.group(1) or 'status').lower()
+        if action == 'on':
+            self.enable(float(match.group(2)) if match.group(2) else None)
+        elif action == 'off':
+            self.disable()
+        status = self.status()
+        state = f"on for {status['sample_percent']:g}% of requests" if status['enabled'] else "off"
+        return (f"Profiling is {state}. {status['sampled_requests']} requests sampled, "
+                f"{status['profiles_written']} profiles written to {status['output_dir']}.")
+
+
+def is_profile_command(text: str) -> bool:
+    return bool(COMMAND.match(text or ''))
@@ -0,0 +1,338 @@
+import asyncio
+import threading
+import time
+from typing import TYPE_CHECKING
+from connection_pool import SESSION_EXPIRED_ERRNOS, database_error
+import metrics
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas, pyarrow and the connector are imported on first use so the bot starts quickly
+
+# Rows per fetchmany() call on the non-Arrow fallback path
+FETCH_BATCH_SIZE = 10000
+
+# Polling interval bounds while waiting on asynchronous queries
+FIRST_POLL_INTERVAL = 0.1
+MAX_POLL_INTERVAL = 1.0
+
+
+class QueryTimeoutError(TimeoutError):
+    """Raised (or returned) when a query did not finish within its timeout and was cancelled."""
+
+    def __init__(self, query_id: str, timeout: float):
+        super().__init__(f"Query {query_id} did not finish within {timeout}s and was cancelled")
+        self.query_id = query_id
+        self.timeout = timeout
+
+
+class QuerySupersededError(Exception):
+    """Returned for a query that was cancelled because a newer question from the same user replaced it."""
+
+    def __init__(self, query_id: str):
+        super().__init__(f"Query {query_id} was cancelled because a newer question superseded it")
+        self.query_id = query_id
+
+
+class QueryTicket:
+    """The queries belonging to one question; `superseded` is set when a newer question takes over."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.query_ids = set()
+        self.superseded = threading.Event()
+
+
+class QueryTracker:
+    """
+    Tracks the running queries of each owner (e.g. a user in a channel or thread).
+    Starting a new question supersedes the owner's previous one, whose queries are then
+    cancelled server-side by the execute_concurrently() call waiting on them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+
+    def start(self, owner) -> QueryTicket:
+        ticket = QueryTicket(owner)
+        with self._lock:
+            previous = self._active.get(owner)
+            self._active[owner] = ticket
+        if previous is not None:
+            previous.superseded.set()
+        return ticket
+
+    def finish(self, ticket: QueryTicket):
+        with self._lock:
+            if self._active.get(ticket.owner) is ticket:
+                del self._active[ticket.owner]
+
+    def running(self) -> dict:
+        """Query IDs per owner, for debugging."""
+        with self._lock:
+            return {owner: sorted(ticket.query_ids) for owner, ticket in self._active.items()}
+
+
+def fetch_dataframe(cursor, max_rows: int = None) -> 'pd.DataFrame':
+    """
+    Fetch the result of an executed cursor into a DataFrame.
+
+    Result batches are streamed as Arrow tables and converted to pandas once, so cells are
+    never materialized as Python objects. Fetching stops as soon as `max_rows` rows have
+    arrived; df.attrs['truncated'] tells the caller the result was cut off.
+    Falls back to fetchmany() when Arrow is unavailable for this result.
+    """
+    from snowflake.connector.errors import NotSupportedError
+    try:
+        import pyarrow as pa
+    except ImportError:  # Arrow fetching needs snowflake-connector-python[pandas]
+        pa = None
+    if pa is not None:
+        try:
+            return _fetch_arrow(cursor, max_rows)
+        except NotSupportedError:
+            pass  # e.g. SHOW/DESCRIBE results are not returned in Arrow format
+    return _fetch_rows(cursor, max_rows)
+
+
+def _fetch_arrow(cursor, max_rows: int = None) -> 'pd.DataFrame':
+    import pyarrow as pa
+    tables = []
+    rows = 0
+    truncated = False
+    for table in cursor.fetch_arrow_batches():
+        if max_rows is not None and rows + table.num_rows > max_rows:
+            tables.append(table.slice(0, max_rows - rows))
+            truncated = True
+            break
+        tables.append(table)
+        rows += table.num_rows
+
+    if not tables:
+        df = _empty_dataframe(cursor)
+    else:
+        df = pa.concat_tables(tables).to_pandas()
+    df.attrs['truncated'] = truncated
+    return df
+
+
+def _fetch_rows(cursor, max_rows: int = None) -> 'pd.DataFrame':
+    import pandas as pd
+    result = []
+    truncated = False
+    while True:
+        batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not batch:
+            break
+        result.extend(batch)
+        if max_rows is not None and len(result) > max_rows:
+            del result[max_rows:]
+            truncated = True
+            break
+
+    columns = [desc[0] for desc in cursor.description]
+    df = pd.DataFrame(result, columns=columns)
+    df.attrs['truncated'] = truncated
+    return df
+
+
+def _empty_dataframe(cursor) -> 'pd.DataFrame':
+    import pandas as pd
+    return pd.DataFrame(columns=[desc[0] for desc in cursor.description or []])
+
+
+def cancel_query(conn, query_id: str):
+    """Ask Snowflake to cancel a running query; errors are logged, not raised."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT SYSTEM$CANCEL_QUERY(%s)", (query_id,))
+    except Exception as e:
+        print(f"Could not cancel query {query_id}: {e}")
+    finally:
+        cursor.close()
+
+
+def fetch_query_result(conn, query_id: str, max_rows: int = None) -> 'pd.DataFrame':
+    """Fetch the result of a finished asynchronous query."""
+    cursor = conn.cursor()
+    try:
+        cursor.get_results_from_sfqid(query_id)
+        return fetch_dataframe(cursor, max_rows)
+    finally:
+        cursor.close()
+
+
+def _observe_execute(key: str, labels: dict, started: float, status: str):
+    """Record how long a query ran, from submission until Snowflake reported it finished."""
+    metrics.observe('execute', time.perf_counter() - started, tool=key, semantic_model=labels.get(key), status=status)
+
+
+def _timed_fetch(conn, key: str, query_id: str, max_rows: int, labels: dict) -> 'pd.DataFrame':
+    """fetch_query_result() recorded as a 'dataframe' span tagged with the row count."""
+    with metrics.span('dataframe', tool=key, semantic_model=labels.get(key)) as tags:
+        df = fetch_query_result(conn, query_id, max_rows)
+        tags['rows'] = len(df)
+    return df
+
+
+def execute_concurrently(conn, queries: dict, timeout: float = None, max_rows: int = None,
+                         ticket: QueryTicket = None, labels: dict = None) -> dict:
+    """
+    Run several queries at once as Snowflake asynchronous queries on one session and gather them.
+
+    Args:
+        conn: Snowflake connection
+        queries: Mapping of key (e.g. the tool name) to SQL text
+        timeout: Seconds each query may run before it is cancelled server-side
+        max_rows: Row cap passed on to fetch_dataframe()
+        ticket: QueryTicket from a QueryTracker; once it is superseded the remaining queries are cancelled
+        labels: Mapping of key to the semantic model it queries, used to tag the recorded spans
+
+    Returns:
+        Mapping of the same keys, in the same order, to a DataFrame or to the exception
+        the query failed with (QueryTimeoutError on timeout, QuerySupersededError when superseded).
+        Total latency is that of the slowest query.
+    """
+    superseded = ticket.superseded if ticket is not None else threading.Event()
+    labels = labels or {}
+    results = {}
+    pending = {}
+    started = {}
+    for key, sql in queries.items():
+        if superseded.is_set():
+            results[key] = QuerySupersededError(None)
+            continue
+        cursor = conn.cursor()
+        try:
+            started[key] = time.perf_counter()
+            cursor.execute_async(sql)
+            pending[key] = cursor.sfqid
+            if ticket is not None:
+                ticket.query_ids.add(cursor.sfqid)
+        except database_error() as e:
+            if getattr(e, 'errno', None) in SESSION_EXPIRED_ERRNOS:
+                raise  # Let the pool reconnect and retry the whole batch
+            results[key] = e
+        except Exception as e:
+            results[key] = e
+        finally:
+            cursor.close()
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = FIRST_POLL_INTERVAL
+    while pending:
+        for key, query_id in list(pending.items()):
+            finished = False
+            try:
+                status = conn.get_query_status_throw_if_error(query_id)
+                if conn.is_still_running(status):
+                    continue
+                finished = True
+                _observe_execute(key, labels, started[key], 'ok')
+                results[key] = _timed_fetch(conn, key, query_id, max_rows, labels)
+            except Exception as e:
+                if not finished:
+                    _observe_execute(key, labels, started[key], 'error')
+                results[key] = e
+            del pending[key]
+
+        if not pending:
+            break
+        if superseded.is_set():
+            for key, query_id in pending.items():
+                cancel_query(conn, query_id)
+                _observe_execute(key, labels, started[key], 'superseded')
+                results[key] = QuerySupersededError(query_id)
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            for key, query_id in pending.items():
+                cancel_query(conn, query_id)
+                _observe_execute(key, labels, started[key], 'timeout')
+                results[key] = QueryTimeoutError(query_id, timeout)
+            break
+        # Waiting on the event (instead of sleeping) reacts to a newer question right away
+        superseded.wait(delay if deadline is None else min(delay, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 2, MAX_POLL_INTERVAL)
+
+    return {key: results[key] for key in queries}
+
+
+async def execute_concurrently_async(conn, queries: dict, timeout: float = None, max_rows: int = None,
+                                     ticket: QueryTicket = None, labels: dict = None) -> dict:
+    """
+    asyncio variant of execute_concurrently() for the async bot.
+
+    Status polls sleep on the event loop instead of holding a thread; the connector's blocking
+    calls (submitting, polling, cancelling) and the Arrow -> pandas fetch run in worker threads.
+    Finished queries are fetched concurrently while the others keep running.
+    """
+    superseded = ticket.superseded if ticket is not None else threading.Event()
+    labels = labels or {}
+    results = {}
+    pending = {}
+    started = {}
+
+    def submit(sql):
+        cursor = conn.cursor()
+        try:
+            cursor.execute_async(sql)
+            return cursor.sfqid
+        finally:
+            cursor.close()
+
+    for key, sql in queries.items():
+        if superseded.is_set():
+            results[key] = QuerySupersededError(None)
+            continue
+        try:
+            started[key] = time.perf_counter()
+            pending[key] = await asyncio.to_thread(submit, sql)
+            if ticket is not None:
+                ticket.query_ids.add(pending[key])
+        except database_error() as e:
+            if getattr(e, 'errno', None) in SESSION_EXPIRED_ERRNOS:
+                raise  # Let the pool reconnect and retry the whole batch
+            results[key] = e
+        except Exception as e:
+            results[key] = e
+
+    def poll(query_id):
+        return conn.is_still_running(conn.get_query_status_throw_if_error(query_id))
+
+    async def fetch(key, query_id):
+        try:
+            results[key] = await asyncio.to_thread(_timed_fetch, conn, key, query_id, max_rows, labels)
+        except Exception as e:
+            results[key] = e
+
+    fetches = []
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = FIRST_POLL_INTERVAL
+    while pending:
+        for key, query_id in list(pending.items()):
+            try:
+                if await asyncio.to_thread(poll, query_id):
+                    continue
+                _observe_execute(key, labels, started[key], 'ok')
+                fetches.append(asyncio.create_task(fetch(key, query_id)))
+            except Exception as e:
+                _observe_execute(key, labels, started[key], 'error')
+                results[key] = e
+            del pending[key]
+
+        if not pending:
+            break
+        if superseded.is_set() or (deadline is not None and time.monotonic() >= deadline):
+            for key, query_id in pending.items():
+                await asyncio.to_thread(cancel_query, conn, query_id)
+                _observe_execute(key, labels, started[key], 'superseded' if superseded.is_set() else 'timeout')
+                results[key] = QuerySupersededError(query_id) if superseded.is_set() else QueryTimeoutError(query_id, timeout)
+            break
+        # Polls back off to MAX_POLL_INTERVAL, which bounds how late a newer question is noticed
+        await asyncio.sleep(delay if deadline is None else min(delay, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 2, MAX_POLL_INTERVAL)
+
+    await asyncio.gather(*fetches)
+    return {key: results[key] for key in queries}
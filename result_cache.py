@@ -0,0 +1,196 @@
+import hashlib
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Matches single-quoted SQL string literals (with '' escapes) and double-quoted identifiers
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+# Object columns with at most this share of distinct values are stored as categoricals
+CATEGORY_RATIO = 0.5
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and drop the trailing semicolon, leaving quoted literals and identifiers untouched."""
+    parts = _QUOTED.split(sql.strip())
+    for i in range(0, len(parts), 2):  # Even indexes are outside quotes
+        parts[i] = re.sub(r'\s+', ' ', parts[i])
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+class CompactFrame:
+    """
+    Columnar copy of a DataFrame: one numpy array per column, with repetitive text
+    columns dictionary-encoded as categoricals so cached results stay small.
+    """
+
+    def __init__(self, df: 'pd.DataFrame'):
+        import pandas as pd  # Imported on first use so the bot starts quickly
+        self.columns = list(df.columns)
+        self.index = df.index
+        self.attrs = dict(df.attrs)
+        self.arrays = []
+        self.dtypes = []
+        for column in self.columns:
+            series = df[column]
+            self.dtypes.append(series.dtype)
+            if (series.dtype == object or isinstance(series.dtype, pd.StringDtype)) and len(series) > 0:
+                try:
+                    if series.nunique(dropna=False) <= CATEGORY_RATIO * len(series):
+                        categorical = pd.Categorical(series)
+                        self.arrays.append((categorical.codes.copy(), categorical.categories))
+                        continue
+                except TypeError:
+                    pass  # Unhashable values (e.g. lists) are stored as they are
+            self.arrays.append((series.to_numpy(copy=True), None))
+        self.nbytes = int(sum(self._array_nbytes(values, categories) for values, categories in self.arrays))
+
+    @staticmethod
+    def _array_nbytes(values, categories) -> int:
+        import pandas as pd
+        size = pd.Series(values).memory_usage(deep=True, index=False)
+        if categories is not None:
+            size += categories.memory_usage(deep=True)
+        return size
+
+    def to_dataframe(self) -> 'pd.DataFrame':
+        import pandas as pd
+        data = {}
+        for column, (values, categories), dtype in zip(self.columns, self.arrays, self.dtypes):
+            if categories is not None:
+                data[column] = pd.Categorical.from_codes(values, categories).astype(dtype)
+            else:
+                data[column] = pd.array(values.copy(), dtype=dtype)
+        df = pd.DataFrame(data, columns=self.columns, index=self.index)
+        df.attrs.update(self.attrs)
+        return df
+
+
+class CacheEntry(NamedTuple):
+    frame: CompactFrame
+    expires_at: float
+
+
+class ResultCache:
+    """
+    TTL + LRU cache of query results keyed by normalized SQL, role and warehouse,
+    bounded by the total size of the cached columns.
+
+    With a shared StateStore, results are also written there (pickled, so the store must only be
+    writable by the bot) and local misses are looked up in it, so bot processes on one host share results.
+    """
+    NAMESPACE = 'sql_results'
+
+    def __init__(self, ttl_seconds: float = 300, max_bytes: int = 64 * 1024 * 1024, store=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def key(sql: str, role: str, warehouse: str) -> tuple:
+        return normalize_sql(sql), (role or '').upper(), (warehouse or '').upper()
+
+    @staticmethod
+    def _store_key(key: tuple) -> str:
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+    def get(self, sql: str, role: str, warehouse: str) -> 'pd.DataFrame | None':
+        """Return a fresh copy of the cached result, or None if it is missing or stale."""
+        if not self.enabled:
+            return None
+        key = self.key(sql, role, warehouse)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                entry = None
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                frame = entry.frame
+        if entry is None:
+            frame = self._get_shared(key)
+            with self._lock:
+                if frame is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+        return frame.to_dataframe()
+
+    def _get_shared(self, key: tuple) -> CompactFrame | None:
+        """Look a result up in the shared store and keep a local copy for its remaining lifetime."""
+        if self.store is None:
+            return None
+        data = self.store.get(self.NAMESPACE, self._store_key(key))
+        if data is None:
+            return None
+        expires_at, frame = pickle.loads(data)
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            return None
+        self._insert(key, frame, remaining)
+        return frame
+
+    def put(self, sql: str, role: str, warehouse: str, df: 'pd.DataFrame', ttl_seconds: float = None):
+        """Cache a query result. `ttl_seconds` overrides the default TTL for this entry."""
+        if not self.enabled:
+            return
+        frame = CompactFrame(df)
+        if frame.nbytes > self.max_bytes:
+            return
+        key = self.key(sql, role, warehouse)
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._insert(key, frame, ttl)
+        if self.store is not None and ttl > 0:
+            data = pickle.dumps((time.time() + ttl, frame), protocol=pickle.HIGHEST_PROTOCOL)
+            self.store.set(self.NAMESPACE, self._store_key(key), data, ttl)
+
+    def _insert(self, key: tuple, frame: CompactFrame, ttl: float):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(frame, time.monotonic() + ttl)
+            self._bytes += frame.nbytes
+            # Evict least recently used entries until we are back under the memory budget
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.store is not None:
+            self.store.clear(self.NAMESPACE)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _remove(self, key: tuple):
+        # Must be called with the lock held
+        entry = self._entries.pop(key)
+        self._bytes -= entry.frame.nbytes
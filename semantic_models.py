@@ -0,0 +1,80 @@
+import gzip
+import os
+import tempfile
+from cortex_chat import semantic_model_resource
+
+# Column lists of a logical table, in the order Cortex Analyst documents them
+COLUMN_KINDS = ('dimensions', 'time_dimensions', 'measures', 'facts')
+
+
+def query_rows(conn_pool, sql: str, params: tuple = None) -> list:
+    """Run one statement on a pooled connection and fetch all rows."""
+    def run(conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+    return conn_pool.run(run)
+
+
+def read_semantic_model(conn_pool, semantic_model: str) -> str:
+    """
+    The YAML text of a configured semantic model: a local file is read directly, a stage file is
+    downloaded with GET and a semantic view is exported with SYSTEM$READ_YAML_FROM_SEMANTIC_VIEW.
+    """
+    resource = semantic_model_resource(semantic_model)
+    if 'semantic_model' in resource:
+        rows = query_rows(conn_pool, "SELECT SYSTEM$READ_YAML_FROM_SEMANTIC_VIEW(%s)", (resource['semantic_model'],))
+        return rows[0][0]
+
+    path = resource['semantic_model_file']
+    if not path.startswith('@'):
+        with open(path) as f:
+            return f.read()
+
+    with tempfile.TemporaryDirectory() as directory:
+        quoted = path.replace("'", "\\'")
+        target = directory.replace('\\', '/')
+        query_rows(conn_pool, f"GET '{quoted}' 'file://{target}/'")
+        files = os.listdir(directory)
+        if not files:
+            raise FileNotFoundError(f"{path} not found on stage")
+        local = os.path.join(directory, files[0])
+        # PUT compresses files unless AUTO_COMPRESS = FALSE
+        opener = gzip.open if local.endswith('.gz') else open
+        with opener(local, 'rt') as f:
+            return f.read()
+
+
+def load_semantic_model(conn_pool, semantic_model: str) -> dict:
+    """The parsed semantic model YAML."""
+    import yaml  # Only needed while starting up
+    return yaml.safe_load(read_semantic_model(conn_pool, semantic_model)) or {}
+
+
+def load_semantic_models(conn_pool, request_template) -> dict[str, dict]:
+    """The parsed YAML of every semantic model tool in the request, by tool name."""
+    return {
+        tool.name: load_semantic_model(conn_pool, tool.source)
+        for tool in request_template.tools if tool.type == 'cortex_analyst_text_to_sql'
+    }
+
+
+def base_table_name(table: dict) -> str:
+    """Fully qualified name of the physical table behind a logical table."""
+    base = table.get('base_table', {})
+    return ".".join(base[part] for part in ('database', 'schema', 'table') if base.get(part))
+
+
+def logical_table_sql(table: dict) -> str:
+    """
+    A SELECT that exposes the physical table under its logical column names, i.e. what a
+    `__<table>` reference in verified SQL means to Cortex Analyst.
+    """
+    columns = [
+        f"{column.get('expr') or column['name']} AS {column['name']}"
+        for kind in COLUMN_KINDS for column in table.get(kind) or []
+    ]
+    return f"SELECT {', '.join(columns) or '*'} FROM {base_table_name(table)}"
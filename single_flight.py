@@ -0,0 +1,136 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class Call:
+    """One in-flight piece of work that any number of callers can wait on."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+        self.waiters = 0
+
+    def result(self, timeout: float = None):
+        """Wait for the leader to finish and return its value, or raise its exception."""
+        if not self._done.wait(timeout):
+            raise TimeoutError("Timed out waiting for an identical in-flight request")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests: the first caller for a key (the leader) does
+    the work, every caller arriving while it is in flight waits for and shares its result.
+    Nothing is cached: once the leader finishes, the next caller starts a new flight.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def join(self, key: Hashable) -> tuple[Call, bool]:
+        """Return the in-flight call for `key` and whether the caller is its leader (and must complete it)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                return call, False
+            call = Call()
+            self._calls[key] = call
+            self.leaders += 1
+            return call, True
+
+    def complete(self, key: Hashable, value: Any = None, error: BaseException = None):
+        """Publish the leader's result to every waiter and end the flight."""
+        with self._lock:
+            call = self._calls.pop(key)
+        call._value = value
+        call._error = error
+        call._done.set()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: float = None) -> Any:
+        """Run fn() unless an identical call is already in flight, in which case wait for its result."""
+        call, leader = self.join(key)
+        if not leader:
+            return call.result(timeout)
+        try:
+            value = fn()
+        except BaseException as e:
+            self.complete(key, error=e)
+            raise
+        self.complete(key, value)
+        return value
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "shared": self.shared,
+                "in_flight": len(self._calls),
+            }
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight for the async bot: followers await the leader's
+    future instead of blocking a thread. Must only be used from one event loop.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def join(self, key: Hashable) -> tuple[asyncio.Future, bool]:
+        """Return the in-flight future for `key` and whether the caller is its leader (and must complete it)."""
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+            return future, False
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        return future, True
+
+    def complete(self, key: Hashable, value: Any = None, error: BaseException = None):
+        """Publish the leader's result to every waiter and end the flight."""
+        future = self._calls.pop(key)
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+            future.exception()  # Mark as retrieved so flights without followers do not log a warning
+        else:
+            future.set_result(value)
+
+    @staticmethod
+    async def result(future: asyncio.Future, timeout: float = None):
+        """Wait for the leader's result; shielded so a follower giving up does not cancel it for everyone."""
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: float = None) -> Any:
+        """Await fn() unless an identical call is already in flight, in which case await its result."""
+        future, leader = self.join(key)
+        if not leader:
+            return await self.result(future, timeout)
+        try:
+            value = await fn()
+        except BaseException as e:
+            self.complete(key, error=e)
+            raise
+        self.complete(key, value)
+        return value
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,277 @@
+from slack_stream import GENERATING_TEXT
+
+# Slack messages posted by the bot, as keyword arguments for say() / chat_postMessage().
+# Shared by the threaded and the asyncio variants of the bot.
+
+
+def rate_limited(retry_after: float) -> dict:
+    return {
+        "text": "Too many questions",
+        "blocks": [
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f":hourglass: You're asking faster than I can keep up. Please try again in {int(retry_after) + 1} seconds.",
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def ai_warning() -> dict:
+    return {
+        "text": "AI Assistant Warning",
+        "blocks": [
+            {
+                "type": "header",
+                "text": {
+                    "type": "plain_text",
+                    "text": ":warning: AI Assistant Important Notice :warning:",
+                    "emoji": True
+                }
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "This AI assistant uses automated systems to provide information. While we strive for accuracy, please note:\n\n• Information may not always be accurate or complete\n• Always verify important information\n• The AI will have limitations\n\nPlease use your judgment when acting on the information provided."
+                }
+            },
+            {
+                "type": "divider"
+            }
+        ]
+    }
+
+
+def generating() -> dict:
+    return {
+        "text": "AI is generating a response",
+        "blocks": [
+            {
+                "type": "divider"
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "plain_text",
+                    "text": GENERATING_TEXT,
+                }
+            },
+            {
+                "type": "divider"
+            },
+        ]
+    }
+
+
+def queued(position: int) -> dict:
+    return {"text": f":busstop: Lots of questions right now, you're number {position} in the queue."}
+
+
+def overloaded() -> dict:
+    return {"text": ":no_entry: I'm handling too many questions right now. Please try again in a minute."}
+
+
+def request_failed(error_info: str) -> dict:
+    return {
+        "text": "Request failed...",
+        "blocks": [
+            {
+                "type": "divider"
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "plain_text",
+                    "text": f"{error_info}",
+                }
+            },
+            {
+                "type": "divider"
+            },
+        ]
+    }
+
+
+def query_cancelled() -> dict:
+    return {
+        "text": "Query cancelled",
+        "blocks": [
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": ":fast_forward: Query cancelled because you asked a newer question.",
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def text_answer(text: str, citations: str = '') -> dict:
+    # Only show the citation section if there are actual citations
+    citation_block = []
+    if citations:
+        citation_block = [
+            {
+                "type": "rich_text_quote",
+                "elements": [
+                    {
+                        "type": "text",
+                        "text": f"* Citation: {citations}",
+                        "style": {
+                            "italic": True
+                        }
+                    }
+                ]
+            }
+        ]
+
+    return {
+        "text": "Answer:",
+        "blocks": [
+            {
+                "type": "rich_text",
+                "elements": [
+                    {
+                        "type": "rich_text_quote",
+                        "elements": [
+                            {
+                                "type": "text",
+                                "text": f"Answer: {text}",
+                                "style": {
+                                    "bold": True
+                                }
+                            }
+                        ]
+                    },
+                    *citation_block
+                ]
+            }
+        ]
+    }
+
+
+def table_answer(df, label: str = None) -> dict:
+    # Let the user know when only the first MAX_RESULT_ROWS rows were fetched
+    truncated_note = []
+    if df.attrs.get('truncated'):
+        truncated_note = [
+            {
+                "type": "rich_text_quote",
+                "elements": [
+                    {
+                        "type": "text",
+                        "text": f"Showing the first {len(df)} rows only.",
+                        "style": {
+                            "italic": True
+                        }
+                    }
+                ]
+            }
+        ]
+
+    heading = f"Answer ({label}):" if label else "Answer:"
+    return {
+        "text": heading,
+        "blocks": [
+            {
+                "type": "rich_text",
+                "elements": [
+                    {
+                        "type": "rich_text_quote",
+                        "elements": [
+                            {
+                                "type": "text",
+                                "text": heading,
+                                "style": {
+                                    "bold": True
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        "type": "rich_text_preformatted",
+                        "elements": [
+                            {
+                                "type": "text",
+                                "text": f"{df.to_string()}"
+                            }
+                        ]
+                    },
+                    *truncated_note
+                ]
+            }
+        ]
+    }
+
+
+def query_failed(error: Exception, label: str) -> dict:
+    return {
+        "text": f"Query for {label} failed",
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "plain_text",
+                    "text": f"Answer ({label}): query failed with {type(error).__name__}: {error}",
+                }
+            }
+        ]
+    }
+
+
+def chart(chart_img_url: str, chart_type: str = None) -> dict:
+    # Determine chart type name for display
+    display_type = chart_type.capitalize() if chart_type else "Data"
+    return {
+        "text": f"{display_type} Chart",
+        "blocks": [
+            {
+                "type": "image",
+                "title": {
+                    "type": "plain_text",
+                    "text": f"{display_type} Chart Visualization"
+                },
+                "block_id": "image",
+                "slack_file": {
+                    "url": f"{chart_img_url}"
+                },
+                "alt_text": f"{display_type} Chart"
+            }
+        ]
+    }
+
+
+def requested_chart(text: str, df) -> tuple[bool, str | None]:
+    """
+    Decide from the agent's answer whether the result should also be charted.
+
+    Returns:
+        (wanted, chart_type): chart_type is None when a chart is wanted but no type was named
+    """
+    text = text.lower()
+    chart_type = None
+
+    # Check for specific visualization requests in the query response
+    if 'pie chart' in text or 'pie graph' in text:
+        chart_type = 'pie'
+    elif 'bar chart' in text or 'bar graph' in text:
+        chart_type = 'bar'
+    elif 'line chart' in text or 'line graph' in text or 'trend' in text:
+        chart_type = 'line'
+    elif 'scatter' in text or 'correlation' in text or 'relationship between' in text:
+        chart_type = 'scatter'
+
+    # Only create chart if there's enough data
+    if len(df.columns) > 1 and len(df) > 0:
+        # If a specific chart type was requested or if it seems appropriate for visualization
+        if chart_type or 'visual' in text or 'chart' in text or 'graph' in text or 'plot' in text:
+            return True, chart_type
+    return False, chart_type
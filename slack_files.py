@@ -0,0 +1,88 @@
+import io
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from slack_sdk.errors import SlackApiError
+
+DEBUG = False
+
+
+class SlackFileUploader:
+    """
+    Uploads in-memory files through Slack's external upload flow and waits for them to become
+    usable, polling files.info with exponential backoff instead of sleeping for a fixed time.
+    """
+
+    def __init__(self, client, ready_timeout: float = 10.0, first_poll: float = 0.2, max_poll: float = 2.0,
+                 upload_timeout: float = None):
+        """
+        Args:
+            client: Slack WebClient
+            ready_timeout: Give up waiting for Slack to process the file after this many seconds
+            first_poll: Delay before the first files.info poll
+            max_poll: Longest delay between two polls
+            upload_timeout: Connect and read timeout of the byte upload (default: ready_timeout)
+        """
+        self.client = client
+        self.ready_timeout = ready_timeout
+        self.upload_timeout = ready_timeout if upload_timeout is None else upload_timeout
+        self.first_poll = first_poll
+        self.max_poll = max_poll
+        # Keep-alive connections to files.slack.com for the raw byte uploads
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=8))
+
+    def upload(self, content: bytes, filename: str, title: str, mimetype: str = 'image/jpeg') -> str | None:
+        """Upload the bytes and return the file permalink once Slack can display it, or None on failure."""
+        file_upload_url_response = self.client.files_getUploadURLExternal(filename=filename, length=len(content))
+        if DEBUG:
+            print(file_upload_url_response)
+        file_upload_url = file_upload_url_response['upload_url']
+        file_id = file_upload_url_response['file_id']
+
+        # Stream the rendered bytes straight from memory
+        try:
+            response = self.session.post(file_upload_url, files={'file': (filename, io.BytesIO(content), mimetype)},
+                                         timeout=self.upload_timeout)
+        except requests.RequestException as e:
+            print(f"File upload failed: {type(e).__name__}: {e}")
+            return None
+        if response.status_code != 200:
+            print("File upload failed", response.text)
+            return None
+
+        # complete upload and get permalink to display
+        response = self.client.files_completeUploadExternal(files=[{"id": file_id, "title": title}])
+        if DEBUG:
+            print(response)
+        self.wait_until_ready(file_id)
+        return response['files'][0]['permalink']
+
+    def wait_until_ready(self, file_id: str) -> bool:
+        """
+        Poll files.info until Slack has generated the image thumbnails (the point from which
+        image blocks referencing the file render), backing off between polls.
+        Returns False if the file was not ready within ready_timeout.
+        """
+        deadline = time.monotonic() + self.ready_timeout
+        delay = self.first_poll
+        while True:
+            time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+            try:
+                file = self.client.files_info(file=file_id)['file']
+            except SlackApiError as e:
+                # Without the files:read scope we cannot tell, so assume the file is ready
+                print(f"Could not check file status ({e.response.get('error')}), posting anyway")
+                return True
+            if self._is_ready(file):
+                return True
+            if time.monotonic() >= deadline:
+                print(f"File {file_id} still processing after {self.ready_timeout}s, posting anyway")
+                return False
+            delay = min(delay * 2, self.max_poll)
+
+    @staticmethod
+    def _is_ready(file: dict) -> bool:
+        if not file.get('mimetype', '').startswith('image/'):
+            return True
+        return any(key.startswith('thumb_') for key in file) or 'original_w' in file
@@ -0,0 +1,152 @@
+import time
+from slack_sdk.errors import SlackApiError
+
+# Minimum number of seconds between two chat.update calls on the same message.
+# chat.update is a Tier 3 method (~50 calls per minute), so one edit per second
+# keeps a single answer comfortably under the limit.
+DEFAULT_UPDATE_INTERVAL = 1.0
+
+# Slack rejects section text longer than 3000 characters
+MAX_SECTION_TEXT = 3000
+
+GENERATING_TEXT = ":brain: AI Analyst is generating a response. Please wait..."
+
+
+class LiveMessage:
+    """
+    A single Slack message that is edited in place while the agent streams its answer.
+
+    Text deltas are buffered and flushed with chat.update at most once every
+    `update_interval` seconds; rate limit responses push the next flush back
+    by the Retry-After value Slack sends.
+    """
+
+    def __init__(self, client, channel: str, ts: str, update_interval: float = DEFAULT_UPDATE_INTERVAL):
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        self.update_interval = update_interval
+        self.text = ''
+        self.status = ''
+        self.replaced = False
+        self._dirty = False
+        self._next_update = 0.0
+
+    def append(self, delta: str):
+        """Add a streamed text delta and flush if the update interval has passed."""
+        self.text += delta
+        self._dirty = True
+        self.flush()
+
+    def set_status(self, status: str):
+        """Show a short status line (e.g. the tool currently running) under the streamed text."""
+        if status != self.status:
+            self.status = status
+            self._dirty = True
+            self.flush()
+
+    def flush(self, force: bool = False):
+        """Push the buffered text to Slack, coalescing updates to respect rate limits."""
+        if not self._due(force):
+            return
+        body, blocks = self._render()
+        if self._update(text=body, blocks=blocks) is not None:
+            self._dirty = False
+
+    def _due(self, force: bool) -> bool:
+        if not self._dirty or self.replaced:
+            return False
+        return force or time.monotonic() >= self._next_update
+
+    def _render(self) -> tuple[str, list]:
+        body = self.text[-MAX_SECTION_TEXT:] if self.text else GENERATING_TEXT
+        blocks = [
+            {
+                "type": "divider"
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": body,
+                }
+            },
+        ]
+        if self.status:
+            blocks.append({
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": self.status,
+                    }
+                ]
+            })
+        blocks.append({"type": "divider"})
+        return body, blocks
+
+    def say(self, text: str = '', blocks: list = None, **kwargs):
+        """
+        `say`-compatible callable: the first message posted through it replaces the
+        live message, later ones are posted to the channel as usual.
+        """
+        if not self.replaced:
+            self.replaced = True
+            response = self._update(text=text, blocks=blocks or [])
+            if response is not None:
+                return response
+        return self.client.chat_postMessage(channel=self.channel, text=text, blocks=blocks, **kwargs)
+
+    def _update(self, text: str, blocks: list):
+        try:
+            response = self.client.chat_update(channel=self.channel, ts=self.ts, text=text, blocks=blocks)
+        except SlackApiError as e:
+            return self._rate_limited(e)
+        self._next_update = time.monotonic() + self.update_interval
+        return response
+
+    def _rate_limited(self, error: SlackApiError):
+        if error.response.status_code != 429:
+            raise error
+        retry_after = float(error.response.headers.get('Retry-After', 1))
+        print(f"chat.update rate limited, backing off for {retry_after}s")
+        self._next_update = time.monotonic() + retry_after
+        return None
+
+
+class AsyncLiveMessage(LiveMessage):
+    """LiveMessage for the asyncio bot: same coalescing, but every Slack call is awaited on an AsyncWebClient."""
+
+    async def append(self, delta: str):
+        self.text += delta
+        self._dirty = True
+        await self.flush()
+
+    async def set_status(self, status: str):
+        if status != self.status:
+            self.status = status
+            self._dirty = True
+            await self.flush()
+
+    async def flush(self, force: bool = False):
+        if not self._due(force):
+            return
+        body, blocks = self._render()
+        if await self._update(text=body, blocks=blocks) is not None:
+            self._dirty = False
+
+    async def say(self, text: str = '', blocks: list = None, **kwargs):
+        if not self.replaced:
+            self.replaced = True
+            response = await self._update(text=text, blocks=blocks or [])
+            if response is not None:
+                return response
+        return await self.client.chat_postMessage(channel=self.channel, text=text, blocks=blocks, **kwargs)
+
+    async def _update(self, text: str, blocks: list):
+        try:
+            response = await self.client.chat_update(channel=self.channel, ts=self.ts, text=text, blocks=blocks)
+        except SlackApiError as e:
+            return self._rate_limited(e)
+        self._next_update = time.monotonic() + self.update_interval
+        return response
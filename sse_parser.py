@@ -0,0 +1,176 @@
+try:
+    # orjson parses straight from bytes and is several times faster than the stdlib
+    import orjson
+
+    def json_loads(data: bytes):
+        return orjson.loads(data)
+
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    import json
+
+    def json_loads(data: bytes):
+        return json.loads(data)
+
+    JSON_BACKEND = 'json'
+
+DONE = b'[DONE]'
+
+
+class SSEParser:
+    """
+    Incremental Server-Sent Events parser working on raw bytes.
+
+    Feed it chunks as they come off the socket; it yields (event, data) tuples where data is the
+    raw bytes of the event's `data:` lines joined with newlines. Handles \\n, \\r\\n and \\r line
+    endings, multi-line data frames, comments and chunks that split a line anywhere.
+    """
+
+    def __init__(self):
+        self._pending = []  # Chunks of a line that has not been terminated yet
+        self._event = None
+        self._data = []
+
+    def feed(self, chunk: bytes):
+        """Parse a chunk and yield every event it completes."""
+        if b'\n' not in chunk and b'\r' not in chunk:
+            # No line ends here; defer joining so a long line is only copied once
+            self._pending.append(chunk)
+            return
+        if self._pending:
+            self._pending.append(chunk)
+            buffer = b''.join(self._pending)
+            self._pending = []
+        else:
+            buffer = chunk
+
+        if b'\r' not in buffer:
+            # Fast path for the usual \n-only streams: split in C instead of scanning line by line
+            lines = buffer.split(b'\n')
+            rest = lines.pop()
+            for line in lines:
+                event = self._line(line)
+                if event is not None:
+                    yield event
+            if rest:
+                self._pending.append(rest)
+            return
+
+        start = 0
+        length = len(buffer)
+        while start < length:
+            # Find the nearest line terminator
+            newline = buffer.find(b'\n', start)
+            carriage = buffer.find(b'\r', start, newline if newline != -1 else length)
+            if carriage != -1:
+                end = carriage
+                if carriage + 1 == length:
+                    break  # Might be the first half of \r\n, wait for more bytes
+                next_start = carriage + 2 if buffer[carriage + 1:carriage + 2] == b'\n' else carriage + 1
+            elif newline != -1:
+                end = newline
+                next_start = newline + 1
+            else:
+                break
+
+            event = self._line(buffer[start:end])
+            if event is not None:
+                yield event
+            start = next_start
+        if start < length:
+            self._pending.append(buffer[start:])
+
+    def close(self):
+        """Flush a final event that was not terminated by a blank line."""
+        if self._pending:
+            # Terminate the last line; a trailing \r simply becomes \r\n
+            yield from self.feed(b'\n')
+        event = self._dispatch()
+        if event is not None:
+            yield event
+
+    def _line(self, line: bytes):
+        if not line:
+            return self._dispatch()
+        if line[0] == 58:  # b':' starts a comment
+            return None
+        field, sep, value = line.partition(b':')
+        if sep and value[:1] == b' ':
+            value = value[1:]
+        if field == b'data':
+            self._data.append(value)
+        elif field == b'event':
+            self._event = value.decode('utf-8')
+        return None
+
+    def _dispatch(self):
+        if not self._data:
+            self._event = None
+            return None
+        data = self._data[0] if len(self._data) == 1 else b'\n'.join(self._data)
+        event = (self._event or 'message', data)
+        self._event = None
+        self._data = []
+        return event
+
+
+class AgentResponseAccumulator:
+    """
+    Collects Cortex Agents message.delta content. Text is kept as a list of parts and joined
+    once at the end, so long answers accumulate in linear time.
+    """
+
+    def __init__(self):
+        self.text_parts = []
+        self.tool_use = []
+        self.tool_results = []
+        self.other = []
+        self.errors = []
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.text_parts)
+
+    def add(self, data: bytes):
+        """
+        Add the data of one SSE event and yield stream events for it:
+        ('text', str), ('tool_use', dict) or ('tool_results', dict).
+        """
+        if data == DONE:
+            self.done = True
+            return
+        try:
+            message = json_loads(data)
+        except ValueError:
+            if b'\n' in data:
+                # Servers that skip the blank line between events send one JSON document per data: line
+                for line in data.split(b'\n'):
+                    yield from self.add(line)
+            else:
+                self.errors.append(f'Failed to parse: {data[:200]!r}')
+            return
+
+        if message.get('object') != 'message.delta':
+            self.other.append(message)
+            return
+        content = message.get('delta', {}).get('content')
+        if content is None:
+            self.other.append(message)
+            return
+
+        for entry in content:
+            entry_type = entry.get('type')
+            if entry_type == 'text':
+                text = entry.get('text', '')
+                if text:
+                    self.text_parts.append(text)
+                    yield 'text', text
+            elif entry_type == 'tool_use':
+                tool_use = entry.get('tool_use', {})
+                self.tool_use.append(tool_use)
+                yield 'tool_use', tool_use
+            elif entry_type == 'tool_results':
+                tool_results = entry.get('tool_results', {})
+                self.tool_results.append(tool_results)
+                yield 'tool_results', tool_results
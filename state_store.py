@@ -0,0 +1,209 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class StateStore:
+    """
+    Small key/value store for state that must outlive a single request: daily-warning records,
+    handled event IDs and shared cache entries. Keys live in namespaces, values are bytes and
+    every record expires after its TTL.
+
+    `shared` tells callers whether other bot processes on the host see the same records.
+    """
+    shared = False
+
+    def get(self, namespace: str, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: bytes, ttl_seconds: float):
+        raise NotImplementedError
+
+    def add(self, namespace: str, key: str, value: bytes, ttl_seconds: float) -> bool:
+        """Store the record only if no live record exists. Returns True if it was added (atomic)."""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    def clear(self, namespace: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict[str, int]:
+        return {}
+
+    def close(self):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store; at most `max_entries` records, oldest written evicted first."""
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._records = OrderedDict()  # (namespace, key) -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def _live(self, record_key, now):
+        # Must be called with the lock held
+        record = self._records.get(record_key)
+        if record is not None and record[0] <= now:
+            del self._records[record_key]
+            return None
+        return record
+
+    def _write(self, record_key, value, ttl_seconds, now):
+        # Must be called with the lock held
+        self._records.pop(record_key, None)
+        self._records[record_key] = (now + ttl_seconds, value)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+
+    def get(self, namespace: str, key: str) -> bytes | None:
+        with self._lock:
+            record = self._live((namespace, key), time.time())
+            return record[1] if record is not None else None
+
+    def set(self, namespace: str, key: str, value: bytes, ttl_seconds: float):
+        with self._lock:
+            self._write((namespace, key), value, ttl_seconds, time.time())
+
+    def add(self, namespace: str, key: str, value: bytes, ttl_seconds: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._live((namespace, key), now) is not None:
+                return False
+            self._write((namespace, key), value, ttl_seconds, now)
+            return True
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._records.pop((namespace, key), None)
+
+    def clear(self, namespace: str):
+        with self._lock:
+            for record_key in [k for k in self._records if k[0] == namespace]:
+                del self._records[record_key]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"records": len(self._records)}
+
+
+class SQLiteStateStore(StateStore):
+    """
+    File-backed store shared by every bot process on the host (and kept across restarts).
+
+    Uses WAL mode so readers never block the writer, one connection per thread, and
+    INSERT ... ON CONFLICT for the atomic add(). Expired rows are purged every `purge_every` writes.
+    Every call is blocking file I/O that can wait up to `busy_timeout` for another process's write
+    lock; never call it directly from an event loop.
+    """
+    shared = True
+
+    def __init__(self, path: str, purge_every: int = 500, busy_timeout: float = 5.0):
+        self.path = path
+        self.purge_every = purge_every
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS state_expires ON state (expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; every statement below is a single atomic write
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _wrote(self):
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            self._conn().execute("DELETE FROM state WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, namespace: str, key: str) -> bytes | None:
+        row = self._conn().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, namespace: str, key: str, value: bytes, ttl_seconds: float):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, time.time() + ttl_seconds)
+        )
+        self._wrote()
+
+    def add(self, namespace: str, key: str, value: bytes, ttl_seconds: float) -> bool:
+        now = time.time()
+        # Either inserts, or takes over an expired row; a live row is left untouched
+        cursor = self._conn().execute(
+            "INSERT INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+            " WHERE state.expires_at <= ?",
+            (namespace, key, value, now + ttl_seconds, now)
+        )
+        self._wrote()
+        return cursor.rowcount > 0
+
+    def delete(self, namespace: str, key: str):
+        self._conn().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str):
+        self._conn().execute("DELETE FROM state WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> dict[str, int]:
+        row = self._conn().execute("SELECT COUNT(*) FROM state WHERE expires_at > ?", (time.time(),)).fetchone()
+        return {"records": row[0], "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0}
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_state_store(backend: str) -> StateStore:
+    """
+    Build the store named by STATE_BACKEND: "memory" (default) or "sqlite:///path/to/state.db".
+    """
+    if not backend or backend == 'memory':
+        return MemoryStateStore()
+    if backend.startswith('sqlite:///'):
+        return SQLiteStateStore(backend[len('sqlite:///'):])
+    raise ValueError(f"Unknown STATE_BACKEND {backend!r}, expected 'memory' or 'sqlite:///<path>'")
+
+
+class DailyNotices:
+    """
+    Remembers which users already saw today's notice. One tiny record per user and day
+    ("<user>:<ordinal date>" with an empty value), expiring after two days, so the state
+    stays bounded no matter how many users talk to the bot.
+    """
+    NAMESPACE = 'daily_notice'
+    TTL_SECONDS = 2 * 24 * 3600
+
+    def __init__(self, store: StateStore):
+        self.store = store
+
+    def first_today(self, user_id: str, today: datetime.date = None) -> bool:
+        """True exactly once per user and day, across every process sharing the store."""
+        today = today or datetime.date.today()
+        return self.store.add(self.NAMESPACE, f"{user_id}:{today.toordinal()}", b'', self.TTL_SECONDS)
@@ -0,0 +1,55 @@
+import threading
+import time
+from connection_pool import SnowflakeConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def slow_connect():
+    time.sleep(0.05)
+    return FakeConnection()
+
+
+def test_concurrent_checkouts_never_overshoot_the_pool():
+    pool = SnowflakeConnectionPool(slow_connect, max_size=2, min_size=0, checkout_timeout=5)
+    errors = []
+
+    def borrow():
+        try:
+            pooled = pool.checkout()
+            time.sleep(0.01)
+            pool.checkin(pooled)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=borrow) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert pool.metrics()["open"] == 2
+
+
+def test_discarding_a_connection_wakes_a_waiting_checkout():
+    pool = SnowflakeConnectionPool(FakeConnection, max_size=1, min_size=1, checkout_timeout=5)
+    held = pool.checkout()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.checkout()))
+    waiter.start()
+    time.sleep(0.1)
+
+    start = time.monotonic()
+    pool.checkin(held, broken=True)
+    waiter.join(timeout=5)
+    assert got and got[0] is not held
+    assert time.monotonic() - start < 1
@@ -0,0 +1,31 @@
+import json
+from cortex_chat import CortexChat, compile_request_template, semantic_model_resource
+
+
+def test_local_yaml_with_dots_is_sent_as_a_file():
+    assert semantic_model_resource('support_tickets_semantic_model.yaml') == {
+        'semantic_model_file': 'support_tickets_semantic_model.yaml'}
+    assert semantic_model_resource('./models/sales.v2.yml') == {'semantic_model_file': './models/sales.v2.yml'}
+
+
+def test_stage_files_and_semantic_views():
+    assert semantic_model_resource('@DB.SCHEMA.STAGE/model.yaml') == {'semantic_model_file': '@DB.SCHEMA.STAGE/model.yaml'}
+    assert semantic_model_resource('@DB.SCHEMA.VIEW') == {'semantic_model': 'DB.SCHEMA.VIEW'}
+    assert semantic_model_resource('DB.SCHEMA.VIEW') == {'semantic_model': 'DB.SCHEMA.VIEW'}
+
+
+def test_request_template_sends_local_yaml_as_a_file():
+    template = compile_request_template('model', [], ['support_tickets_semantic_model.yaml'])
+    body = json.loads(template.render('question'))
+    assert body['tool_resources']['semantic_model_0'] == {'semantic_model_file': 'support_tickets_semantic_model.yaml'}
+
+
+class NoRequests:
+    def head(self, *args, **kwargs):
+        raise AssertionError("warmup(0) must not open connections")
+
+
+def test_warmup_of_zero_connections_opens_none():
+    chat = CortexChat.__new__(CortexChat)  # Skip __init__, which starts JWT renewal
+    chat.agent_url, chat.pool_size, chat.session = 'https://example.com/agent', 4, NoRequests()
+    assert chat.warmup(0) == 0
@@ -0,0 +1,19 @@
+import multiprocessing
+import pandas as pd
+from charts import ChartRenderer
+from workers import start_worker
+
+
+def render_in_worker():
+    # Raises if the worker is daemonic: daemonic processes may not start the chart process pool
+    chart = ChartRenderer(max_workers=1, use_processes=True).render(
+        pd.DataFrame({'service': ['a', 'b'], 'tickets': [3, 5]}), 'bar')
+    assert chart.startswith(b'\xff\xd8')  # JPEG
+
+
+def test_worker_can_render_charts_in_processes():
+    process = start_worker(multiprocessing.get_context('spawn'), 0, render_in_worker)
+    process.join(timeout=60)
+    if process.is_alive():
+        process.kill()
+    assert process.exitcode == 0
@@ -0,0 +1,135 @@
+import math
+import threading
+from typing import NamedTuple
+from cortex_chat import RequestTemplate
+from semantic_models import COLUMN_KINDS
+from verified_queries import content_words
+
+# Search service properties (from DESCRIBE) that say what the service is about
+SEARCH_SERVICE_FIELDS = ('name', 'comment', 'search_column', 'attribute_columns', 'columns')
+
+
+def semantic_model_words(model: dict) -> frozenset:
+    """
+    Words a question about the model is likely to use: names, synonyms and descriptions of the model,
+    its tables and columns, the columns' sample_values and its verified questions.
+    """
+    texts = [model.get('name'), model.get('description')]
+    for table in model.get('tables') or []:
+        texts += [table.get('name'), table.get('description'), (table.get('base_table') or {}).get('table')]
+        texts += table.get('synonyms') or []
+        for kind in COLUMN_KINDS:
+            for column in table.get(kind) or []:
+                texts += [column.get('name'), column.get('description')]
+                texts += column.get('synonyms') or []
+                texts += column.get('sample_values') or []
+    texts += [verified.get('question') for verified in model.get('verified_queries') or []]
+    return frozenset().union(*(content_words(str(text)) for text in texts if text))
+
+
+def search_service_words(conn_pool, search_service: str) -> frozenset:
+    """Words from the search service's name, comment and columns; just the name if it cannot be described."""
+    texts = [search_service.split('.')[-1]]
+
+    def describe(conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DESCRIBE CORTEX SEARCH SERVICE IDENTIFIER(%s)", (search_service,))
+            row = cursor.fetchone()
+            return dict(zip((column[0].lower() for column in cursor.description), row)) if row else {}
+        finally:
+            cursor.close()
+
+    try:
+        properties = conn_pool.run(describe)
+        texts += [properties.get(field) for field in SEARCH_SERVICE_FIELDS]
+    except Exception as e:
+        print(f"Could not describe {search_service} for routing: {e}")
+    return frozenset().union(*(content_words(str(text)) for text in texts if text))
+
+
+class Route(NamedTuple):
+    template: RequestTemplate
+    tools: tuple  # Names of the tools sent to the agent
+    routed: bool  # False if the full tool set is sent
+
+
+class ToolRouter:
+    """
+    Picks the agent tools relevant to a prompt so the agent reasons over fewer of them.
+
+    Each semantic model and search service is indexed by its vocabulary. A prompt scores every tool
+    by the words they share, weighted by how few tools use each word (words every tool uses do not
+    count). The tools scoring at least `min_share` of the best score are sent, unless that is more
+    than `top_k` tools, or the chosen tools explain less than `min_coverage` of the prompt's words:
+    then the router is unsure and the full tool set is sent.
+    """
+
+    def __init__(self, top_k: int = 2, min_coverage: float = 0.5, min_share: float = 0.5):
+        self.top_k = top_k
+        self.min_coverage = min_coverage
+        self.min_share = min_share
+        self.vocabularies = {}  # Tool name -> words
+        self.weights = {}  # Word -> weight
+        self.routed = 0
+        self.full = 0
+        self._templates = {}  # (fingerprint, tool names) -> RequestTemplate
+        self._lock = threading.Lock()
+
+    def load(self, conn_pool, request_template: RequestTemplate, models: dict[str, dict]) -> str:
+        """Index the tools of the request; `models` are the parsed semantic models by tool name."""
+        vocabularies = {}
+        for tool in request_template.tools:
+            if tool.type == 'cortex_analyst_text_to_sql' and tool.name in models:
+                vocabularies[tool.name] = semantic_model_words(models[tool.name])
+            elif tool.type == 'cortex_search':
+                vocabularies[tool.name] = search_service_words(conn_pool, tool.source)
+
+        tool_count = len(vocabularies)
+        frequencies = {}
+        for words in vocabularies.values():
+            for word in words:
+                frequencies[word] = frequencies.get(word, 0) + 1
+        self.weights = {word: math.log(tool_count / count) for word, count in frequencies.items() if count < tool_count}
+        self.vocabularies = vocabularies
+        return f"{tool_count} tools indexed ({len(self.weights)} distinguishing words)"
+
+    def route(self, prompt: str, request_template: RequestTemplate) -> Route:
+        """The request restricted to the tools the prompt needs, or the full request when unsure."""
+        all_tools = tuple(tool.name for tool in request_template.tools)
+        chosen = self._choose(content_words(prompt))
+        if chosen is not None:
+            # Tools the index knows nothing about are always kept
+            chosen |= {name for name in all_tools if name not in self.vocabularies}
+        with self._lock:
+            if chosen is None or len(chosen) >= len(all_tools):
+                self.full += 1
+                return Route(request_template, all_tools, False)
+            self.routed += 1
+            key = (request_template.fingerprint, frozenset(chosen))
+            template = self._templates.get(key)
+            if template is None:
+                template = self._templates[key] = request_template.with_tools(chosen)
+        return Route(template, tuple(name for name in all_tools if name in chosen), True)
+
+    def _choose(self, words: frozenset) -> set | None:
+        if len(self.vocabularies) < 2 or not words:
+            return None
+        scores = {
+            name: sum(self.weights.get(word, 0.0) for word in words & vocabulary)
+            for name, vocabulary in self.vocabularies.items()
+        }
+        best = max(scores.values())
+        if best <= 0:
+            return None  # Nothing in the prompt points at one tool rather than another
+        chosen = {name for name, score in scores.items() if score >= best * self.min_share}
+        if len(chosen) > self.top_k:
+            return None
+        covered = set().union(*(self.vocabularies[name] for name in chosen)) & words
+        if len(covered) < self.min_coverage * len(words):
+            return None  # Much of the question is about something no chosen tool describes
+        return chosen
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"indexed_tools": len(self.vocabularies), "routed": self.routed, "full": self.full}
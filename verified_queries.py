@@ -0,0 +1,135 @@
+import re
+import threading
+from typing import NamedTuple
+from semantic_models import logical_table_sql
+
+# Words that do not change what a question asks for ("can you show me ..."); every other word of
+# the prompt must appear in the verified question, so "tickets by service type in 2023" never
+# matches "Total tickets by service type"
+FILLER_WORDS = frozenset("""
+    a an the of by for per to in on at from as and or vs versus with me my our we i you your us
+    can could would will please show give get list tell display see find what what's whats which how
+    many much is are was were be have has had do does did there their it this that these those all
+""".split())
+
+# References to logical tables in verified SQL, e.g. __support_tickets
+LOGICAL_TABLE = re.compile(r'\b__(\w+)\b')
+
+
+def content_words(text: str) -> frozenset:
+    """Lowercased words without filler, with a plural 's' removed so 'tickets' matches 'ticket'."""
+    words = re.findall(r"[a-z0-9]+(?:'[a-z]+)?", text.lower())
+    return frozenset(word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+                     for word in words if word not in FILLER_WORDS)
+
+
+class VerifiedQuery(NamedTuple):
+    name: str
+    question: str
+    sql: str  # Runnable SQL: the logical tables it uses are defined as CTEs over their base tables
+    tool: str  # Agent tool of the semantic model it came from, e.g. semantic_model_0
+    phrasings: tuple  # content_words() of the name and of the question
+
+
+class VerifiedQueryMatch(NamedTuple):
+    query: VerifiedQuery
+    score: float
+
+
+def expand_logical_tables(sql: str, tables: dict) -> str:
+    """
+    Make verified SQL runnable outside Cortex Analyst by defining each `__<table>` it references as a
+    CTE over the physical table. Raises KeyError for references to tables the model does not define.
+    """
+    referenced = dict.fromkeys(name.lower() for name in LOGICAL_TABLE.findall(sql))
+    ctes = ", ".join(f"__{name} AS ({logical_table_sql(tables[name])})" for name in referenced)
+    if not ctes:
+        return sql
+    sql = sql.strip()
+    if re.match(r'with\s', sql, re.IGNORECASE):
+        return f"WITH {ctes}, {sql[4:].lstrip()}"
+    return f"WITH {ctes} {sql}"
+
+
+class VerifiedQueryIndex:
+    """
+    The verified_queries of every configured semantic model, matched against incoming prompts so
+    known questions can be answered with their vetted SQL without a Cortex Agents round trip.
+
+    A prompt matches a verified query when every content word of the prompt occurs in the query's
+    name or question, and those cover at least `threshold` of the name's or question's content words.
+    Prompts that match two different queries equally well are left to the agent.
+    """
+
+    def __init__(self, threshold: float = 0.9):
+        self.threshold = threshold
+        self.queries = []
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def load(self, models: dict[str, dict]) -> str:
+        """Index the verified queries of semantic models keyed by tool name; returns a summary for the warmup report."""
+        queries = []
+        for tool, model in models.items():
+            queries += self.from_semantic_model(model, tool)
+        self.queries = queries
+        return f"{len(queries)} verified queries"
+
+    @staticmethod
+    def from_semantic_model(model: dict, tool: str) -> list[VerifiedQuery]:
+        tables = {table['name'].lower(): table for table in model.get('tables') or []}
+        queries = []
+        for verified in model.get('verified_queries') or []:
+            name, question, sql = verified.get('name', ''), verified.get('question', ''), verified.get('sql')
+            if not sql or not (name or question):
+                continue
+            try:
+                runnable = expand_logical_tables(sql, tables)
+            except KeyError as e:
+                print(f"Skipping verified query {name!r}: unknown logical table {e}")
+                continue
+            phrasings = tuple(words for words in (content_words(name), content_words(question)) if words)
+            queries.append(VerifiedQuery(name or question, question, runnable, tool, phrasings))
+        return queries
+
+    def match(self, prompt: str) -> VerifiedQueryMatch | None:
+        """The verified query the prompt asks for, or None if no query matches with enough confidence."""
+        if not self.queries:
+            return None
+        words = content_words(prompt)
+        best, best_score, tied = None, 0.0, False
+        for query in self.queries:
+            score = max((self._score(words, phrasing) for phrasing in query.phrasings), default=0.0)
+            if score > best_score:
+                best, best_score, tied = query, score, False
+            elif score == best_score and best is not None and query.sql != best.sql:
+                tied = True
+
+        matched = best is not None and best_score >= self.threshold and not tied
+        with self._lock:
+            if matched:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return VerifiedQueryMatch(best, best_score) if matched else None
+
+    @staticmethod
+    def _score(words: frozenset, phrasing: frozenset) -> float:
+        if not words or not words <= phrasing:
+            return 0.0  # The prompt asks for something the verified query does not cover
+        return len(words) / len(phrasing)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"verified_queries": len(self.queries), "hits": self.hits, "misses": self.misses}
+
+
+def verified_response(query: VerifiedQuery) -> dict:
+    """An agent-style response carrying the verified SQL, for display_agent_response()."""
+    return {
+        "text": query.question or query.name,
+        "sql": query.sql,
+        "sql_results": {query.tool: query.sql},
+        "citations": "",
+    }
@@ -0,0 +1,142 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, NamedTuple
+from cortex_chat import semantic_model_resource
+from semantic_models import query_rows
+
+
+class WarmupError(Exception):
+    """Raised when a required warmup step failed, i.e. the bot is misconfigured."""
+
+
+class WarmupStep(NamedTuple):
+    name: str
+    run: Callable[[], str]  # Returns a short detail for the report, raises on failure
+    required: bool = True  # A failed required step aborts startup
+
+
+class WarmupResult(NamedTuple):
+    name: str
+    ok: bool
+    seconds: float
+    detail: str
+    required: bool
+
+
+def agent_step(warmup: Callable[[int], int], connections: int) -> WarmupStep:
+    """Open keep-alive connections to the agent endpoint so the first question skips the TLS handshake."""
+    def run():
+        opened = warmup(connections)
+        if connections and not opened:
+            raise ConnectionError("could not open any connection to AGENT_ENDPOINT")
+        return f"{opened}/{connections} connections"
+    return WarmupStep("agent connections", run)
+
+
+def warehouse_step(conn_pool, warehouse: str) -> WarmupStep:
+    """Resume the warehouse if it is suspended, so the first query does not wait for it to start."""
+    def run():
+        detail = "resumed"
+        try:
+            query_rows(conn_pool, "ALTER WAREHOUSE IDENTIFIER(%s) RESUME IF SUSPENDED", (warehouse,))
+        except Exception as e:
+            # Needs OPERATE on the warehouse; without it the first query resumes it instead
+            detail = f"not resumed ({e.__class__.__name__}), will start on the first query"
+        query_rows(conn_pool, "SELECT CURRENT_WAREHOUSE()")
+        return detail
+    return WarmupStep(f"warehouse {warehouse}", run)
+
+
+def semantic_model_step(conn_pool, semantic_model: str) -> WarmupStep:
+    """Check that a configured semantic model resolves: the stage file exists, or the local file does."""
+    resource = semantic_model_resource(semantic_model)
+
+    def run():
+        if 'semantic_model' in resource:
+            rows = query_rows(conn_pool, "DESCRIBE SEMANTIC VIEW IDENTIFIER(%s)", (resource['semantic_model'],))
+            return f"{len(rows)} definition rows"
+        path = resource['semantic_model_file']
+        if path.startswith('@'):
+            # LIST also reads the stage's metadata, so the first agent call finds it warm
+            quoted = path.replace("'", "\\'")
+            rows = query_rows(conn_pool, f"LIST '{quoted}'")
+            if not rows:
+                raise FileNotFoundError(f"{path} not found on stage")
+            return f"{rows[0][1]} bytes on stage"
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"{path} does not exist")
+        return f"{os.path.getsize(path)} bytes locally"
+    return WarmupStep(f"semantic model {semantic_model}", run)
+
+
+def search_service_step(conn_pool, search_service: str) -> WarmupStep:
+    """Check that a configured Cortex Search service exists and is visible to the bot's role."""
+    def run():
+        rows = query_rows(conn_pool, "DESCRIBE CORTEX SEARCH SERVICE IDENTIFIER(%s)", (search_service,))
+        if not rows:
+            raise LookupError(f"{search_service} not found")
+        return "found"
+    return WarmupStep(f"search service {search_service}", run)
+
+
+def default_steps(conn_pool, agent_warmup: Callable[[int], int], connections: int, warehouse: str,
+                  request_template) -> list[WarmupStep]:
+    """The standard warmup: agent connections, warehouse, and every semantic model and search service in use."""
+    steps = [agent_step(agent_warmup, connections)]
+    if warehouse:
+        steps.append(warehouse_step(conn_pool, warehouse))
+    for tool in request_template.tools:
+        if tool.type == 'cortex_analyst_text_to_sql':
+            steps.append(semantic_model_step(conn_pool, tool.source))
+        elif tool.type == 'cortex_search':
+            steps.append(search_service_step(conn_pool, tool.source))
+    return steps
+
+
+def run_warmup(steps: list[WarmupStep], timeout: float = 60, fail_fast: bool = True) -> list[WarmupResult]:
+    """
+    Run every step in parallel and print how long each one took.
+
+    Args:
+        steps: Steps to run
+        timeout: Steps still running after this many seconds count as failed
+        fail_fast: Raise WarmupError if a required step failed
+
+    Returns:
+        One WarmupResult per step, in the order given
+    """
+    start = time.perf_counter()
+    results = {}
+
+    def timed(step):
+        step_start = time.perf_counter()
+        try:
+            detail = step.run()
+            ok = True
+        except Exception as e:
+            detail = f"{type(e).__name__}: {e}"
+            ok = False
+        return WarmupResult(step.name, ok, time.perf_counter() - step_start, detail, step.required)
+
+    executor = ThreadPoolExecutor(max_workers=max(len(steps), 1), thread_name_prefix='warmup')
+    futures = {executor.submit(timed, step): step for step in steps}
+    done, _ = wait(futures, timeout=timeout)
+    # Do not wait for hung steps; they are reported as timed out
+    executor.shutdown(wait=False, cancel_futures=True)
+    for future, step in futures.items():
+        if future in done:
+            results[step.name] = future.result()
+        else:
+            results[step.name] = WarmupResult(step.name, False, timeout, f"timed out after {timeout}s", step.required)
+
+    ordered = [results[step.name] for step in steps]
+    print(f"Warmup finished in {time.perf_counter() - start:.2f}s:")
+    for result in ordered:
+        status = "ok" if result.ok else ("FAILED" if result.required else "failed (optional)")
+        print(f"  {result.name:60} {result.seconds:6.2f}s  {status:6}  {result.detail}")
+
+    failed = [result for result in ordered if not result.ok and result.required]
+    if failed and fail_fast:
+        raise WarmupError("Warmup failed: " + "; ".join(f"{result.name}: {result.detail}" for result in failed))
+    return ordered
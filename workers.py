@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import signal
+import time
+from typing import Callable
+
+# Restart a crashed worker after this many seconds, doubling up to MAX_RESTART_DELAY while it keeps crashing
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 60.0
+# A worker that stayed up this long is considered healthy again
+HEALTHY_AFTER = 60.0
+
+
+def worker_id() -> int:
+    """Index of the current bot worker process (0 when running a single process)."""
+    return int(os.getenv("BOT_WORKER_ID", "0"))
+
+
+def _run_worker(index: int, target: Callable[[], None]):
+    os.environ["BOT_WORKER_ID"] = str(index)
+    # The supervisor handles Ctrl+C and shuts the workers down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Unwind on terminate() too, so the cleanup below runs
+    signal.signal(signal.SIGTERM, _exit_worker)
+    try:
+        target()
+    finally:
+        # Process pools the worker started (chart rendering) would otherwise keep it from exiting,
+        # or outlive it when it is terminated
+        for child in multiprocessing.active_children():
+            child.terminate()
+
+
+def _exit_worker(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def start_worker(context, index: int, target: Callable[[], None]) -> multiprocessing.Process:
+    """
+    Start bot worker `index`. Workers are not daemonic, so they may start process pools of their
+    own (chart rendering); run_workers terminates and joins them when it stops.
+    """
+    process = context.Process(target=_run_worker, args=(index, target), name=f"bot-worker-{index}")
+    process.start()
+    return process
+
+
+def run_workers(count: int, target: Callable[[], None]):
+    """
+    Run `target` in `count` worker processes and restart any that die, until interrupted.
+
+    Every worker opens its own Socket Mode connection; Slack spreads events across the open
+    connections of an app (up to 10), so the workers share the load. Workers are started with
+    'spawn' so each one builds its own connections, pools and threads from scratch.
+    `target` must be a module-level function.
+    """
+    context = multiprocessing.get_context('spawn')
+    workers = {}
+    delays = {index: RESTART_DELAY for index in range(count)}
+    started = {}
+
+    def start(index):
+        process = start_worker(context, index, target)
+        workers[index] = process
+        started[index] = time.monotonic()
+        print(f"Started bot worker {index} (pid {process.pid})")
+
+    def stop(*_):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    if hasattr(signal, 'SIGUSR1'):
+        # Pass profiling toggles on to every worker
+        signal.signal(signal.SIGUSR1, lambda *_: [os.kill(process.pid, signal.SIGUSR1) for process in workers.values()])
+    for index in range(count):
+        start(index)
+    try:
+        while True:
+            time.sleep(1)
+            for index, process in list(workers.items()):
+                if process.is_alive():
+                    if time.monotonic() - started[index] > HEALTHY_AFTER:
+                        delays[index] = RESTART_DELAY
+                    continue
+                print(f"Bot worker {index} exited with code {process.exitcode}, restarting in {delays[index]}s")
+                time.sleep(delays[index])
+                delays[index] = min(delays[index] * 2, MAX_RESTART_DELAY)
+                start(index)
+    except KeyboardInterrupt:
+        print("Stopping bot workers...")
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            process.join(timeout=10)